@@ -32,6 +32,17 @@ PASSWORD_RESET_EXPIRE_MINUTES = 15
 # OAuth2 esquema para autenticação
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
+# Busca e atualização do usuário pelo nome, sem diferenciar maiúsculas (usa o índice
+# idx_usuarios_nome_lower)
+SQL_BUSCAR_USUARIO = "SELECT * FROM usuarios WHERE LOWER(nome) = LOWER(%s)"
+SQL_ATUALIZAR_SENHA = "UPDATE usuarios SET password = %s WHERE LOWER(nome) = LOWER(%s)"
+
+# Consultas verificadas com EXPLAIN por initialize_database
+CONSULTAS_CRITICAS = [
+    ("login por nome", SQL_BUSCAR_USUARIO, ("",)),
+    ("troca de senha", SQL_ATUALIZAR_SENHA, ("", "")),
+]
+
 # Armazenamento temporário de tokens de reset (em produção, use banco de dados)
 reset_tokens: Dict[str, Dict] = {}
 
@@ -54,7 +65,7 @@ def get_user_by_name(username: str) -> Optional[User]:
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM usuarios WHERE LOWER(nome) = LOWER(%s)", (username,))
+        cursor.execute(SQL_BUSCAR_USUARIO, (username,))
         user_data = cursor.fetchone()
         cursor.close()
         conn.close()
@@ -254,10 +265,7 @@ def update_password(username: str, new_password: str) -> bool:
         cursor = conn.cursor()
         
         # Atualizar senha
-        cursor.execute(
-            "UPDATE usuarios SET password = %s WHERE LOWER(nome) = LOWER(%s)",
-            (new_password, username)
-        )
+        cursor.execute(SQL_ATUALIZAR_SENHA, (new_password, username))
         
         affected_rows = cursor.rowcount
         conn.commit()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 import logging
 from dotenv import load_dotenv
 
@@ -20,4 +21,70 @@ DB_CONFIG = {
     "autocommit": True,
     "ssl_disabled": False,  # SSL habilitado por padrão no Cloud SQL
     "consume_results": True  # Consumir resultados automaticamente
-}
\ No newline at end of file
+}
+
+# Banco usado pelos managers (storage/). DB_BACKEND=sqlite usa um arquivo local em modo
+# WAL, com o mesmo esquema, para execução offline, benchmarks e instalações pequenas.
+STORAGE_CONFIG = {
+    "backend": os.getenv("DB_BACKEND", "mysql"),  # mysql | sqlite
+    "sqlite_path": os.getenv("DB_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "obras.sqlite3")),
+    # Falhar a inicialização se uma consulta crítica cair em varredura completa (EXPLAIN)
+    "exigir_indices": os.getenv("DB_EXIGIR_INDICES", "1") == "1",
+    # Reconstruir totais_atividades na subida de cada worker (desligado: é uma varredura
+    # completa concorrendo com as escritas; use POST /totals/reconcile ou reconciliar_totais.py)
+    "reconciliar_na_subida": os.getenv("DB_RECONCILE_ON_STARTUP", "0") == "1",
+}
+
+# Pool de conexões síncrono (storage/pool.py). Quando todas as conexões estão em uso, até
+# max_espera pedidos aguardam por até timeout segundos antes de a API responder 503.
+POOL_CONFIG = {
+    "tamanho": int(os.getenv("DB_POOL_SIZE", 10)),
+    "max_espera": int(os.getenv("DB_POOL_MAX_WAITERS", 50)),
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),  # segundos
+    "reciclar_apos": float(os.getenv("DB_POOL_RECYCLE", 1800)),  # idade máxima da conexão, em segundos
+    "verificar_apos": float(os.getenv("DB_POOL_PRE_PING_AFTER", 30)),  # ociosa por mais que isso: ping antes do uso
+}
+
+# Pool assíncrono (aiomysql) usado pelos endpoints; mesmas credenciais de DB_CONFIG e
+# mesma fila/timeout de POOL_CONFIG
+ASYNC_POOL_CONFIG = {
+    "minsize": int(os.getenv("DB_ASYNC_POOL_MIN", 1)),
+    "maxsize": int(os.getenv("DB_ASYNC_POOL_MAX", 20)),
+    "pool_recycle": int(os.getenv("DB_ASYNC_POOL_RECYCLE", 1800)),  # segundos
+}
+
+# Configuração do cache (utils/cache.py). Com vários workers do uvicorn, use
+# CACHE_BACKEND=sqlite para que todos compartilhem entradas e invalidações.
+CACHE_CONFIG = {
+    "backend": os.getenv("CACHE_BACKEND", "memory"),  # memory | sqlite
+    "sqlite_path": os.getenv("CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "obras_cache.sqlite3")),
+    "default_expiry": int(os.getenv("CACHE_DEFAULT_EXPIRY", 30)),  # segundos
+    "max_entries": int(os.getenv("CACHE_MAX_ENTRIES", 1000)),
+    "max_bytes": int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+}
+
+# OCR dos comprovantes (utils/ocr.py), em processos separados do event loop. Com todos os
+# processos ocupados, até max_fila comprovantes aguardam; acima disso a API responde 503.
+OCR_CONFIG = {
+    "processos": int(os.getenv("OCR_WORKERS", os.cpu_count() or 1)),
+    "max_fila": int(os.getenv("OCR_MAX_QUEUE", 8)),
+    # Tesseract: idiomas instalados na imagem (tesseract-ocr-por/eng) e modo de segmentação
+    # (4: uma coluna de linhas de tamanhos variados, como nos comprovantes)
+    "lang": os.getenv("OCR_LANG", "por+eng"),
+    "psm": int(os.getenv("OCR_PSM", 4)),
+    # Normalização da foto antes do OCR (utils/preprocessamento.py)
+    "preprocessar": os.getenv("OCR_PREPROCESS", "1") == "1",
+    "dpi_alvo": int(os.getenv("OCR_TARGET_DPI", 300)),
+    "lado_maximo": int(os.getenv("OCR_MAX_SIDE", 2000)),  # pixels
+    "limiar_raio": int(os.getenv("OCR_THRESHOLD_RADIUS", 15)),  # vizinhança do limiar adaptativo, em pixels
+    "limiar_deslocamento": int(os.getenv("OCR_THRESHOLD_OFFSET", 10)),  # 0-255
+    # Fila de jobs (utils/ocr_jobs.py): comprovantes enviados para leitura em segundo plano
+    "jobs_path": os.getenv("OCR_JOBS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_jobs.sqlite3")),
+    "retencao_jobs": int(os.getenv("OCR_JOBS_RETENTION", 24 * 3600)),  # segundos após a conclusão
+    "prazo_job": int(os.getenv("OCR_JOB_TIMEOUT", 300)),  # em execução há mais que isso: volta para a fila
+    # Resultados já lidos, por hash do arquivo enviado (reenvios do mesmo comprovante)
+    "cache_path": os.getenv("OCR_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_cache.sqlite3")),
+    "cache_max_bytes": int(os.getenv("OCR_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    "cache_max_entries": int(os.getenv("OCR_CACHE_MAX_ENTRIES", 10000)),
+    "cache_expiry": int(os.getenv("OCR_CACHE_EXPIRY", 30 * 24 * 3600)),  # segundos
+}
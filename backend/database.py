@@ -1,51 +1,123 @@
-import mysql.connector
-from mysql.connector import Error, pooling
+from contextlib import asynccontextmanager
 from fastapi import HTTPException
-from config import DB_CONFIG, logger
+from config import DB_CONFIG, POOL_CONFIG, ASYNC_POOL_CONFIG, STORAGE_CONFIG, logger
+from storage import create_storage_backend, PoolEsgotado
 
-# Criar o pool de conexões
-connection_pool = None
+# Backend de armazenamento (MySQL ou SQLite), com os pools de conexões e o dialeto SQL
+storage = create_storage_backend(STORAGE_CONFIG, DB_CONFIG, POOL_CONFIG, ASYNC_POOL_CONFIG)
+
+def _pool_esgotado(e: PoolEsgotado) -> HTTPException:
+    """Pool sem conexões livres após a espera: 503 para o cliente tentar de novo"""
+    logger.warning(f"Pool de conexões esgotado: {e}")
+    return HTTPException(
+        status_code=503,
+        detail=f"Banco de dados ocupado, tente novamente: {str(e)}",
+        headers={"Retry-After": "1"}
+    )
 
 def init_connection_pool():
     """Inicializar o pool de conexões"""
-    global connection_pool
     try:
-        connection_pool = mysql.connector.pooling.MySQLConnectionPool(
-            pool_name="obra_pool",
-            pool_size=10,
-            **DB_CONFIG
-        )
-        logger.info("Pool de conexões inicializado com sucesso")
-    except Error as e:
-        logger.error(f"Erro ao inicializar o pool de conexões MySQL: {e}")
+        storage.inicializar()
+    except Exception as e:
+        logger.error(f"Erro ao inicializar o pool de conexões ({storage.nome}): {e}")
         raise HTTPException(status_code=500, detail=f"Erro na inicialização do pool: {str(e)}")
 
 def get_db_connection():
     """Obter uma conexão do pool"""
-    global connection_pool
-    if connection_pool is None:
-        init_connection_pool()
-        
     try:
-        connection = connection_pool.get_connection()
-        return connection
-    except Error as e:
+        return storage.obter_conexao()
+    except PoolEsgotado as e:
+        raise _pool_esgotado(e)
+    except Exception as e:
         logger.error(f"Erro ao obter conexão do pool: {e}")
         raise HTTPException(status_code=500, detail=f"Erro de conexão com o banco de dados: {str(e)}")
 
-def initialize_database():
-    """Inicializar tabelas do banco de dados se não existirem"""
+def verificar_consultas(cursor, consultas) -> list:
+    """
+    Rodar EXPLAIN em cada consulta (nome, query, parâmetros) e listar as que leriam uma
+    tabela inteira por falta de índice
+    """
+    falhas = []
+    for nome, query, params in consultas:
+        varreduras = storage.varreduras_completas(cursor, query, params)
+        if varreduras:
+            falhas.append({"consulta": nome, "varreduras": varreduras})
+    return falhas
+
+def initialize_database(consultas_criticas=()):
+    """
+    Aplicar as migrações pendentes do esquema e verificar os índices das consultas críticas
+
+    Args:
+        consultas_criticas: (nome, query, parâmetros) das consultas frequentes; se alguma
+            cair em varredura completa, a inicialização falha (ou apenas registra um aviso
+            com DB_EXIGIR_INDICES=0)
+    """
     try:
         # Inicializar o pool de conexões
         init_connection_pool()
-        
+
         connection = get_db_connection()
-        cursor = connection.cursor()
 
-        connection.commit()
+        # Mesmo esquema e índices em qualquer backend (storage/migracoes.py)
+        aplicadas = storage.migrar(connection)
+        if aplicadas:
+            logger.info(f"Migrações aplicadas: {aplicadas}")
+
+        cursor = connection.cursor()
+        falhas = verificar_consultas(cursor, consultas_criticas)
         cursor.close()
         connection.close()
+
+        if falhas:
+            detalhes = "; ".join(f"{f['consulta']}: {', '.join(f['varreduras'])}" for f in falhas)
+            if STORAGE_CONFIG["exigir_indices"]:
+                raise HTTPException(status_code=500, detail=f"Consultas sem índice: {detalhes}")
+            logger.warning(f"Consultas sem índice: {detalhes}")
+
         logger.info("Banco de dados inicializado com sucesso")
-    except Error as e:
+    except HTTPException:
+        raise
+    except Exception as e:
         logger.error(f"Erro ao inicializar o banco de dados: {e}")
-        raise HTTPException(status_code=500, detail=f"Erro de inicialização do banco de dados: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erro de inicialização do banco de dados: {str(e)}")
+
+async def init_async_pool():
+    """Inicializar o pool de conexões assíncrono"""
+    try:
+        await storage.inicializar_async()
+    except Exception as e:
+        logger.error(f"Erro ao inicializar o pool de conexões assíncrono: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro na inicialização do pool: {str(e)}")
+
+async def close_async_pool():
+    """Fechar o pool assíncrono, aguardando as conexões em uso serem devolvidas"""
+    await storage.fechar_async()
+
+@asynccontextmanager
+async def get_async_connection():
+    """
+    Obter uma conexão assíncrona, devolvida ao sair do bloco
+
+    Uma transação deixada aberta por uma exceção é desfeita antes da devolução.
+    """
+    try:
+        connection = await storage.adquirir_async()
+    except PoolEsgotado as e:
+        raise _pool_esgotado(e)
+    except Exception as e:
+        logger.error(f"Erro ao obter conexão do pool assíncrono: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro de conexão com o banco de dados: {str(e)}")
+
+    try:
+        yield connection
+    except BaseException:
+        try:
+            await connection.rollback()
+        except Exception:
+            # Conexão quebrada: fechar para que o pool não a reutilize
+            connection.close()
+        raise
+    finally:
+        storage.liberar_async(connection)
@@ -1,26 +1,37 @@
 from datetime import datetime
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Security
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Security, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse , HTMLResponse
+from fastapi.responses import JSONResponse , HTMLResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+from fastapi import Response, Request
 import os
+import hashlib
 from PIL import Image
 import io
 import json
-from typing import List
+from functools import partial
+from typing import List, Optional
 from fastapi.security import OAuth2PasswordRequestForm
 import logging
 from fastapi import status
 
 # Importar de nossos módulos
-from config import logger
-from models import Activity, PendingActivity, PaidActivity, PaymentData, ExtractedData, User
+from config import logger, STORAGE_CONFIG
+from models import Activity, PendingActivity, PaidActivity, PaymentData, ExtractedData, User, DashboardSummary
 from models import PasswordResetRequest, PasswordResetResponse, PasswordUpdateRequest, PasswordUpdateResponse
-from database import get_db_connection, initialize_database
-from utils.ocr import ComprovanteReader, processar_comprovante_ocr
-from managers.comprovante import ComprovantesManager
+from database import get_db_connection, initialize_database, init_async_pool, close_async_pool, storage
+from utils.ocr import FilaOCRCheia, ler_comprovante, estatisticas_cache_ocr, pool_ocr
+from utils.ocr_jobs import STATUS_FINAIS, fila_ocr
+from managers.comprovante import CONSULTAS_CRITICAS
+from managers.comprovante_async import AsyncComprovantesManager
 from auth.auth_user import login_for_access_token, get_current_user, oauth2_scheme, require_auth
 from auth.auth_user import generate_reset_token, reset_password
-from utils.cache import clear_cache
+from auth.auth_user import CONSULTAS_CRITICAS as CONSULTAS_CRITICAS_AUTH
+from utils.cache import current_etag, cache_stats
+from utils.export import gerar_csv, gerar_xlsx
+from utils.importacao import ler_csv_atividades, normalizar_campos
 
 
 # Inicializar app FastAPI
@@ -33,19 +44,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# Inicializar o gerenciador
-manager = ComprovantesManager()
+# Inicializar o gerenciador (métodos assíncronos; streams e exportações usam o caminho síncrono)
+manager = AsyncComprovantesManager()
 
 # Inicializar o banco de dados na inicialização da aplicação
 @app.on_event("startup")
 async def startup_event():
     """Inicializar recursos na inicialização da aplicação"""
     logger.info("Inicializando recursos da aplicação...")
-    initialize_database()
+    # Migrações do esquema e verificação (EXPLAIN) dos índices das consultas críticas;
+    # as etapas síncronas rodam no threadpool para não bloquear o event loop
+    await run_in_threadpool(initialize_database, CONSULTAS_CRITICAS + CONSULTAS_CRITICAS_AUTH)
+    # Compilar o identificador de pagadores antes do primeiro pagamento
+    await run_in_threadpool(manager.carregar_pagadores)
+    await init_async_pool()
+    # Trabalhadores da fila de leitura de comprovantes (/ocr-jobs)
+    await fila_ocr.iniciar()
+    # Reconstrução dos totais incrementais só quando pedida (DB_RECONCILE_ON_STARTUP=1)
+    if STORAGE_CONFIG["reconciliar_na_subida"]:
+        await run_in_threadpool(manager.reconciliar_totais)
     logger.info("Aplicação iniciada com sucesso")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Liberar as conexões do pool assíncrono e os processos de OCR"""
+    await close_async_pool()
+    await fila_ocr.parar()
+    pool_ocr.fechar()
+
 @app.get("/")
 def read_root():
     return {"message": "API de Gerenciamento de Despesas de Construção"}
@@ -69,49 +98,300 @@ def health_check():
         logger.error(f"Verificação de saúde falhou: {e}")
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
+@app.get("/cache/stats")
+def get_cache_stats(_: bool = Depends(require_auth)):
+    """Estatísticas do cache para monitoramento (acertos, falhas, despejos, ocupação)"""
+    return cache_stats()
+
+@app.get("/db/stats")
+def get_db_stats(_: bool = Depends(require_auth)):
+    """Medidores dos pools de conexões (em uso, ociosas, fila de espera, tempos de checkout)"""
+    return storage.estatisticas()
+
+@app.get("/ocr/stats")
+async def get_ocr_stats(_: bool = Depends(require_auth)):
+    """Ocupação do pool de OCR (processos em uso, fila, rejeições), jobs por estado e cache de resultados"""
+    return {**await fila_ocr.estatisticas(), "cache": await run_in_threadpool(estatisticas_cache_ocr)}
+
 @app.head("/health")
 def head_health_check():
     """Manipulador HEAD para endpoint de verificação de saúde"""
     return {"status": "healthy"}
 
+def verificar_etag(request: Request, response: Response) -> str:
+    """
+    Responder 304 quando o cliente já tem a versão atual dos dados (If-None-Match),
+    sem consultar o banco nem serializar nada; caso contrário anexar o ETag à resposta
+    """
+    etag = current_etag()
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etags_cliente = [t.strip() for t in if_none_match.split(",")]
+        if "*" in etags_cliente or etag in etags_cliente:
+            raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    # no-cache: o navegador guarda a resposta, mas sempre revalida com o ETag
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return etag
+
+def _cabecalhos_cache(response: Response) -> dict:
+    """Copiar ETag/Cache-Control para respostas devolvidas diretamente (sem response_model)"""
+    return {k: response.headers[k] for k in ("etag", "cache-control") if k in response.headers}
+
+def _campos_projecao(fields: Optional[str], modelo) -> Optional[set]:
+    """Validar a projeção de campos (fields=) contra o modelo de resposta"""
+    if not fields:
+        return None
+
+    campos = {f.strip() for f in fields.split(',') if f.strip()}
+    campos_modelo = set(getattr(modelo, "model_fields", None) or modelo.__fields__)
+    invalidos = campos - campos_modelo
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(sorted(invalidos))}")
+    return campos
+
+def _resposta_paginada(response: Response, itens: list, modelo, limite: Optional[int], fields: Optional[str]):
+    """Anexar o cursor da próxima página e aplicar a projeção de campos (fields=)"""
+    headers = {}
+    # Página cheia: pode haver mais registros após o último ID retornado
+    if limite and len(itens) == limite:
+        headers["X-Next-Cursor"] = str(itens[-1].id)
+
+    campos = _campos_projecao(fields, modelo)
+    if not campos:
+        response.headers.update(headers)
+        return itens
+
+    headers.update(_cabecalhos_cache(response))
+    return JSONResponse(content=[jsonable_encoder(item, include=campos) for item in itens], headers=headers)
+
+def _resposta_stream(abrir_lotes, formato: str, modelo, fields: Optional[str],
+                     headers: Optional[dict] = None) -> StreamingResponse:
+    """Escrever os lotes lidos do cursor diretamente como NDJSON ou como array JSON em partes"""
+    if formato not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="stream deve ser 'ndjson' ou 'json'")
+    campos = _campos_projecao(fields, modelo)
+
+    # Abrir o cursor só depois de validar os parâmetros, para não reter a conexão
+    lotes = abrir_lotes()
+
+    def serializar(item):
+        if campos:
+            item = {k: v for k, v in item.items() if k in campos}
+        return json.dumps(item, ensure_ascii=False)
+
+    def ndjson():
+        for lote in lotes:
+            yield "".join(serializar(item) + "\n" for item in lote)
+
+    def array_json():
+        yield "["
+        primeiro = True
+        for lote in lotes:
+            trecho = ",".join(serializar(item) for item in lote)
+            yield trecho if primeiro else "," + trecho
+            primeiro = False
+        yield "]"
+
+    # Devolve a conexão mesmo se a resposta não chegar a ser iterada (cliente desconectado)
+    liberar = BackgroundTask(lotes.close)
+    if formato == "ndjson":
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=headers, background=liberar)
+    return StreamingResponse(array_json(), media_type="application/json", headers=headers, background=liberar)
+
 @app.get("/atividades", response_model=List[Activity])
-def get_activities(_: bool = Depends(require_auth)):
+async def get_activities(
+    response: Response,
+    cursor: Optional[int] = Query(None, description="ID da última atividade da página anterior"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    status: Optional[str] = None,
+    sector: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula"),
+    stream: Optional[str] = Query(None, description="'ndjson' ou 'json' para transmitir a resposta em partes, sem cache"),
+    _: bool = Depends(require_auth),
+    _etag: str = Depends(verificar_etag)
+):
     try:
-        return manager.listar_atividades()
+        if stream:
+            abrir_lotes = partial(
+                manager.iterar_atividades, "todas", apos_id=cursor, limite=limit, status=status, setor=sector,
+                data_inicio=date_from, data_fim=date_to
+            )
+            # A leitura em lotes usa o cursor síncrono, fora do loop de eventos
+            return await run_in_threadpool(_resposta_stream, abrir_lotes, stream, Activity, fields, _cabecalhos_cache(response))
+        atividades = await manager.listar_atividades(
+            apos_id=cursor, limite=limit, status=status, setor=sector,
+            data_inicio=date_from, data_fim=date_to
+        )
+        return _resposta_paginada(response, atividades, Activity, limit, fields)
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Erro ao buscar atividades: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar atividades: {str(e)}")
 
 @app.get("/atividades-pendentes", response_model=List[PendingActivity])
-def get_pending_activities(_: bool = Depends(require_auth)):
+async def get_pending_activities(
+    response: Response,
+    cursor: Optional[int] = Query(None, description="ID da última atividade da página anterior"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    sector: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula"),
+    stream: Optional[str] = Query(None, description="'ndjson' ou 'json' para transmitir a resposta em partes, sem cache"),
+    _: bool = Depends(require_auth),
+    _etag: str = Depends(verificar_etag)
+):
     try:
+        if stream:
+            abrir_lotes = partial(
+                manager.iterar_atividades, "pendentes", apos_id=cursor, limite=limit, setor=sector,
+                data_inicio=date_from, data_fim=date_to
+            )
+            # A leitura em lotes usa o cursor síncrono, fora do loop de eventos
+            return await run_in_threadpool(_resposta_stream, abrir_lotes, stream, PendingActivity, fields, _cabecalhos_cache(response))
         # Usar método otimizado do manager com cache
-        return manager.listar_atividades_pendentes()
+        atividades = await manager.listar_atividades_pendentes(
+            apos_id=cursor, limite=limit, setor=sector,
+            data_inicio=date_from, data_fim=date_to
+        )
+        return _resposta_paginada(response, atividades, PendingActivity, limit, fields)
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Erro ao buscar atividades pendentes: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar atividades pendentes: {str(e)}")
 
 @app.get("/atividades-pagas", response_model=List[PaidActivity])
-def get_paid_activities(_: bool = Depends(require_auth)):
+async def get_paid_activities(
+    response: Response,
+    cursor: Optional[int] = Query(None, description="ID da última atividade da página anterior"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    sector: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula"),
+    stream: Optional[str] = Query(None, description="'ndjson' ou 'json' para transmitir a resposta em partes, sem cache"),
+    _: bool = Depends(require_auth),
+    _etag: str = Depends(verificar_etag)
+):
     try:
+        if stream:
+            abrir_lotes = partial(
+                manager.iterar_atividades, "pagas", apos_id=cursor, limite=limit, setor=sector,
+                data_inicio=date_from, data_fim=date_to
+            )
+            # A leitura em lotes usa o cursor síncrono, fora do loop de eventos
+            return await run_in_threadpool(_resposta_stream, abrir_lotes, stream, PaidActivity, fields, _cabecalhos_cache(response))
         # Usar método otimizado do manager
-        return manager.listar_atividades_pagas()
+        atividades = await manager.listar_atividades_pagas(
+            apos_id=cursor, limite=limit, setor=sector,
+            data_inicio=date_from, data_fim=date_to
+        )
+        return _resposta_paginada(response, atividades, PaidActivity, limit, fields)
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Erro ao buscar atividades pagas: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar atividades pagas: {str(e)}")
 
+@app.get("/dashboard/summary", response_model=DashboardSummary)
+async def get_dashboard_summary(_: bool = Depends(require_auth), _etag: str = Depends(verificar_etag)):
+    """Listas de atividades e totais do dashboard em uma única requisição"""
+    try:
+        return await manager.obter_resumo_dashboard()
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao buscar resumo do dashboard: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar resumo do dashboard: {str(e)}")
+
+@app.get("/aggregates")
+async def get_aggregates(
+    group_by: str = Query("sector", description="Dimensões separadas por vírgula: sector, month, status, payer"),
+    metrics: str = Query("sum_value,sum_paid,count", description="Métricas separadas por vírgula: sum_value, sum_paid, count (com payer, apenas sum_paid)"),
+    _: bool = Depends(require_auth),
+    _etag: str = Depends(verificar_etag)
+):
+    """Agregar atividades no banco de dados para os gráficos"""
+    try:
+        # Remover repetições mantendo a ordem informada
+        dimensoes = tuple(dict.fromkeys(d.strip() for d in group_by.split(',') if d.strip()))
+        metricas = tuple(dict.fromkeys(m.strip() for m in metrics.split(',') if m.strip()))
+        rows = await manager.agregar_atividades(dimensoes, metricas)
+        return {"group_by": list(dimensoes), "metrics": list(metricas), "rows": rows}
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao agregar atividades: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao agregar atividades: {str(e)}")
+
+@app.get("/export/activities.csv")
+def export_activities_csv(
+    status: Optional[str] = None,
+    sector: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    _: bool = Depends(require_auth)
+):
+    """Exportar atividades em CSV, lidas do cursor e enviadas em partes"""
+    try:
+        lotes = manager.iterar_atividades(
+            "todas", status=status, setor=sector, data_inicio=date_from, data_fim=date_to
+        )
+        return StreamingResponse(
+            gerar_csv(lotes, manager.pagadores.pagadores),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="Gestao_Gastos_Obra.csv"'},
+            background=BackgroundTask(lotes.close)
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao exportar CSV: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar CSV: {str(e)}")
+
+@app.get("/export/activities.xlsx")
+def export_activities_xlsx(
+    status: Optional[str] = None,
+    sector: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    _: bool = Depends(require_auth)
+):
+    """Exportar atividades, resumo financeiro e análise por setor em XLSX"""
+    try:
+        lotes = manager.iterar_atividades(
+            "todas", status=status, setor=sector, data_inicio=date_from, data_fim=date_to
+        )
+        return StreamingResponse(
+            gerar_xlsx(lotes, manager.pagadores.pagadores),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": 'attachment; filename="Gestao_Gastos_Obra.xlsx"'},
+            background=BackgroundTask(lotes.close)
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao exportar XLSX: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar XLSX: {str(e)}")
+
 @app.post("/update-status")
-def update_status(_: bool = Depends(require_auth)):
+async def update_status(_: bool = Depends(require_auth)):
     try:
-        # Limpar cache após atualização
-        clear_cache("activities")
-        return manager.atualizar_status()
+        return await manager.atualizar_status()
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Erro ao atualizar status: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar status: {str(e)}")
 
 @app.post("/add-activity")
-def add_activity(
+async def add_activity(
     atividade: str = Form(...),
     valor: str = Form(...),
     setor: str = Form(...), 
@@ -127,9 +407,7 @@ def add_activity(
         except ValueError:
             raise HTTPException(status_code=400, detail="O valor deve ser um número")
         
-        result = manager.adicionar_atividade(data, valor_float, setor, atividade)
-        # Limpar cache após adicionar atividade
-        clear_cache("activities")
+        result = await manager.adicionar_atividade(data, valor_float, setor, atividade)
         logger.debug(f"Resultado da adição: {result}")
         return result
     except HTTPException as he:
@@ -140,13 +418,53 @@ def add_activity(
         logger.error(error_message, exc_info=True)
         raise HTTPException(status_code=500, detail=error_message)
     
+@app.post("/activities/bulk")
+async def bulk_import_activities(
+    request: Request,
+    strict: bool = Query(False, description="Não inserir nada se alguma linha tiver erro"),
+    _: bool = Depends(require_auth)
+):
+    """
+    Importar várias atividades de uma vez, em uma única transação
+
+    Aceita um array JSON, um CSV no corpo (text/csv) ou um arquivo CSV enviado como
+    multipart no campo 'file'. Colunas: atividade, valor, setor e data (ou activity,
+    value, sector e date).
+    """
+    try:
+        tipo = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if tipo == "application/json":
+            try:
+                dados = await request.json()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="JSON inválido")
+            if not isinstance(dados, list) or not all(isinstance(item, dict) for item in dados):
+                raise HTTPException(status_code=400, detail="Envie um array JSON de objetos")
+            linhas = [normalizar_campos(item) for item in dados]
+        elif tipo == "multipart/form-data":
+            form = await request.form()
+            arquivo = form.get("file")
+            if arquivo is None or isinstance(arquivo, str):
+                raise HTTPException(status_code=400, detail="Envie o arquivo CSV no campo 'file'")
+            linhas = ler_csv_atividades(await arquivo.read())
+        else:
+            linhas = ler_csv_atividades(await request.body())
+
+        if not linhas:
+            raise HTTPException(status_code=400, detail="Nenhuma atividade encontrada")
+
+        return await manager.importar_atividades(linhas, estrito=strict)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao importar atividades: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao importar atividades: {str(e)}")
+
 @app.delete("/delete-activity/{id}")
-def delete_activity(id: int, _: bool = Depends(require_auth)):
+async def delete_activity(id: int, _: bool = Depends(require_auth)):
     """Excluir uma atividade pelo seu ID"""
     try:
-        result = manager.excluir_atividade(id)
-        # Limpar cache após exclusão
-        clear_cache("activities")
+        result = await manager.excluir_atividade(id)
         return result
     except HTTPException as he:
         # Relançar exceções HTTP
@@ -156,7 +474,7 @@ def delete_activity(id: int, _: bool = Depends(require_auth)):
         raise HTTPException(status_code=500, detail=f"Erro ao excluir atividade: {str(e)}")
 
 @app.put("/edit-activity/{id}")
-def edit_activity(
+async def edit_activity(
     id: int, 
     atividade: str = Form(None),
     setor: str = Form(None),
@@ -190,7 +508,7 @@ def edit_activity(
             except ValueError:
                 raise HTTPException(status_code=400, detail="O valor de Diego-Ana deve ser um número")
         
-        result = manager.editar_atividade(
+        result = await manager.editar_atividade(
             id=id,
             atividade=atividade if atividade else None,
             setor=setor if setor else None,
@@ -199,9 +517,6 @@ def edit_activity(
             alex_rute=alex_rute_float,
             diego_ana=diego_ana_float
         )
-        
-        # Limpar cache após edição
-        clear_cache("activities")
         return result
     except HTTPException as he:
         # Relançar exceções HTTP
@@ -211,43 +526,86 @@ def edit_activity(
         raise HTTPException(status_code=500, detail=f"Erro ao editar atividade: {str(e)}")
     
 @app.get("/valor-total")
-def get_total_value(_: bool = Depends(require_auth)):
+async def get_total_value(_: bool = Depends(require_auth), _etag: str = Depends(verificar_etag)):
     """Calcular valor total da construção somando os valores das atividades"""
     try:
-        total_value = manager.calcular_valor_total()
+        total_value = await manager.calcular_valor_total()
         return {"total": total_value}
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Erro ao calcular o valor total: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao calcular o valor total: {str(e)}")
 
 @app.get("/valor-total-pago")
-def get_valor_pago(_: bool = Depends(require_auth)):
+async def get_valor_pago(_: bool = Depends(require_auth), _etag: str = Depends(verificar_etag)):
     """Calculate total amount paid by summing values in Alex-Rute and Diego-Ana columns"""
     try:
-        total_pago = manager.calcular_valor_total_pago()
+        total_pago = await manager.calcular_valor_total_pago()
         return {"total_pago": total_pago}
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Erro ao calcular o valor total pago: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao calcular o valor total pago: {str(e)}")
 
-@app.get("/valor-pago-diego")
-def get_valor_pago_diego(_: bool = Depends(require_auth)):
+@app.get("/payers/totals")
+async def get_payer_totals(_: bool = Depends(require_auth), _etag: str = Depends(verificar_etag)):
+    """Total pago por cada pagador cadastrado, com uma única consulta"""
+    try:
+        return await manager.obter_totais_pagadores()
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao calcular totais por pagador: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular totais por pagador: {str(e)}")
+
+@app.get("/valor-pago-diego", deprecated=True)
+async def get_valor_pago_diego(_: bool = Depends(require_auth), _etag: str = Depends(verificar_etag)):
+    """Use /payers/totals"""
     try:
-        total_pago_diego = manager.calcular_valor_pago_diego()
+        total_pago_diego = await manager.calcular_valor_pago_diego()
         return {"total_pago_diego": total_pago_diego}
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Erro ao calcular o total pago por diego-Ana : {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao calcular o total pago por diego-Ana :  {str(e)}")
 
-@app.get("/valor-pago-alex")
-def get_valor_pago_alex(_: bool = Depends(require_auth)):
+@app.get("/valor-pago-alex", deprecated=True)
+async def get_valor_pago_alex(_: bool = Depends(require_auth), _etag: str = Depends(verificar_etag)):
+    """Use /payers/totals"""
     try:
-        total_pago_alex = manager.calcular_valor_pago_alex()
+        total_pago_alex = await manager.calcular_valor_pago_alex()
         return {"total_pago_alex": total_pago_alex}
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Erro ao calcular o total pago por Alex-Rute: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao calcular o total pago por Alex-Rute: {str(e)}")
 
+@app.get("/totals")
+async def get_totals(_: bool = Depends(require_auth), _etag: str = Depends(verificar_etag)):
+    """Totais gerais e por setor, lidos da tabela mantida incrementalmente"""
+    try:
+        return await manager.obter_totais()
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao obter totais: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao obter totais: {str(e)}")
+
+@app.post("/totals/reconcile")
+def reconcile_totals(_: bool = Depends(require_auth)):
+    """Reconstruir os totais a partir das atividades e informar divergências encontradas"""
+    try:
+        return manager.reconciliar_totais()
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao reconciliar totais: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao reconciliar totais: {str(e)}")
+
 @app.post("/process-receipt", response_model=ExtractedData)
 async def process_receipt(file: UploadFile = File(...), _: bool = Depends(require_auth)):
     try:
@@ -256,27 +614,105 @@ async def process_receipt(file: UploadFile = File(...), _: bool = Depends(requir
         
         # Read file contents
         contents = await file.read()
+        # Identifies the receipt in the payments ledger
+        receipt_hash = hashlib.sha256(contents).hexdigest()
         
-        # Process with OCR API
-        texto_extraido = processar_comprovante_ocr(contents, filetype=extension)
-        
-        # Extract data from the text
-        reader = ComprovanteReader()
-        valor = reader.extrair_valor(texto_extraido)
-        data = reader.extrair_data(texto_extraido)
-        nome = reader.extrair_nome(texto_extraido)
-        
-        # Return extracted data
-        return ExtractedData(
-            value=valor,
-            date=data,
-            name=nome,
-            full_text=texto_extraido
+        # OCR in the process pool (or from the cache, for a repeated file)
+        return ExtractedData(**await ler_comprovante(contents, extension, receipt_hash))
+    except FilaOCRCheia as e:
+        logger.warning(f"Fila de OCR cheia: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Leitura de comprovantes ocupada, tente novamente: {str(e)}",
+            headers={"Retry-After": "5"}
         )
     except Exception as e:
         logger.error(f"Erro ao processar o comprovante: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ocr-jobs", status_code=202)
+async def create_ocr_job(response: Response, file: UploadFile = File(...), _: bool = Depends(require_auth)):
+    """
+    Enfileirar a leitura de um comprovante e responder na hora com o id do job
+
+    O resultado (ExtractedData) é obtido em GET /ocr-jobs/{id} ou acompanhado por
+    Server-Sent Events em GET /ocr-jobs/{id}/events.
+    """
+    try:
+        extension = file.filename.split('.')[-1].lower() if '.' in file.filename else 'jpg'
+        contents = await file.read()
+        if not contents:
+            raise HTTPException(status_code=400, detail="Arquivo vazio")
+
+        job = await fila_ocr.enviar(contents, extension, hashlib.sha256(contents).hexdigest())
+        response.headers["Location"] = f"/ocr-jobs/{job['id']}"
+        return job
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar o comprovante: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao enfileirar o comprovante: {str(e)}")
+
+async def _obter_job_ocr(job_id: str) -> dict:
+    job = await fila_ocr.obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job de OCR não encontrado")
+    return job
+
+@app.get("/ocr-jobs/{job_id}")
+async def get_ocr_job(job_id: str, _: bool = Depends(require_auth)):
+    """Estado do job (queued, running, done, error) e, quando concluído, os dados extraídos"""
+    try:
+        return await _obter_job_ocr(job_id)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao consultar o job de OCR: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao consultar o job de OCR: {str(e)}")
+
+@app.get("/ocr-jobs/{job_id}/events")
+async def stream_ocr_job(job_id: str, request: Request, _: bool = Depends(require_auth)):
+    """
+    Server-Sent Events do job: 'status' a cada mudança de estado e, ao final, 'result'
+    (ExtractedData) ou 'error'; a conexão é encerrada em seguida
+    """
+    job = await _obter_job_ocr(job_id)
+
+    def evento(nome: str, dados) -> str:
+        return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+    async def eventos(job):
+        ultimo_status = None
+        ociosos = 0
+        while True:
+            if job["status"] != ultimo_status:
+                ultimo_status = job["status"]
+                ociosos = 0
+                yield evento("status", {"id": job["id"], "status": job["status"]})
+            elif ociosos >= 15:
+                # Comentário periódico para proxies não encerrarem a conexão ociosa
+                ociosos = 0
+                yield ": keep-alive\n\n"
+
+            if job["status"] in STATUS_FINAIS:
+                if job["status"] == "done":
+                    yield evento("result", job["result"])
+                else:
+                    yield evento("error", {"id": job["id"], "error": job["error"]})
+                return
+
+            if await request.is_disconnected():
+                return
+            await fila_ocr.aguardar_mudanca(timeout=1)
+            ociosos += 1
+            job = await fila_ocr.obter(job_id) or {**job, "status": "error", "error": "Job removido"}
+
+    return StreamingResponse(
+        eventos(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/register-payment")
 async def register_payment(payment: PaymentData, _: bool = Depends(require_auth)):
     try:
@@ -289,17 +725,15 @@ async def register_payment(payment: PaymentData, _: bool = Depends(require_auth)
             raise HTTPException(status_code=400, detail=f"Campos obrigatórios faltando: {', '.join(missing)}")
             
         # Registrar pagamento
-        result = manager.preencher_pagamento(
+        result = await manager.preencher_pagamento(
             payment.value,
             payment.activity,
             payment.payer,
             payment.sector,
-            payment.date
+            payment.date,
+            payment.receipt_hash
         )
         
-        # Limpar cache após pagamento
-        clear_cache("activities")
-        
         return result
     except HTTPException as he:
         raise he
@@ -307,6 +741,85 @@ async def register_payment(payment: PaymentData, _: bool = Depends(require_auth)
         logger.error(f"Erro ao registrar pagamento: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao registrar pagamento: {str(e)}")
 
+@app.post("/payments/batch")
+async def register_payments_batch(
+    payments: List[PaymentData],
+    strict: bool = Query(False, description="Não registrar nada se algum pagamento tiver erro"),
+    _: bool = Depends(require_auth)
+):
+    """
+    Registrar vários pagamentos de uma vez, em uma única transação
+
+    Erros (pagador não reconhecido, valor inválido, atividade não encontrada) são
+    informados por linha do array, a partir de 1.
+    """
+    try:
+        if not payments:
+            raise HTTPException(status_code=400, detail="Nenhum pagamento informado")
+
+        return await manager.registrar_pagamentos_lote(
+            [
+                {
+                    "atividade": payment.activity,
+                    "setor": payment.sector,
+                    "pagador": payment.payer,
+                    "valor": payment.value,
+                    "data": payment.date,
+                    "hash_comprovante": payment.receipt_hash,
+                }
+                for payment in payments
+            ],
+            estrito=strict
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao registrar pagamentos em lote: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao registrar pagamentos em lote: {str(e)}")
+
+@app.get("/payments")
+async def get_payments(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    activity_id: Optional[int] = None,
+    payer: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=5000),
+    _: bool = Depends(require_auth),
+    _etag: str = Depends(verificar_etag)
+):
+    """Histórico de pagamentos em ordem cronológica, filtrado por intervalo de datas"""
+    try:
+        return await manager.listar_pagamentos(
+            data_inicio=date_from, data_fim=date_to, id_atividade=activity_id, pagador=payer, limite=limit
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao listar pagamentos: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao listar pagamentos: {str(e)}")
+
+@app.get("/payments/timeline")
+async def get_payments_timeline(
+    bucket: str = Query("month", description="day, week ou month"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    activity_id: Optional[int] = None,
+    payer: Optional[str] = None,
+    _: bool = Depends(require_auth),
+    _etag: str = Depends(verificar_etag)
+):
+    """Pagamentos somados por dia, semana ou mês da data do pagamento, para os gráficos"""
+    try:
+        rows = await manager.agrupar_pagamentos(
+            periodo=bucket, data_inicio=date_from, data_fim=date_to, id_atividade=activity_id, pagador=payer
+        )
+        return {"bucket": bucket, "rows": rows}
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Erro ao agrupar pagamentos: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao agrupar pagamentos: {str(e)}")
+
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Endpoint de autenticação para gerar token JWT"""
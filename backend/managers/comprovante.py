@@ -1,17 +1,264 @@
+import math
 import re
+import threading
+from datetime import date, datetime
 from fastapi import HTTPException
-from typing import List, Dict, Any, Optional
+from functools import partial
+from typing import List, Dict, Any, Optional, Iterator
 from config import logger
-from database import get_db_connection
-from models import PendingActivity, Activity, PaidActivity
-from utils.cache import cached, clear_cache
+from database import get_db_connection, storage
+from models import PendingActivity, Activity, PaidActivity, DashboardSummary, DashboardTotals
+from utils.cache import invalidate
+from utils.pagadores import IdentificadorPagadores
+
+# Os resultados em cache dependem da tag "atividades", invalidada em toda escrita,
+# então podem viver bem mais que os 30 s usados antes
+CACHE_TTL_ATIVIDADES = 300
+# Depois de expirar por tempo (sem escrita no meio), o valor ainda é servido enquanto
+# uma única requisição o recalcula em segundo plano
+CACHE_STALE_ATIVIDADES = 60
+
+# Pagadores com colunas em atividades e totais_atividades (e campos nos modelos da API).
+# carregar_pagadores recusa chaves fora desta lista: um novo pagador precisa, além da linha
+# em pagadores, de uma migração com as colunas e de incluí-lo aqui e nos modelos.
+COLUNAS_PAGADORES = ("alex_rute", "diego_ana")
+
+# Soma dos valores pagos de uma linha de atividades
+SQL_SOMA_PAGA = " + ".join(f"COALESCE({coluna}, 0)" for coluna in COLUNAS_PAGADORES)
+
+# Totais mantidos incrementalmente em totais_atividades: uma linha ('geral', '') e uma
+# linha ('setor', <nome>) por setor, atualizadas na mesma transação de cada escrita
+CAMPOS_TOTAIS = ("valor_total", *COLUNAS_PAGADORES, "pendentes", "quantidade")
+
+SQL_APLICAR_DELTA_TOTAIS = storage.sql_upsert_soma("totais_atividades", ("escopo", "chave"), CAMPOS_TOTAIS)
+
+SQL_RECALCULAR_TOTAIS = f"""
+    INSERT INTO totais_atividades (escopo, chave, {', '.join(CAMPOS_TOTAIS)})
+    SELECT 'geral', '', COALESCE(SUM(valor), 0),
+           {', '.join(f"COALESCE(SUM(COALESCE({c}, 0)), 0)" for c in COLUNAS_PAGADORES)},
+           COALESCE(SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), 0), COUNT(*)
+    FROM atividades
+    UNION ALL
+    SELECT 'setor', COALESCE(setor, ''), SUM(valor),
+           {', '.join(f"SUM(COALESCE({c}, 0))" for c in COLUNAS_PAGADORES)},
+           SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), COUNT(*)
+    FROM atividades
+    GROUP BY COALESCE(setor, '')
+"""
+
+SQL_LER_TOTAIS = f"SELECT escopo, chave, {', '.join(CAMPOS_TOTAIS)} FROM totais_atividades"
+
+SQL_LER_TOTAL_GERAL = "SELECT {expressao} FROM totais_atividades WHERE escopo = 'geral' AND chave = ''"
+
+# Dimensões e métricas aceitas por agregar_atividades (nome público -> expressão SQL)
+DIMENSOES_AGREGACAO = {
+    "sector": "setor",
+    "month": "SUBSTR(data, 4, 7)",  # MM/AAAA, já que a data é armazenada como DD/MM/AAAA
+    "status": "status",
+    "payer": "pagador",
+}
+
+METRICAS_AGREGACAO = {
+    "sum_value": "SUM(valor)",
+    "sum_paid": "SUM(valor_pago)",
+    "count": "COUNT(*)",
+}
+
+# Métricas que podem ser agrupadas pela dimensão payer
+METRICAS_POR_PAGADOR = ("sum_paid",)
+
+# Recalcular o status de todas as atividades (atualizar_status)
+SQL_ATUALIZAR_STATUS = f"""
+    UPDATE atividades
+    SET status = CASE WHEN ({SQL_SOMA_PAGA}) >= valor THEN 'paid' ELSE 'pending' END
+"""
+
+SQL_INSERIR_ATIVIDADE = """
+    INSERT INTO atividades (nome, valor, data, setor, status) 
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+# Pagamento aplicado por um único UPDATE atômico, sem ler a linha antes: o incremento é
+# feito no banco, e o status é calculado com os valores anteriores mais o pagamento (fica
+# antes do incremento no SET porque o MySQL avalia as atribuições da esquerda para a direita).
+# Parâmetros: (valor, valor, atividade[, setor]).
+SQL_APLICAR_PAGAMENTO = {
+    (coluna, com_setor): storage.sql_atualizar_primeira(
+        "atividades", "idAtividades",
+        f"status = CASE WHEN {SQL_SOMA_PAGA} + %s >= valor "
+        f"THEN 'paid' ELSE 'pending' END, {coluna} = COALESCE({coluna}, 0) + %s",
+        "nome = %s AND setor = %s" if com_setor else "nome = %s"
+    )
+    for coluna in COLUNAS_PAGADORES for com_setor in (False, True)
+}
+# Leitura da linha alterada, quando o dialeto não tem UPDATE ... RETURNING
+SQL_LER_PAGAMENTO_APLICADO = storage.sql_ler_atualizada("atividades", "idAtividades")
+
+# Histórico de pagamentos, gravado na mesma transação que atualiza a atividade.
+# Parâmetros: (idAtividade, pagador, valor, data AAAA-MM-DD, hash do comprovante)
+SQL_REGISTRAR_PAGAMENTO = """
+    INSERT INTO pagamentos (idAtividade, pagador, valor, data, hash_comprovante)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+SQL_LISTAR_PAGAMENTOS = """
+    SELECT p.id, p.idAtividade, a.nome, a.setor, p.pagador, p.valor, p.data, p.hash_comprovante
+    FROM pagamentos p
+    JOIN atividades a ON a.idAtividades = p.idAtividade
+"""
+
+# {periodo}: expressão de storage.expressao_periodo sobre p.data
+SQL_AGRUPAR_PAGAMENTOS = f"""
+    SELECT {{periodo}} AS inicio,
+           {', '.join(f"SUM(CASE WHEN p.pagador = '{c}' THEN p.valor ELSE 0 END) AS {c}" for c in COLUNAS_PAGADORES)},
+           SUM(p.valor) AS total,
+           COUNT(*) AS quantidade
+    FROM pagamentos p
+"""
+
+# Pagadores cadastrados (chave = coluna do valor pago), na ordem de precedência do identificador
+SQL_LISTAR_PAGADORES = "SELECT chave, nome, apelidos FROM pagadores ORDER BY id"
+
+# Agrupamentos aceitos em agrupar_pagamentos e máximo de lançamentos por listagem
+PERIODOS_PAGAMENTOS = ("day", "week", "month")
+LIMITE_PAGAMENTOS = 5000
+
+# Importação em lote (AsyncComprovantesManager.importar_atividades): máximo de linhas por requisição
+LIMITE_IMPORTACAO = 5000
+
+# Pagamentos em lote (AsyncComprovantesManager.registrar_pagamentos_lote): máximo de pagamentos por requisição
+LIMITE_PAGAMENTOS_LOTE = 1000
+
+# Bloqueio das linhas lidas nas transações de escrita (vazio no SQLite, que reserva a
+# escrita no BEGIN IMMEDIATE)
+FOR_UPDATE = storage.sufixo_bloqueio
+
+# Consultas base das listagens (completadas com filtros e paginação por _paginar)
+SQL_LISTAR_ATIVIDADES = "SELECT * FROM atividades"
+
+SQL_LISTAR_PAGAS = "SELECT * FROM atividades WHERE status = 'paid'"
+
+SQL_RESUMO_DASHBOARD = f"""
+    SELECT idAtividades, nome, setor, valor, data, {', '.join(COLUNAS_PAGADORES)}, status
+    FROM atividades
+"""
+
+SQL_LISTAR_PENDENTES = f"""
+    SELECT idAtividades, nome, setor, valor, data, 
+           {', '.join(f"COALESCE({c}, 0) as {c}" for c in COLUNAS_PAGADORES)},
+           (valor - ({SQL_SOMA_PAGA})) as valor_restante
+    FROM atividades 
+    WHERE status = 'pending' AND 
+          (valor - ({SQL_SOMA_PAGA})) > 0
+"""
+
+# Consultas frequentes que precisam de índice: initialize_database roda EXPLAIN em cada
+# uma (com parâmetros de exemplo) e falha se alguma ler a tabela inteira
+CONSULTAS_CRITICAS = [
+    ("pagamento por atividade e setor", SQL_APLICAR_PAGAMENTO[("alex_rute", True)], (0, 0, "", "")),
+    ("pagamento por atividade", SQL_APLICAR_PAGAMENTO[("alex_rute", False)], (0, 0, "")),
+    ("atividades pendentes", SQL_LISTAR_PENDENTES, ()),
+    ("atividades pagas", SQL_LISTAR_PAGAS, ()),
+    ("atividade por id", "SELECT * FROM atividades WHERE idAtividades = %s", (0,)),
+    ("pagamentos da atividade", SQL_LISTAR_PAGAMENTOS + " WHERE p.idAtividade = %s", (0,)),
+    ("pagamentos por período", SQL_LISTAR_PAGAMENTOS + " WHERE p.data >= %s AND p.data <= %s",
+     ("2000-01-01", "2000-01-31")),
+]
+
+class LeituraEmLotes:
+    """
+    Lotes lidos de um cursor já executado (fetchmany), convertidos para o formato da API
+
+    A conexão é devolvida ao fim da iteração ou por close(), o que vier primeiro. Uma
+    StreamingResponse que nunca começa a ser iterada (cliente desconectado antes do
+    primeiro bloco) não executa o finally do gerador, por isso os endpoints também chamam
+    close() em uma BackgroundTask.
+    """
+
+    def __init__(self, connection, cursor, converter, tamanho_lote: int):
+        self._connection = connection
+        self._cursor = cursor
+        self._converter = converter
+        self._tamanho_lote = tamanho_lote
+        self._lock = threading.Lock()
+        self._fechada = False
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        try:
+            while True:
+                linhas = self._cursor.fetchmany(self._tamanho_lote)
+                if not linhas:
+                    break
+                yield [self._converter(linha) for linha in linhas]
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Fechar o cursor e devolver a conexão ao pool (pode ser chamado mais de uma vez)"""
+        with self._lock:
+            if self._fechada:
+                return
+            self._fechada = True
+        try:
+            self._cursor.close()
+        except Exception as e:
+            logger.warning(f"Erro ao fechar cursor da leitura em lotes: {e}")
+        finally:
+            self._connection.close()
+
+    def __del__(self):
+        # Última garantia caso nem a iteração nem a BackgroundTask tenham rodado
+        self.close()
+
 
 class ComprovantesManager:
-    """Classe para gerenciar despesas de construção no banco de dados MySQL"""
+    """
+    Classe para gerenciar despesas de construção no banco de dados MySQL
+
+    Reúne as consultas, validações e conversões usadas pelos endpoints (em
+    AsyncComprovantesManager) e as operações que rodam no driver síncrono: carregar_pagadores,
+    iterar_atividades (streams e exportações) e reconciliar_totais (também usada pelo
+    script reconciliar_totais.py).
+    """
     
     def __init__(self):
-        # Isso estará vazio, pois usaremos conexões DB conforme necessário
-        pass
+        # Conexões DB são obtidas conforme necessário; os pagadores são lidos uma vez
+        # (carregar_pagadores) e compilados em um IdentificadorPagadores
+        self._pagadores: Optional[IdentificadorPagadores] = None
+
+    def carregar_pagadores(self) -> IdentificadorPagadores:
+        """Ler a tabela pagadores e recompilar o identificador (na subida ou após cadastrar um pagador)"""
+        try:
+            connection = get_db_connection()
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(SQL_LISTAR_PAGADORES)
+            linhas = cursor.fetchall()
+            cursor.close()
+            connection.close()
+
+            sem_suporte = [linha['chave'] for linha in linhas if linha['chave'] not in COLUNAS_PAGADORES]
+            if sem_suporte:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Pagadores sem colunas no esquema: {', '.join(sem_suporte)} "
+                           f"(suportados: {', '.join(COLUNAS_PAGADORES)})"
+                )
+
+            self._pagadores = IdentificadorPagadores(linhas)
+            # Totais por pagador em cache foram montados com a lista anterior
+            invalidate("pagadores")
+            return self._pagadores
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao carregar pagadores: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao carregar pagadores: {str(e)}")
+
+    @property
+    def pagadores(self) -> IdentificadorPagadores:
+        if self._pagadores is None:
+            self.carregar_pagadores()
+        return self._pagadores
     
     def _parse_value(self, value_str: str) -> float:
         """Converter valor string para float, lidando com diferentes formatos"""
@@ -19,8 +266,11 @@ class ComprovantesManager:
             # Log para diagnóstico
             logger.debug(f"Analisando valor: '{value_str}', tipo: {type(value_str)}")
             
+            if isinstance(value_str, bool) or not isinstance(value_str, (str, int, float)):
+                raise ValueError(f"tipo {type(value_str).__name__} não suportado")
+
             if isinstance(value_str, (int, float)):
-                return float(value_str)
+                return self._valor_finito(float(value_str))
                     
             # Remover símbolos de moeda e espaços
             clean_value = value_str.replace('R$', '').strip()
@@ -33,11 +283,18 @@ class ComprovantesManager:
             
             logger.debug(f"Valor limpo final: '{clean_value}'")
             
-            return float(clean_value)
-        except ValueError as e:
+            return self._valor_finito(float(clean_value))
+        except (ValueError, OverflowError) as e:
             logger.error(f"Erro de análise de valor para '{value_str}': {str(e)}")
             raise HTTPException(status_code=400, detail=f"Formato de valor inválido: {value_str}")
     
+    @staticmethod
+    def _valor_finito(valor: float) -> float:
+        """Recusar NaN e infinito, que float() aceita ("nan", "inf") mas não são valores monetários"""
+        if not math.isfinite(valor):
+            raise ValueError("valor não finito")
+        return valor
+
     def _format_date(self, date_str: str) -> str:
         """Formatar data para formato de exibição (DD/MM/AAAA)"""
         if not date_str:
@@ -58,488 +315,798 @@ class ComprovantesManager:
         except Exception as e:
             logger.error(f"Erro ao formatar data {date_str}: {e}")
             return date_str  # Retornar como está se houver um erro
-    
-    def preencher_pagamento(self, valor_str: str, atividade: str, pagador: str, 
-                            setor: Optional[str] = None, data: Optional[str] = None) -> Dict[str, Any]:
-        """Registrar um pagamento no banco de dados"""
-        # Converter valor para float
+
+    def _parse_date_iso(self, date_str: str) -> str:
+        """Converter data DD/MM/AAAA ou AAAA-MM-DD para AAAA-MM-DD (usada nos filtros)"""
+        if re.fullmatch(r'\d{4}-\d{2}-\d{2}', date_str):
+            return date_str
+        if re.fullmatch(r'\d{2}/\d{2}/\d{4}', date_str):
+            day, month, year = date_str.split('/')
+            return f"{year}-{month}-{day}"
+        raise HTTPException(status_code=400, detail=f"Formato de data inválido: {date_str}")
+
+    def _filtros_listagem(self, apos_id: Optional[int] = None, status: Optional[str] = None,
+                          setor: Optional[str] = None, data_inicio: Optional[str] = None,
+                          data_fim: Optional[str] = None) -> tuple:
+        """Montar cláusulas WHERE e parâmetros comuns às listagens de atividades"""
+        condicoes = []
+        params = []
+
+        # Paginação por chave: retomar a partir do último ID da página anterior
+        if apos_id is not None:
+            condicoes.append("idAtividades > %s")
+            params.append(apos_id)
+
+        if status:
+            condicoes.append("status = %s")
+            params.append(status)
+
+        if setor:
+            condicoes.append("setor = %s")
+            params.append(setor)
+
+        # A data é armazenada como texto DD/MM/AAAA
+        if data_inicio:
+            condicoes.append(f"{storage.expressao_data_iso('data')} >= %s")
+            params.append(self._parse_date_iso(data_inicio))
+
+        if data_fim:
+            condicoes.append(f"{storage.expressao_data_iso('data')} <= %s")
+            params.append(self._parse_date_iso(data_fim))
+
+        return condicoes, params
+
+    def _paginar(self, query: str, condicoes: List[str], params: List[Any],
+                 limite: Optional[int] = None) -> tuple:
+        """Completar a consulta com filtros, ordenação por ID e limite da página"""
+        if condicoes:
+            query += (" AND " if " WHERE " in query else " WHERE ") + " AND ".join(condicoes)
+
+        query += " ORDER BY idAtividades"
+        if limite:
+            query += " LIMIT %s"
+            params = params + [limite]
+
+        return query, tuple(params)
+
+    def _estado_totais(self, activity: Dict[str, Any]) -> Dict[str, Any]:
+        """Contribuição de uma linha de atividades para a tabela de totais"""
+        return {
+            "setor": activity['setor'] or "",
+            "valor_total": float(activity['valor'] or 0),
+            **{coluna: float(activity[coluna] or 0) for coluna in COLUNAS_PAGADORES},
+            "pendentes": 1 if activity['status'] == 'pending' else 0,
+            "quantidade": 1,
+        }
+
+    def _deltas_totais(self, antes: Optional[Dict[str, Any]] = None,
+                       depois: Optional[Dict[str, Any]] = None,
+                       mudancas: List[tuple] = ()) -> List[tuple]:
+        """
+        Linhas (parâmetros de SQL_APLICAR_DELTA_TOTAIS) com a diferença entre o estado
+        anterior e o novo de uma atividade (antes=None para inclusão, depois=None para exclusão),
+        somada à dos pares (antes, depois) de `mudancas`, usados nas operações em lote
+        """
+        deltas: Dict[tuple, List[float]] = {}
+        for par in [(antes, depois), *mudancas]:
+            for linha, sinal in zip(par, (-1, 1)):
+                if not linha:
+                    continue
+                estado = self._estado_totais(linha)
+                for chave in (("geral", ""), ("setor", estado["setor"])):
+                    acumulado = deltas.setdefault(chave, [0] * len(CAMPOS_TOTAIS))
+                    for i, campo in enumerate(CAMPOS_TOTAIS):
+                        acumulado[i] += sinal * estado[campo]
+
+        return [(escopo, chave, *valores) for (escopo, chave), valores in deltas.items() if any(valores)]
+
+    @staticmethod
+    def _desfazer(connection) -> None:
+        """Desfazer a transação em andamento após um erro, sem encobrir o erro original"""
+        if connection is None:
+            return
+        try:
+            connection.rollback()
+        except Exception as e:
+            logger.warning(f"Erro ao desfazer transação: {e}")
+
+    def _coluna_pagador(self, pagador: str) -> str:
+        """Coluna (chave do pagador, ex.: alex_rute) correspondente ao nome do pagador"""
+        coluna = self.pagadores.identificar(pagador)
+        if coluna is None:
+            nomes = " ou ".join(f"'{p['nome']}'" for p in self.pagadores.pagadores)
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Pagador '{pagador}' não reconhecido. Use {nomes}"
+            )
+        return coluna
+
+    def _data_pagamento(self, data: Optional[str]) -> str:
+        """Data do pagamento em AAAA-MM-DD: a informada (DD/MM/AAAA ou AAAA-MM-DD) ou a de hoje"""
+        if not data or not str(data).strip():
+            return date.today().isoformat()
+        try:
+            data_iso = self._parse_date_iso(str(data).strip())
+            datetime.strptime(data_iso, "%Y-%m-%d")
+            return data_iso
+        except (HTTPException, ValueError):
+            raise HTTPException(status_code=400, detail=f"Data do pagamento inválida: {data}")
+
+    def _hash_comprovante(self, hash_comprovante: Optional[str]) -> Optional[str]:
+        """Validar o SHA-256 (hexadecimal) do arquivo do comprovante, se informado"""
+        if not hash_comprovante:
+            return None
+        hash_comprovante = str(hash_comprovante).strip().lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', hash_comprovante):
+            raise HTTPException(status_code=400, detail="Hash do comprovante deve ser um SHA-256 hexadecimal")
+        return hash_comprovante
+
+    def _preparar_pagamento(self, valor_str: str, atividade: str, pagador: str,
+                            setor: Optional[str] = None, data: Optional[str] = None,
+                            hash_comprovante: Optional[str] = None) -> tuple:
+        """
+        Validar um pagamento e montar o UPDATE atômico que o aplica
+
+        Returns:
+            (lançamento (coluna, valor, data, hash) para SQL_REGISTRAR_PAGAMENTO, query, parâmetros)
+        """
         valor = self._parse_value(valor_str)
+        if valor == 0:
+            raise HTTPException(status_code=400, detail="Valor do pagamento não pode ser zero")
+        coluna = self._coluna_pagador(pagador)
+        lancamento = (coluna, valor, self._data_pagamento(data), self._hash_comprovante(hash_comprovante))
+
+        params = (valor, valor, atividade, setor) if setor else (valor, valor, atividade)
+        return lancamento, SQL_APLICAR_PAGAMENTO[(coluna, bool(setor))], params
+
+    def _estado_antes_pagamento(self, depois: Dict[str, Any], coluna: str, valor: float) -> Dict[str, Any]:
+        """
+        Estado da atividade antes do UPDATE de SQL_APLICAR_PAGAMENTO, para os totais
+
+        O UPDATE retorna apenas a linha nova; o status anterior é o calculado com os valores
+        anteriores, como todas as escritas fazem.
+        """
+        antes = {**depois, coluna: (depois[coluna] or 0) - valor}
+        antes['status'] = self._status_pago(antes)
+        return antes
+
+    @staticmethod
+    def _status_pago(activity: Dict[str, Any]) -> str:
+        """Status de uma atividade conforme a soma dos valores pagos"""
+        total_paid = sum(activity[coluna] or 0 for coluna in COLUNAS_PAGADORES)
+        return "paid" if total_paid >= activity['valor'] else "pending"
+
+    def _estado_pagamento(self, activity: Dict[str, Any]) -> Dict[str, Any]:
+        """Valores pagos e status de uma atividade, devolvidos após registrar pagamentos"""
+        return {
+            "id": activity['idAtividades'], "atividade": activity['nome'], "setor": activity['setor'],
+            **{coluna: activity[coluna] for coluna in COLUNAS_PAGADORES},
+            "status": activity['status']
+        }
+
+    def _preparar_pagamentos_lote(self, pagamentos: List[Dict[str, Any]]) -> tuple:
+        """
+        Validar os pagamentos de um lote antes de abrir a transação
+
+        Cada pagamento deve ter atividade, pagador e valor; setor, data (hoje, se ausente) e
+        hash_comprovante são opcionais.
+
+        Returns:
+            (pagamentos válidos como (linha, atividade, setor, coluna, valor, data, hash),
+            erros por linha)
+        """
+        if len(pagamentos) > LIMITE_PAGAMENTOS_LOTE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Máximo de {LIMITE_PAGAMENTOS_LOTE} pagamentos por lote (recebidos {len(pagamentos)})"
+            )
+
+        validos = []
+        erros = []
+        for numero, pagamento in enumerate(pagamentos, start=1):
+            try:
+                atividade = str(pagamento.get("atividade") or "").strip()
+                if not atividade:
+                    raise HTTPException(status_code=400, detail="Atividade é obrigatória")
+                coluna = self._coluna_pagador(str(pagamento.get("pagador") or ""))
+                valor_bruto = pagamento.get("valor")
+                if valor_bruto is None or str(valor_bruto).strip() == "":
+                    raise HTTPException(status_code=400, detail="Valor é obrigatório")
+                valor = self._parse_value(valor_bruto)
+                setor = str(pagamento.get("setor") or "").strip() or None
+                data = self._data_pagamento(pagamento.get("data"))
+                hash_comprovante = self._hash_comprovante(pagamento.get("hash_comprovante"))
+                validos.append((numero, atividade, setor, coluna, valor, data, hash_comprovante))
+            except HTTPException as he:
+                erros.append({"linha": numero, "erro": he.detail})
+            except (TypeError, AttributeError, ValueError) as e:
+                erros.append({"linha": numero, "erro": f"Linha inválida: {e}"})
+
+        return validos, erros
+
+    def _consulta_pagamentos_lote(self, validos: List[tuple]) -> tuple:
+        """SELECT (com bloqueio) de todas as atividades citadas no lote, em uma única consulta"""
+        nomes = list(dict.fromkeys(atividade for _, atividade, *_ in validos))
+        query = (
+            f"SELECT * FROM atividades WHERE nome IN ({', '.join(['%s'] * len(nomes))})"
+            f" ORDER BY idAtividades{FOR_UPDATE}"
+        )
+        return query, tuple(nomes)
+
+    def _distribuir_pagamentos_lote(self, atividades: List[Dict[str, Any]], validos: List[tuple]) -> tuple:
+        """
+        Aplicar em memória os pagamentos do lote às atividades lidas
+
+        Cada pagamento vai para a primeira atividade (menor id) com o mesmo nome e, se
+        informado, o mesmo setor, como em preencher_pagamento. Pagamentos para a mesma
+        atividade são somados e o status é recalculado uma vez no final.
+
+        Returns:
+            ({id: (antes, depois)} das atividades alteradas, pagamentos registrados,
+            parâmetros de SQL_REGISTRAR_PAGAMENTO, erros)
+        """
+        # Comparação sem diferenciar maiúsculas, como a collation padrão do MySQL
+        def chave(texto):
+            return str(texto or "").strip().lower()
+
+        por_nome: Dict[str, List[Dict[str, Any]]] = {}
+        for activity in atividades:
+            por_nome.setdefault(chave(activity['nome']), []).append(activity)
+
+        mudancas: Dict[int, tuple] = {}
+        registrados = []
+        lancamentos = []
+        erros = []
+        for numero, atividade, setor, coluna, valor, data, hash_comprovante in validos:
+            activity = next(
+                (a for a in por_nome.get(chave(atividade), []) if not setor or chave(a['setor']) == chave(setor)),
+                None
+            )
+            if activity is None:
+                erros.append({"linha": numero, "erro": f"Atividade '{atividade}' não encontrada"})
+                continue
+
+            _, depois = mudancas.setdefault(activity['idAtividades'], (activity, dict(activity)))
+            depois[coluna] = (depois[coluna] or 0) + valor
+            registrados.append({
+                "linha": numero, "id": activity['idAtividades'], "atividade": activity['nome'],
+                "pagador": coluna, "valor": valor, "data": self._data_exibicao(data)
+            })
+            lancamentos.append((activity['idAtividades'], coluna, valor, data, hash_comprovante))
+
+        for _, depois in mudancas.values():
+            depois['status'] = self._status_pago(depois)
+
+        return mudancas, registrados, lancamentos, erros
+
+    def _montar_atualizacao_lote(self, mudancas: Dict[int, tuple]) -> tuple:
+        """UPDATE único (CASE por id) com os novos valores pagos e status das atividades alteradas"""
+        ids = list(mudancas)
+        casos = " ".join(["WHEN %s THEN %s"] * len(ids))
+        campos = (*COLUNAS_PAGADORES, "status")
+        query = (
+            "UPDATE atividades SET "
+            + ", ".join(f"{campo} = CASE idAtividades {casos} END" for campo in campos)
+            + f" WHERE idAtividades IN ({', '.join(['%s'] * len(ids))})"
+        )
+        params = []
+        for campo in campos:
+            for id in ids:
+                params += [id, mudancas[id][1][campo]]
+        return query, tuple(params + ids)
+
+    def _resultado_pagamentos_lote(self, registrados: List[Dict[str, Any]], erros: List[Dict[str, Any]],
+                                   mudancas: Dict[int, tuple]) -> Dict[str, Any]:
+        """Resposta de registrar_pagamentos_lote"""
+        return {
+            "sucesso": not erros,
+            "mensagem": f"{len(registrados)} pagamento(s) registrado(s), {len(erros)} com erro",
+            "registrados": registrados,
+            "erros": sorted(erros, key=lambda erro: erro["linha"]),
+            "atividades": [self._estado_pagamento(depois) for _, depois in mudancas.values()]
+        }
+
+    def _data_exibicao(self, valor: Any) -> str:
+        """Data AAAA-MM-DD (texto ou date, conforme o driver) no formato DD/MM/AAAA"""
+        ano, mes, dia = str(valor)[:10].split('-')
+        return f"{dia}/{mes}/{ano}"
+
+    def _filtros_pagamentos(self, data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                            id_atividade: Optional[int] = None, pagador: Optional[str] = None) -> tuple:
+        """Montar o WHERE das consultas ao histórico (usa os índices de data e de atividade)"""
+        condicoes = []
+        params = []
+
+        if id_atividade is not None:
+            condicoes.append("p.idAtividade = %s")
+            params.append(id_atividade)
+
+        if pagador:
+            condicoes.append("p.pagador = %s")
+            params.append(self._coluna_pagador(pagador))
+
+        if data_inicio:
+            condicoes.append("p.data >= %s")
+            params.append(self._parse_date_iso(data_inicio))
+
+        if data_fim:
+            condicoes.append("p.data <= %s")
+            params.append(self._parse_date_iso(data_fim))
+
+        where = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+        return where, params
+
+    def _consulta_pagamentos(self, data_inicio: Optional[str], data_fim: Optional[str],
+                             id_atividade: Optional[int], pagador: Optional[str],
+                             limite: Optional[int]) -> tuple:
+        """Consulta de listar_pagamentos, em ordem cronológica"""
+        limite = min(limite or LIMITE_PAGAMENTOS, LIMITE_PAGAMENTOS)
+        where, params = self._filtros_pagamentos(data_inicio, data_fim, id_atividade, pagador)
+        return SQL_LISTAR_PAGAMENTOS + where + " ORDER BY p.data, p.id LIMIT %s", tuple(params + [limite])
+
+    def _lancamento_para_api(self, linha: Dict[str, Any]) -> Dict[str, Any]:
+        """Converter uma linha do histórico para a resposta da API"""
+        return {
+            "id": linha['id'],
+            "activity_id": linha['idAtividade'],
+            "activity": linha['nome'],
+            "sector": linha['setor'],
+            "payer": linha['pagador'],
+            "value": float(linha['valor']),
+            "date": self._data_exibicao(linha['data']),
+            "receipt_hash": linha['hash_comprovante'],
+        }
+
+    def _consulta_linha_tempo(self, periodo: str, data_inicio: Optional[str], data_fim: Optional[str],
+                              id_atividade: Optional[int], pagador: Optional[str]) -> tuple:
+        """Consulta de agrupar_pagamentos: somas por dia, semana ou mês da data do pagamento"""
+        if periodo not in PERIODOS_PAGAMENTOS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Período inválido: {periodo}. Use {', '.join(PERIODOS_PAGAMENTOS)}"
+            )
+        expressao = storage.expressao_periodo("p.data", periodo)
+        where, params = self._filtros_pagamentos(data_inicio, data_fim, id_atividade, pagador)
+        query = SQL_AGRUPAR_PAGAMENTOS.format(periodo=expressao) + where
+        query += f" GROUP BY {expressao} ORDER BY {expressao}"
+        return query, tuple(params)
+
+    def _periodo_para_api(self, periodo: str, grupo: Dict[str, Any]) -> Dict[str, Any]:
+        """Converter um grupo de agrupar_pagamentos; meses são rotulados MM/AAAA, como em /aggregates"""
+        rotulo = self._data_exibicao(grupo['inicio'])
+        return {
+            "period": rotulo[3:] if periodo == "month" else rotulo,
+            "start": str(grupo['inicio']),
+            **{coluna: float(grupo[coluna] or 0) for coluna in COLUNAS_PAGADORES},
+            "total": float(grupo['total'] or 0),
+            "count": int(grupo['quantidade'] or 0),
+        }
+
+    def _validar_edicao(self, valor: Optional[float], alex_rute: Optional[float],
+                        diego_ana: Optional[float]) -> None:
+        """Validar os valores de uma edição antes de abrir a transação"""
+        if any(v is not None and not math.isfinite(v) for v in (valor, alex_rute, diego_ana)):
+            raise HTTPException(status_code=400, detail="Valor inválido")
+        if valor is not None and valor <= 0:
+            raise HTTPException(status_code=400, detail="Valor deve ser maior que zero")
+        if (alex_rute is not None and alex_rute < 0) or (diego_ana is not None and diego_ana < 0):
+            raise HTTPException(status_code=400, detail="Valor pago deve ser maior ou igual a zero")
+
+    def _montar_edicao(self, id: int, activity: Dict[str, Any], atividade: Optional[str],
+                       setor: Optional[str], valor: Optional[float], data: Optional[str],
+                       alex_rute: Optional[float], diego_ana: Optional[float]) -> Optional[tuple]:
+        """
+        Montar o UPDATE de editar_atividade a partir da linha atual
+
+        Returns:
+            (consulta, parâmetros, novo estado para os totais, status) ou None se não
+            houver campos para atualizar
+        """
+        # Preparar os valores a serem atualizados
+        update_fields = []
+        params = []
         
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            # Encontrar atividade correspondente
-            query = "SELECT * FROM atividades WHERE nome = %s"
-            params = (atividade,)
+        if atividade is not None:
+            update_fields.append("nome = %s")
+            params.append(atividade)
             
-            if setor:
-                query += " AND setor = %s"
-                params = (atividade, setor)
-                
-            cursor.execute(query, params)
-            activity = cursor.fetchone()
-            
-            if not activity:
-                cursor.close()
-                connection.close()
-                raise HTTPException(status_code=404, detail=f"Atividade '{atividade}' não encontrada")
+        if setor is not None:
+            update_fields.append("setor = %s")
+            params.append(setor)
             
-            # Determinar qual campo atualizar com base no pagador
-            field_to_update = ""
-            if pagador.lower() in ['alex-rute', 'alex rute', 'alex', 'rute']:
-                field_to_update = "alex_rute"
-                new_value = (activity['alex_rute'] or 0) + valor
-            elif pagador.lower() in ['diego-ana', 'diego ana', 'diego', 'ana']:
-                field_to_update = "diego_ana"
-                new_value = (activity['diego_ana'] or 0) + valor
-            else:
-                # Tentar inferir com base no nome extraído do comprovante
-                if 'alex' in pagador.lower() or 'rute' in pagador.lower():
-                    field_to_update = "alex_rute"
-                    new_value = (activity['alex_rute'] or 0) + valor
-                elif 'diego' in pagador.lower() or 'ana' in pagador.lower():
-                    field_to_update = "diego_ana"
-                    new_value = (activity['diego_ana'] or 0) + valor
-                else:
-                    cursor.close()
-                    connection.close()
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Pagador '{pagador}' não reconhecido. Use 'Alex-Rute' ou 'Diego-Ana'"
-                    )
+        if valor is not None:
+            update_fields.append("valor = %s")
+            params.append(valor)
             
-            # Calcular novo status no mesmo passo
-            total_paid = 0
-            if field_to_update == "alex_rute":
-                total_paid = new_value + (activity['diego_ana'] or 0)
-            else:
-                total_paid = (activity['alex_rute'] or 0) + new_value
-                
-            status = "paid" if total_paid >= activity['valor'] else "pending"
+        if data is not None:
+            data_formatada = self._format_date(data)
+            update_fields.append("data = %s")
+            params.append(data_formatada)
             
-            # Atualizar o campo e status em uma única operação
-            update_query = f"UPDATE atividades SET {field_to_update} = %s, status = %s WHERE idAtividades = %s"
-            cursor.execute(update_query, (new_value, status, activity['idAtividades']))
+        if alex_rute is not None:
+            update_fields.append("alex_rute = %s")
+            params.append(alex_rute)
             
-            connection.commit()
-            cursor.close()
-            connection.close()
-            
-            # Limpar o cache após alterar os dados
-            clear_cache("activities")
+        if diego_ana is not None:
+            update_fields.append("diego_ana = %s")
+            params.append(diego_ana)
+        
+        if not update_fields:
+            return None
             
-            return {
-                "sucesso": True,
-                "mensagem": f"Pagamento no valor de R$ {valor:.2f} Registrado na atividade : '{atividade}' por {pagador}",
-                "data": data
-            }
+        # Calcular o novo status com base nos valores de pagamento
+        pagos = {coluna: activity[coluna] or 0 for coluna in COLUNAS_PAGADORES}
+        if alex_rute is not None:
+            pagos['alex_rute'] = alex_rute
+        if diego_ana is not None:
+            pagos['diego_ana'] = diego_ana
+        new_total = valor if valor is not None else activity['valor']
+        
+        status = self._status_pago({**pagos, 'valor': new_total})
+        update_fields.append("status = %s")
+        params.append(status)
+        
+        update_query = "UPDATE atividades SET " + ", ".join(update_fields) + " WHERE idAtividades = %s"
+        params.append(id)
+
+        depois = {
+            'setor': setor if setor is not None else activity['setor'],
+            'valor': new_total,
+            **pagos,
+            'status': status
+        }
+        return update_query, params, depois, status
+
+    def _ajustes_edicao(self, id: int, antes: Dict[str, Any], depois: Dict[str, Any]) -> List[tuple]:
+        """
+        Lançamentos de ajuste (parâmetros de SQL_REGISTRAR_PAGAMENTO) para uma edição
+
+        Editar os valores pagos altera a soma corrente sem passar por preencher_pagamento;
+        a diferença entra no histórico, com a data de hoje, para que a soma dos lançamentos
+        continue igual à coluna.
+        """
+        ajustes = []
+        for coluna in COLUNAS_PAGADORES:
+            diferenca = (depois[coluna] or 0) - (antes[coluna] or 0)
+            if round(diferenca, 2) != 0:
+                ajustes.append((id, coluna, diferenca, date.today().isoformat(), None))
+        return ajustes
+    
+    def iterar_atividades(self, tipo: str = "todas", apos_id: Optional[int] = None,
+                          limite: Optional[int] = None, status: Optional[str] = None,
+                          setor: Optional[str] = None, data_inicio: Optional[str] = None,
+                          data_fim: Optional[str] = None, tamanho_lote: int = 500) -> LeituraEmLotes:
+        """
+        Ler atividades do cursor em lotes (fetchmany), sem materializar o resultado completo
+
+        Args:
+            tipo: 'todas', 'pendentes' ou 'pagas' (mesmo formato das listagens)
+            tamanho_lote: quantidade de linhas lidas do banco por vez
+        Returns:
+            LeituraEmLotes com lotes de dicionários já no formato da API. A consulta é
+            executada antes do retorno, para que erros de conexão ocorram antes do início
+            da resposta; quem a recebe deve iterá-la até o fim ou chamar close().
+        """
+        consultas = {
+            "todas": SQL_LISTAR_ATIVIDADES,
+            "pendentes": SQL_LISTAR_PENDENTES,
+            "pagas": SQL_LISTAR_PAGAS,
+        }
+        if tipo not in consultas:
+            raise HTTPException(status_code=400, detail=f"Tipo de listagem inválido: {tipo}")
+
+        condicoes, params = self._filtros_listagem(
+            apos_id, status if tipo == "todas" else None, setor, data_inicio, data_fim
+        )
+        query, params = self._paginar(consultas[tipo], condicoes, params, limite)
+
+        connection = None
+        try:
+            connection = get_db_connection()
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            cursor.execute(query, params)
         except HTTPException as he:
-            # Relançar exceções HTTP
             raise he
         except Exception as e:
-            logger.error(f"Erro ao registrar pagamento: {e}")
-            raise HTTPException(status_code=500, detail=f"Erro ao registrar pagamento: {str(e)}")
-                
-    def atualizar_status(self) -> Dict[str, Any]:
-        """Atualizar status de pagamento para todas as atividades com base nos valores preenchidos"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            # Atualizar status em uma única operação SQL para melhor performance
-            update_query = """
-                UPDATE atividades 
-                SET status = CASE 
-                    WHEN (COALESCE(alex_rute, 0) + COALESCE(diego_ana, 0)) >= valor THEN 'paid' 
-                    ELSE 'pending' 
-                END
-            """
-            cursor.execute(update_query)
-            updated_count = cursor.rowcount
-            
-            connection.commit()
-            cursor.close()
-            connection.close()
-            
-            # Limpar cache após atualização
-            clear_cache("activities")
-            
+            if connection is not None:
+                connection.close()
+            logger.error(f"Erro ao iniciar leitura de atividades: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao listar atividades: {str(e)}")
+
+        return LeituraEmLotes(connection, cursor, partial(self._linha_para_api, tipo), tamanho_lote)
+
+    @staticmethod
+    def _linha_para_api(tipo: str, activity: Dict[str, Any]) -> Dict[str, Any]:
+        """Converter uma linha do banco para o formato de Activity, PendingActivity ou PaidActivity"""
+        pagos = {coluna: float(activity[coluna] or 0) for coluna in COLUNAS_PAGADORES}
+
+        if tipo == "pendentes":
             return {
-                "sucesso": True,
-                "mensagem": "Status do pagamento atualizado com sucesso",
-                "atividades_atualizadas": updated_count
+                "id": activity['idAtividades'],
+                "activity": activity['nome'],
+                "sector": activity['setor'],
+                "total_value": float(activity['valor']),
+                "valor_restante": float(activity['valor_restante']),
+                "date": activity['data'],
+                **pagos,
             }
-        except Exception as e:
-            logger.error(f"Erro ao atualizar status: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao atualizar status: {str(e)}")
-    
-    @cached(expiry=30, key_prefix="activities")
-    def listar_atividades_pendentes(self) -> List[PendingActivity]:
-        """Listar todas as atividades com pagamentos pendentes"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            # Otimizar a consulta para retornar apenas atividades pendentes em uma única operação
-            query = """
-                SELECT idAtividades, nome, setor, valor, data, 
-                       COALESCE(alex_rute, 0) as alex_rute, 
-                       COALESCE(diego_ana, 0) as diego_ana,
-                       (valor - COALESCE(alex_rute, 0) - COALESCE(diego_ana, 0)) as valor_restante
-                FROM atividades 
-                WHERE status = 'pending' AND 
-                      (valor - COALESCE(alex_rute, 0) - COALESCE(diego_ana, 0)) > 0
-            """
-            cursor.execute(query)
-            activities = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
-            
-            atividades_pendentes = []
-            
-            for activity in activities:
+
+        return {
+            "id": activity['idAtividades'],
+            "activity": activity['nome'],
+            "sector": activity['setor'],
+            "value" if tipo == "todas" else "total_value": float(activity['valor']),
+            "date": activity['data'],
+            **pagos,
+            "status": activity['status'],
+        }
+
+    def _montar_resumo_dashboard(self, db_activities: List[Dict[str, Any]]) -> DashboardSummary:
+        """Separar as linhas de atividades nas listas do dashboard e somar os totais"""
+        atividades = []
+        atividades_pendentes = []
+        atividades_pagas = []
+        total = 0.0
+        totais_pagos = dict.fromkeys(COLUNAS_PAGADORES, 0.0)
+
+        for activity in db_activities:
+            valor = float(activity['valor'] or 0)
+            pagos = {coluna: float(activity[coluna] or 0) for coluna in COLUNAS_PAGADORES}
+            valor_restante = valor - sum(pagos.values())
+
+            total += valor
+            for coluna, pago in pagos.items():
+                totais_pagos[coluna] += pago
+
+            atividades.append(Activity(
+                id=activity['idAtividades'],
+                activity=activity['nome'],
+                sector=activity['setor'],
+                value=valor,
+                date=activity['data'],
+                **pagos,
+                status=activity['status']
+            ))
+
+            # Mesmos critérios de listar_atividades_pendentes e listar_atividades_pagas
+            if activity['status'] == 'pending' and valor_restante > 0:
                 atividades_pendentes.append(PendingActivity(
                     id=activity['idAtividades'],
                     activity=activity['nome'],
                     sector=activity['setor'],
-                    total_value=activity['valor'],
-                    valor_restante=activity['valor_restante'],
+                    total_value=valor,
+                    valor_restante=valor_restante,
                     date=activity['data'],
-                    alex_rute=activity['alex_rute'],
-                    diego_ana=activity['diego_ana']
-                ))
-                    
-            return atividades_pendentes
-        except Exception as e:
-            logger.error(f"Erro ao listar atividades pendentes: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao listar atividades pendentes: {str(e)}")
-    
-    @cached(expiry=30, key_prefix="activities") 
-    def listar_atividades(self) -> List[Activity]:
-        """Listar todas as atividades no banco de dados"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            cursor.execute("SELECT * FROM atividades")
-            db_activities = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
-            
-            activities_list = []
-            
-            for activity in db_activities:
-                # Data já está armazenada como string
-                date_str = activity['data']
-                    
-                activities_list.append(Activity(
-                    id=activity['idAtividades'],
-                    activity=activity['nome'],
-                    sector=activity['setor'],
-                    value=activity['valor'],
-                    date=date_str,
-                    diego_ana=activity['diego_ana'] or 0,
-                    alex_rute=activity['alex_rute'] or 0,
-                    status=activity['status']
+                    **pagos
                 ))
-            
-            return activities_list
-        except Exception as e:
-            logger.error(f"Erro ao listar atividades: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao listar atividades: {str(e)}")
-    
-    @cached(expiry=30, key_prefix="activities")    
-    def listar_atividades_pagas(self) -> List[PaidActivity]:
-        """Listar todas as atividades pagas"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            cursor.execute("SELECT * FROM atividades WHERE status = 'paid'")
-            db_activities = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
-            
-            atividades_pagas = []
-            
-            for activity in db_activities:
-                # Data já está armazenada como string
-                date_str = activity['data']
-                    
+            elif activity['status'] == 'paid':
                 atividades_pagas.append(PaidActivity(
                     id=activity['idAtividades'],
                     activity=activity['nome'],
                     sector=activity['setor'],
-                    total_value=activity['valor'],
-                    date=date_str,
-                    diego_ana=activity['diego_ana'] or 0,
-                    alex_rute=activity['alex_rute'] or 0,
+                    total_value=valor,
+                    date=activity['data'],
+                    **pagos,
                     status=activity['status']
                 ))
-            
-            return atividades_pagas
-        except Exception as e:
-            logger.error(f"Erro ao listar atividades pagas: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao listar atividades pagas: {str(e)}")
-            
-    def adicionar_atividade(self, data: str, valor: float, 
-                           setor: str, atividade: str) -> Dict[str, Any]:
-        """Adicionar uma nova atividade ao banco de dados"""
-        try:
-            logger.debug(f"Adicionando atividade: {atividade}, setor: {setor}, valor: {valor}, data: {data}")
-            
-            # Verificar valores
-            if not atividade or not setor:
-                raise HTTPException(status_code=400, detail="Atividade e setor são obrigatórios")
-                
-            if valor <= 0:
-                raise HTTPException(status_code=400, detail="Valor deve ser maior que zero")
-                
-            # Formatar data
-            data_formatada = self._format_date(data)
-            
-            # Inserir atividade
-            connection = get_db_connection()
-            cursor = connection.cursor()
-            
-            insert_query = """
-                INSERT INTO atividades (nome, valor, data, setor, status) 
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            cursor.execute(insert_query, (atividade, valor, data_formatada, setor, "pending"))
-            
-            activity_id = cursor.lastrowid
-            
-            connection.commit()
-            cursor.close()
-            connection.close()
-            
-            # Limpar cache após adicionar
-            clear_cache("activities")
-            
-            return {
-                "sucesso": True, 
-                "mensagem": f"Atividade '{atividade}' adicionada com sucesso",
-                "id": activity_id
-            }
-        except HTTPException as he:
-            # Relançar exceções HTTP
-            raise he
-        except Exception as e:
-            logger.error(f"Erro ao adicionar atividade: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao adicionar atividade: {str(e)}")
-    
-    def excluir_atividade(self, id: int) -> Dict[str, Any]:
-        """Excluir uma atividade pelo ID"""
+
+        return DashboardSummary(
+            atividades=atividades,
+            atividades_pendentes=atividades_pendentes,
+            atividades_pagas=atividades_pagas,
+            totais=DashboardTotals(
+                total=total,
+                total_pago=sum(totais_pagos.values()),
+                total_pago_diego=totais_pagos['diego_ana'],
+                total_pago_alex=totais_pagos['alex_rute']
+            )
+        )
+
+    def _consulta_agregacao(self, dimensoes: tuple, metricas: tuple) -> str:
+        """Validar dimensões e métricas e montar a consulta de agregar_atividades"""
+        invalidas = [d for d in dimensoes if d not in DIMENSOES_AGREGACAO]
+        invalidas += [m for m in metricas if m not in METRICAS_AGREGACAO]
+        if invalidas:
+            raise HTTPException(status_code=400, detail=f"Parâmetros de agregação inválidos: {', '.join(invalidas)}")
+        if not metricas:
+            raise HTTPException(status_code=400, detail="Informe ao menos uma métrica")
+
+        # Com 'payer' cada atividade aparece uma vez por pagador, com o valor pago por ele;
+        # só sum_paid é por pagador (valor e contagem seriam repetidos em cada grupo)
+        chaves = self.pagadores.chaves
+        if "payer" in dimensoes:
+            repetidas = [m for m in metricas if m not in METRICAS_POR_PAGADOR]
+            if repetidas:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Com a dimensão payer use apenas {', '.join(METRICAS_POR_PAGADOR)} "
+                           f"(inválidas: {', '.join(repetidas)})"
+                )
+            origem = "(" + " UNION ALL ".join(
+                f"SELECT setor, data, status, valor, '{chave}' AS pagador, COALESCE({chave}, 0) AS valor_pago "
+                "FROM atividades"
+                for chave in chaves
+            ) + ") AS a"
+        else:
+            pago = " + ".join(f"COALESCE({chave}, 0)" for chave in chaves)
+            origem = f"(SELECT setor, data, status, valor, {pago} AS valor_pago FROM atividades) AS a"
+
+        colunas = [f"{DIMENSOES_AGREGACAO[d]} AS {d}" for d in dimensoes]
+        colunas += [f"{METRICAS_AGREGACAO[m]} AS {m}" for m in metricas]
+        query = f"SELECT {', '.join(colunas)} FROM {origem}"
+        if dimensoes:
+            query += " GROUP BY " + ", ".join(DIMENSOES_AGREGACAO[d] for d in dimensoes)
+        return query
+
+    def _linhas_agregacao(self, grupos: List[Dict[str, Any]], dimensoes: tuple,
+                          metricas: tuple) -> List[Dict[str, Any]]:
+        """Converter os grupos retornados pelo banco e ordená-los pelas dimensões"""
+        linhas = []
+        for grupo in grupos:
+            linha = {d: grupo[d] for d in dimensoes}
+            for m in metricas:
+                linha[m] = int(grupo[m] or 0) if m == "count" else float(grupo[m] or 0)
+            linhas.append(linha)
+
+        # Ordenar meses cronologicamente (MM/AAAA -> AAAA/MM)
+        def chave_ordenacao(linha):
+            return tuple(
+                (linha[d][3:] + linha[d][:2]) if d == "month" and linha[d] else (linha[d] or "")
+                for d in dimensoes
+            )
+
+        linhas.sort(key=chave_ordenacao)
+        return linhas
+
+    @staticmethod
+    def _estado_nova_atividade(setor: str, valor: float, status: str = "pending") -> Dict[str, Any]:
+        """Estado de uma atividade recém-inserida (nada pago), para os totais"""
+        return {'setor': setor, 'valor': valor, **dict.fromkeys(COLUNAS_PAGADORES, 0), 'status': status}
+
+    def _validar_nova_atividade(self, atividade: str, setor: str, valor: float) -> None:
+        """Validar os campos obrigatórios de uma nova atividade"""
+        if not atividade or not setor:
+            raise HTTPException(status_code=400, detail="Atividade e setor são obrigatórios")
+            
+        if not math.isfinite(valor):
+            raise HTTPException(status_code=400, detail="Valor inválido")
+        if valor <= 0:
+            raise HTTPException(status_code=400, detail="Valor deve ser maior que zero")
+
+    def _preparar_importacao(self, linhas: List[Dict[str, Any]]) -> tuple:
+        """
+        Validar e normalizar as linhas de uma importação em lote
+
+        Cada linha deve ter atividade, valor, setor e data; o valor passa por _parse_value
+        (aceita "R$ 1.234,56") e a data por _format_date, que precisa resultar em DD/MM/AAAA.
+
+        Returns:
+            (parâmetros de SQL_INSERIR_ATIVIDADE das linhas válidas, erros por linha)
+        """
+        if len(linhas) > LIMITE_IMPORTACAO:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Máximo de {LIMITE_IMPORTACAO} linhas por importação (recebidas {len(linhas)})"
+            )
+
+        validas = []
+        erros = []
+        for numero, linha in enumerate(linhas, start=1):
+            try:
+                atividade = str(linha.get("atividade") or "").strip()
+                setor = str(linha.get("setor") or "").strip()
+                valor_bruto = linha.get("valor")
+                if valor_bruto is None or str(valor_bruto).strip() == "":
+                    raise HTTPException(status_code=400, detail="Valor é obrigatório")
+                valor = self._parse_value(valor_bruto)
+                self._validar_nova_atividade(atividade, setor, valor)
+
+                data = self._format_date(str(linha.get("data") or "").strip())
+                if not data or not re.fullmatch(r'\d{2}/\d{2}/\d{4}', data):
+                    raise HTTPException(status_code=400, detail=f"Data inválida: {linha.get('data')!r}")
+
+                validas.append((atividade, valor, data, setor, "pending"))
+            except HTTPException as he:
+                erros.append({"linha": numero, "erro": he.detail})
+            except (TypeError, AttributeError, ValueError) as e:
+                # Linha fora do formato esperado (ex.: não é um objeto, campo de tipo inesperado)
+                erros.append({"linha": numero, "erro": f"Linha inválida: {e}"})
+
+        return validas, erros
+
+    def _resultado_importacao(self, erros: List[Dict[str, Any]], inseridas: int) -> Dict[str, Any]:
+        """Resposta de importar_atividades"""
+        return {
+            "sucesso": not erros,
+            "mensagem": f"{inseridas} atividade(s) importada(s), {len(erros)} linha(s) com erro",
+            "inseridas": inseridas,
+            "erros": erros
+        }
+
+    def _consulta_totais_pagadores(self) -> str:
+        """Leitura única da linha geral de totais_atividades com a coluna de cada pagador"""
+        return SQL_LER_TOTAL_GERAL.format(expressao=", ".join(self.pagadores.chaves))
+
+    def _montar_totais_pagadores(self, linha: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Resposta de obter_totais_pagadores"""
+        linha = linha or {}
+        pagadores = [
+            {"payer": p["chave"], "name": p["nome"], "total": float(linha.get(p["chave"]) or 0)}
+            for p in self.pagadores.pagadores
+        ]
+        return {"payers": pagadores, "total": sum(p["total"] for p in pagadores)}
+
+    @staticmethod
+    def _total_do_pagador(totais: Dict[str, Any], chave: str) -> float:
+        return next((p["total"] for p in totais["payers"] if p["payer"] == chave), 0.0)
+
+    def _montar_totais(self, linhas: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Organizar as linhas de totais_atividades em geral e por setor"""
+        totais = {"geral": {campo: 0 for campo in CAMPOS_TOTAIS}, "setores": {}}
+        for linha in linhas:
+            valores = {campo: float(linha[campo] or 0) for campo in CAMPOS_TOTAIS}
+            valores["pendentes"] = int(valores["pendentes"])
+            valores["quantidade"] = int(valores["quantidade"])
+            if linha['escopo'] == 'geral':
+                totais["geral"] = valores
+            elif valores["quantidade"] > 0:
+                totais["setores"][linha['chave']] = valores
+        return totais
+
+    def reconciliar_totais(self) -> Dict[str, Any]:
+        """
+        Reconstruir totais_atividades a partir da tabela de atividades, retornando as
+        linhas que divergiam do valor mantido incrementalmente
+        """
+        connection = None
         try:
             connection = get_db_connection()
             cursor = connection.cursor(dictionary=True)
-            
-            # Verificar se a atividade existe
-            cursor.execute("SELECT nome FROM atividades WHERE idAtividades = %s", (id,))
-            activity = cursor.fetchone()
-            
-            if not activity:
-                cursor.close()
-                connection.close()
-                raise HTTPException(status_code=404, detail=f"Atividade com ID {id} não encontrada")
-            
-            activity_name = activity['nome']
-                
-            # Excluir a atividade
-            cursor.execute("DELETE FROM atividades WHERE idAtividades = %s", (id,))
+            connection.start_transaction()
+
+            consulta = SQL_LER_TOTAIS + FOR_UPDATE
+            cursor.execute(consulta)
+            anteriores = {(l['escopo'], l['chave']): l for l in cursor.fetchall()}
+
+            cursor.execute("DELETE FROM totais_atividades")
+            cursor.execute(SQL_RECALCULAR_TOTAIS)
+
+            cursor.execute(consulta)
+            recalculados = {(l['escopo'], l['chave']): l for l in cursor.fetchall()}
+
             connection.commit()
-            
             cursor.close()
-            connection.close()
-            
-            # Limpar cache após excluir
-            clear_cache("activities")
-            
+
+            divergencias = []
+            vazio = {campo: 0 for campo in CAMPOS_TOTAIS}
+            for escopo, chave in sorted(set(anteriores) | set(recalculados)):
+                antes = anteriores.get((escopo, chave), vazio)
+                depois = recalculados.get((escopo, chave), vazio)
+                diferencas = {
+                    campo: {"mantido": float(antes[campo] or 0), "recalculado": float(depois[campo] or 0)}
+                    for campo in CAMPOS_TOTAIS
+                    if round(float(antes[campo] or 0), 2) != round(float(depois[campo] or 0), 2)
+                }
+                if diferencas:
+                    divergencias.append({"escopo": escopo, "chave": chave, "campos": diferencas})
+
+            if divergencias:
+                logger.warning(f"Totais reconciliados com {len(divergencias)} divergência(s): {divergencias}")
+
+            invalidate("atividades")
+
             return {
                 "sucesso": True,
-                "mensagem": f"Atividade '{activity_name}' excluída com sucesso"
+                "mensagem": "Totais reconstruídos a partir das atividades",
+                "divergencias": divergencias
             }
         except HTTPException as he:
-            # Relançar exceções HTTP
+            self._desfazer(connection)
             raise he
         except Exception as e:
-            logger.error(f"Erro ao excluir atividade: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao excluir atividade: {str(e)}")
-    
-    def editar_atividade(self, id: int, atividade: Optional[str] = None, 
-                       setor: Optional[str] = None, valor: Optional[float] = None,
-                       data: Optional[str] = None, alex_rute: Optional[float] = None, 
-                       diego_ana: Optional[float] = None) -> Dict[str, Any]:
-        """Editar uma atividade existente pelo ID"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            # Verificar se a atividade existe
-            cursor.execute("SELECT * FROM atividades WHERE idAtividades = %s", (id,))
-            activity = cursor.fetchone()
-            
-            if not activity:
-                cursor.close()
+            self._desfazer(connection)
+            logger.error(f"Erro ao reconciliar totais: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao reconciliar totais: {str(e)}")
+        finally:
+            if connection is not None:
                 connection.close()
-                raise HTTPException(status_code=404, detail=f"Atividade com ID {id} não encontrada")
-            
-            # Preparar os valores a serem atualizados
-            update_fields = []
-            params = []
-            
-            if atividade is not None:
-                update_fields.append("nome = %s")
-                params.append(atividade)
-                
-            if setor is not None:
-                update_fields.append("setor = %s")
-                params.append(setor)
-                
-            if valor is not None:
-                if valor <= 0:
-                    raise HTTPException(status_code=400, detail="Valor deve ser maior que zero")
-                update_fields.append("valor = %s")
-                params.append(valor)
-                
-            if data is not None:
-                data_formatada = self._format_date(data)
-                update_fields.append("data = %s")
-                params.append(data_formatada)
-                
-            if alex_rute is not None:
-                if alex_rute < 0:
-                    raise HTTPException(status_code=400, detail="Valor pago deve ser maior ou igual a zero")
-                update_fields.append("alex_rute = %s")
-                params.append(alex_rute)
-                
-            if diego_ana is not None:
-                if diego_ana < 0:
-                    raise HTTPException(status_code=400, detail="Valor pago deve ser maior ou igual a zero")
-                update_fields.append("diego_ana = %s")
-                params.append(diego_ana)
-            
-            # Se não há campos para atualizar, retorna
-            if not update_fields:
-                cursor.close()
-                connection.close()
-                return {"sucesso": False, "mensagem": "Nenhum campo fornecido para atualização"}
-                
-            # Calcular o novo status com base nos valores de pagamento
-            new_alex = alex_rute if alex_rute is not None else activity['alex_rute'] or 0
-            new_diego = diego_ana if diego_ana is not None else activity['diego_ana'] or 0
-            new_total = valor if valor is not None else activity['valor']
-            
-            status = "paid" if (new_alex + new_diego) >= new_total else "pending"
-            update_fields.append("status = %s")
-            params.append(status)
-            
-            # Construir e executar a consulta de atualização
-            update_query = "UPDATE atividades SET " + ", ".join(update_fields) + " WHERE idAtividades = %s"
-            params.append(id)
-            
-            cursor.execute(update_query, params)
-            connection.commit()
-            
-            cursor.close()
-            connection.close()
-            
-            # Limpar cache após atualização
-            clear_cache("activities")
-            
-            return {
-                "sucesso": True,
-                "mensagem": f"Atividade ID {id} atualizada com sucesso",
-                "status_atual": status
-            }
-        except HTTPException as he:
-            # Relançar exceções HTTP
-            raise he
-        except Exception as e:
-            logger.error(f"Erro ao editar atividade: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao editar atividade: {str(e)}")
-    
-    @cached(expiry=30, key_prefix="valor_total")
-    def calcular_valor_total(self) -> float:
-        """Calcular o valor total das atividades"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor()
-            
-            # Usar SQL para calcular a soma diretamente
-            cursor.execute("SELECT SUM(valor) as total FROM atividades")
-            result = cursor.fetchone()
-            
-            cursor.close()
-            connection.close()
-            
-            # Retornar o valor total ou 0 se for NULL
-            return result[0] or 0
-        except Exception as e:
-            logger.error(f"Erro ao calcular valor total: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao calcular valor total: {str(e)}")
-    
-    @cached(expiry=30, key_prefix="valor_total_pago")
-    def calcular_valor_total_pago(self) -> float:
-        """Calcular o valor total pago"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor()
-            
-            # Usar SQL para calcular a soma diretamente
-            cursor.execute("SELECT SUM(COALESCE(alex_rute, 0) + COALESCE(diego_ana, 0)) as total_pago FROM atividades")
-            result = cursor.fetchone()
-            
-            cursor.close()
-            connection.close()
-            
-            # Retornar o valor total pago ou 0 se for NULL
-            return result[0] or 0
-        except Exception as e:
-            logger.error(f"Erro ao calcular valor total pago: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao calcular valor total pago: {str(e)}")
-    
-    @cached(expiry=30, key_prefix="valor_pago_diego")
-    def calcular_valor_pago_diego(self) -> float:
-        """Calcular o valor total pago por Diego-Ana"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor()
-            
-            # Usar SQL para calcular a soma diretamente
-            cursor.execute("SELECT SUM(COALESCE(diego_ana, 0)) as total_diego FROM atividades")
-            result = cursor.fetchone()
-            
-            cursor.close()
-            connection.close()
-            
-            # Retornar o valor total pago por Diego-Ana ou 0 se for NULL
-            return result[0] or 0
-        except Exception as e:
-            logger.error(f"Erro ao calcular valor pago por Diego-Ana: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao calcular valor pago por Diego-Ana: {str(e)}")
-    
-    @cached(expiry=30, key_prefix="valor_pago_alex")
-    def calcular_valor_pago_alex(self) -> float:
-        """Calcular o valor total pago por Alex-Rute"""
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor()
-            
-            # Usar SQL para calcular a soma diretamente
-            cursor.execute("SELECT SUM(COALESCE(alex_rute, 0)) as total_alex FROM atividades")
-            result = cursor.fetchone()
-            
-            cursor.close()
-            connection.close()
-            
-            # Retornar o valor total pago por Alex-Rute ou 0 se for NULL
-            return result[0] or 0
-        except Exception as e:
-            logger.error(f"Erro ao calcular valor pago por Alex-Rute: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Erro ao calcular valor pago por Alex-Rute: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,485 @@
+from typing import List, Dict, Any, Optional
+from fastapi import HTTPException
+from config import logger
+from database import get_async_connection
+from models import PendingActivity, Activity, PaidActivity, DashboardSummary
+from utils.cache import cached, invalidate
+from managers.comprovante import (
+    ComprovantesManager, CACHE_TTL_ATIVIDADES, CACHE_STALE_ATIVIDADES, SQL_APLICAR_DELTA_TOTAIS,
+    SQL_RECALCULAR_TOTAIS, SQL_LER_TOTAIS, SQL_LER_TOTAL_GERAL, SQL_LISTAR_ATIVIDADES,
+    SQL_LISTAR_PAGAS, SQL_LISTAR_PENDENTES, SQL_RESUMO_DASHBOARD, SQL_INSERIR_ATIVIDADE, FOR_UPDATE,
+    SQL_LER_PAGAMENTO_APLICADO, SQL_REGISTRAR_PAGAMENTO, SQL_ATUALIZAR_STATUS
+)
+
+
+class AsyncComprovantesManager(ComprovantesManager):
+    """
+    Operações de leitura e escrita usadas pelos endpoints, sobre o driver assíncrono
+
+    Reaproveita as consultas e validações de ComprovantesManager; a espera pelo banco não
+    ocupa threads do threadpool. As operações herdadas (carregar_pagadores,
+    iterar_atividades, reconciliar_totais) continuam síncronas.
+
+    Args:
+        conectar: fábrica de conexões (context manager assíncrono); por padrão o pool
+            de database.get_async_connection (aiomysql ou SQLite, conforme o backend)
+    """
+
+    def __init__(self, conectar=get_async_connection):
+        super().__init__()
+        self._conectar = conectar
+
+    async def _buscar_todos(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """Executar uma consulta de leitura e retornar todas as linhas como dicionários"""
+        async with self._conectar() as connection:
+            async with connection.cursor(dictionary=True) as cursor:
+                await cursor.execute(query, params)
+                return await cursor.fetchall()
+
+    async def _aplicar_mudanca_totais(self, cursor, antes: Optional[Dict[str, Any]] = None,
+                                      depois: Optional[Dict[str, Any]] = None,
+                                      mudancas: List[tuple] = ()) -> None:
+        """Aplicar _deltas_totais em totais_atividades; deve ser chamado dentro da transação da escrita"""
+        linhas = self._deltas_totais(antes, depois, mudancas)
+        if linhas:
+            await cursor.executemany(SQL_APLICAR_DELTA_TOTAIS, linhas)
+
+    async def _total_geral(self, expressao: str) -> float:
+        """Ler uma expressão da linha geral de totais_atividades"""
+        linhas = await self._buscar_todos(SQL_LER_TOTAL_GERAL.format(expressao=f"{expressao} AS total"))
+        return (linhas[0]['total'] if linhas else 0) or 0
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="activities", tags=("atividades",),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def listar_atividades(self, apos_id: Optional[int] = None, limite: Optional[int] = None,
+                                status: Optional[str] = None, setor: Optional[str] = None,
+                                data_inicio: Optional[str] = None, data_fim: Optional[str] = None) -> List[Activity]:
+        """Listar atividades no banco de dados, opcionalmente filtradas e paginadas"""
+        condicoes, params = self._filtros_listagem(apos_id, status, setor, data_inicio, data_fim)
+        try:
+            query, params = self._paginar(SQL_LISTAR_ATIVIDADES, condicoes, params, limite)
+            db_activities = await self._buscar_todos(query, params)
+            return [Activity(**self._linha_para_api("todas", activity)) for activity in db_activities]
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao listar atividades: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao listar atividades: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="activities", tags=("atividades",),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def listar_atividades_pendentes(self, apos_id: Optional[int] = None, limite: Optional[int] = None,
+                                          setor: Optional[str] = None, data_inicio: Optional[str] = None,
+                                          data_fim: Optional[str] = None) -> List[PendingActivity]:
+        """Listar atividades com pagamentos pendentes, opcionalmente filtradas e paginadas"""
+        condicoes, params = self._filtros_listagem(apos_id, None, setor, data_inicio, data_fim)
+        try:
+            query, params = self._paginar(SQL_LISTAR_PENDENTES, condicoes, params, limite)
+            db_activities = await self._buscar_todos(query, params)
+            return [PendingActivity(**self._linha_para_api("pendentes", activity)) for activity in db_activities]
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao listar atividades pendentes: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao listar atividades pendentes: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="activities", tags=("atividades",),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def listar_atividades_pagas(self, apos_id: Optional[int] = None, limite: Optional[int] = None,
+                                      setor: Optional[str] = None, data_inicio: Optional[str] = None,
+                                      data_fim: Optional[str] = None) -> List[PaidActivity]:
+        """Listar atividades pagas, opcionalmente filtradas e paginadas"""
+        condicoes, params = self._filtros_listagem(apos_id, None, setor, data_inicio, data_fim)
+        try:
+            query, params = self._paginar(SQL_LISTAR_PAGAS, condicoes, params, limite)
+            db_activities = await self._buscar_todos(query, params)
+            return [PaidActivity(**self._linha_para_api("pagas", activity)) for activity in db_activities]
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao listar atividades pagas: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao listar atividades pagas: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="activities", tags=("atividades",),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def obter_resumo_dashboard(self) -> DashboardSummary:
+        """Montar o resumo do dashboard (listas e totais) com uma única consulta"""
+        try:
+            return self._montar_resumo_dashboard(await self._buscar_todos(SQL_RESUMO_DASHBOARD))
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao montar resumo do dashboard: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao montar resumo do dashboard: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="activities", tags=("atividades", "pagadores"),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def agregar_atividades(self, dimensoes: tuple, metricas: tuple) -> List[Dict[str, Any]]:
+        """Agregar atividades no banco de dados agrupando pelas dimensões informadas"""
+        query = self._consulta_agregacao(dimensoes, metricas)
+        try:
+            return self._linhas_agregacao(await self._buscar_todos(query), dimensoes, metricas)
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao agregar atividades: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao agregar atividades: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="payments", tags=("atividades",),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def listar_pagamentos(self, data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                                id_atividade: Optional[int] = None, pagador: Optional[str] = None,
+                                limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Listar os pagamentos do histórico em ordem cronológica"""
+        query, params = self._consulta_pagamentos(data_inicio, data_fim, id_atividade, pagador, limite)
+        try:
+            return [self._lancamento_para_api(linha) for linha in await self._buscar_todos(query, params)]
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao listar pagamentos: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao listar pagamentos: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="payments", tags=("atividades",),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def agrupar_pagamentos(self, periodo: str = "month", data_inicio: Optional[str] = None,
+                                 data_fim: Optional[str] = None, id_atividade: Optional[int] = None,
+                                 pagador: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Somar os pagamentos do histórico por período (day, week ou month)"""
+        query, params = self._consulta_linha_tempo(periodo, data_inicio, data_fim, id_atividade, pagador)
+        try:
+            return [self._periodo_para_api(periodo, grupo) for grupo in await self._buscar_todos(query, params)]
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao agrupar pagamentos: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao agrupar pagamentos: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="valor_total", tags=("atividades",),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def calcular_valor_total(self) -> float:
+        """Calcular o valor total das atividades"""
+        try:
+            return await self._total_geral("valor_total")
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao calcular valor total: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao calcular valor total: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="valor_total_pago", tags=("atividades", "pagadores"),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def calcular_valor_total_pago(self) -> float:
+        """Calcular o valor total pago"""
+        try:
+            return await self._total_geral(" + ".join(self.pagadores.chaves))
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao calcular valor total pago: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao calcular valor total pago: {str(e)}")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="payers", tags=("atividades", "pagadores"),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def obter_totais_pagadores(self) -> Dict[str, Any]:
+        """Total pago por cada pagador cadastrado, em uma única consulta à tabela de totais"""
+        try:
+            linhas = await self._buscar_todos(self._consulta_totais_pagadores())
+            return self._montar_totais_pagadores(linhas[0] if linhas else None)
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao calcular totais por pagador: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao calcular totais por pagador: {str(e)}")
+
+    async def calcular_valor_pago_diego(self) -> float:
+        """Calcular o valor total pago por Diego-Ana (mesma entrada de cache de obter_totais_pagadores)"""
+        return self._total_do_pagador(await self.obter_totais_pagadores(), "diego_ana")
+
+    async def calcular_valor_pago_alex(self) -> float:
+        """Calcular o valor total pago por Alex-Rute (mesma entrada de cache de obter_totais_pagadores)"""
+        return self._total_do_pagador(await self.obter_totais_pagadores(), "alex_rute")
+
+    @cached(expiry=CACHE_TTL_ATIVIDADES, key_prefix="totais", tags=("atividades",),
+            stale_while_revalidate=CACHE_STALE_ATIVIDADES)
+    async def obter_totais(self) -> Dict[str, Any]:
+        """Totais gerais e por setor lidos diretamente de totais_atividades"""
+        try:
+            return self._montar_totais(await self._buscar_todos(SQL_LER_TOTAIS))
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao obter totais: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao obter totais: {str(e)}")
+
+    async def preencher_pagamento(self, valor_str: str, atividade: str, pagador: str,
+                                  setor: Optional[str] = None, data: Optional[str] = None,
+                                  hash_comprovante: Optional[str] = None) -> Dict[str, Any]:
+        """Registrar um pagamento no banco de dados (incremento atômico no próprio UPDATE)"""
+        lancamento, query, params = self._preparar_pagamento(
+            valor_str, atividade, pagador, setor, data, hash_comprovante
+        )
+        coluna, valor = lancamento[:2]
+
+        try:
+            async with self._conectar() as connection:
+                async with connection.cursor(dictionary=True) as cursor:
+                    # Atividade e totais são atualizados na mesma transação; em caso de
+                    # exceção get_async_connection desfaz a transação
+                    await connection.begin()
+
+                    linhas = await cursor.execute(query, params)
+                    if SQL_LER_PAGAMENTO_APLICADO is None:
+                        activity = await cursor.fetchone()
+                    elif linhas:
+                        await cursor.execute(SQL_LER_PAGAMENTO_APLICADO)
+                        activity = await cursor.fetchone()
+                    else:
+                        activity = None
+
+                    if not activity:
+                        raise HTTPException(status_code=404, detail=f"Atividade '{atividade}' não encontrada")
+
+                    await cursor.execute(SQL_REGISTRAR_PAGAMENTO, (activity['idAtividades'], *lancamento))
+                    await self._aplicar_mudanca_totais(
+                        cursor, antes=self._estado_antes_pagamento(activity, coluna, valor), depois=activity
+                    )
+
+                    await connection.commit()
+
+            # Invalidar listas e totais derivados da tabela de atividades
+            invalidate("atividades")
+
+            return {
+                "sucesso": True,
+                "mensagem": f"Pagamento no valor de R$ {valor:.2f} Registrado na atividade : '{atividade}' por {pagador}",
+                "data": data,
+                "atividade": self._estado_pagamento(activity)
+            }
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao registrar pagamento: {e}")
+            raise HTTPException(status_code=500, detail=f"Erro ao registrar pagamento: {str(e)}")
+
+    async def registrar_pagamentos_lote(self, pagamentos: List[Dict[str, Any]],
+                                        estrito: bool = False) -> Dict[str, Any]:
+        """
+        Registrar vários pagamentos em uma única transação
+
+        As atividades citadas são lidas (e bloqueadas) com uma só consulta, os valores são
+        somados em memória e gravados com um único UPDATE, junto com os totais; o cache é
+        invalidado uma vez por lote.
+
+        Args:
+            pagamentos: dicionários com atividade, pagador, valor e, opcionalmente, setor,
+                data e hash_comprovante
+            estrito: se True, nada é registrado quando algum pagamento tiver erro
+        Returns:
+            Pagamentos registrados, erros por número de linha (a partir de 1) e o novo
+            estado das atividades alteradas
+        """
+        validos, erros = self._preparar_pagamentos_lote(pagamentos)
+        if not validos or (estrito and erros):
+            return self._resultado_pagamentos_lote([], erros, {})
+
+        try:
+            async with self._conectar() as connection:
+                async with connection.cursor(dictionary=True) as cursor:
+                    await connection.begin()
+
+                    await cursor.execute(*self._consulta_pagamentos_lote(validos))
+                    mudancas, registrados, lancamentos, nao_encontrados = self._distribuir_pagamentos_lote(
+                        await cursor.fetchall(), validos
+                    )
+                    erros += nao_encontrados
+
+                    if not mudancas or (estrito and erros):
+                        await connection.rollback()
+                        return self._resultado_pagamentos_lote([], erros, {})
+
+                    await cursor.execute(*self._montar_atualizacao_lote(mudancas))
+                    await cursor.executemany(SQL_REGISTRAR_PAGAMENTO, lancamentos)
+                    await self._aplicar_mudanca_totais(cursor, mudancas=list(mudancas.values()))
+
+                    await connection.commit()
+
+            invalidate("atividades")
+
+            return self._resultado_pagamentos_lote(registrados, erros, mudancas)
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao registrar pagamentos em lote: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao registrar pagamentos em lote: {str(e)}")
+
+    async def atualizar_status(self) -> Dict[str, Any]:
+        """Atualizar status de pagamento para todas as atividades com base nos valores preenchidos"""
+        try:
+            async with self._conectar() as connection:
+                async with connection.cursor() as cursor:
+                    await connection.begin()
+
+                    updated_count = await cursor.execute(SQL_ATUALIZAR_STATUS)
+
+                    # Atualização em massa: recalcular a contagem de pendentes junto com os demais totais
+                    await cursor.execute("DELETE FROM totais_atividades")
+                    await cursor.execute(SQL_RECALCULAR_TOTAIS)
+
+                    await connection.commit()
+
+            invalidate("atividades")
+
+            return {
+                "sucesso": True,
+                "mensagem": "Status do pagamento atualizado com sucesso",
+                "atividades_atualizadas": updated_count
+            }
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao atualizar status: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao atualizar status: {str(e)}")
+
+    async def adicionar_atividade(self, data: str, valor: float,
+                                  setor: str, atividade: str) -> Dict[str, Any]:
+        """Adicionar uma nova atividade ao banco de dados"""
+        try:
+            logger.debug(f"Adicionando atividade: {atividade}, setor: {setor}, valor: {valor}, data: {data}")
+            self._validar_nova_atividade(atividade, setor, valor)
+            data_formatada = self._format_date(data)
+
+            async with self._conectar() as connection:
+                async with connection.cursor() as cursor:
+                    await connection.begin()
+
+                    await cursor.execute(SQL_INSERIR_ATIVIDADE, (atividade, valor, data_formatada, setor, "pending"))
+                    activity_id = cursor.lastrowid
+
+                    await self._aplicar_mudanca_totais(cursor, depois=self._estado_nova_atividade(setor, valor))
+
+                    await connection.commit()
+
+            invalidate("atividades")
+
+            return {
+                "sucesso": True,
+                "mensagem": f"Atividade '{atividade}' adicionada com sucesso",
+                "id": activity_id
+            }
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao adicionar atividade: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao adicionar atividade: {str(e)}")
+
+    async def importar_atividades(self, linhas: List[Dict[str, Any]], estrito: bool = False) -> Dict[str, Any]:
+        """
+        Inserir várias atividades em uma única transação (executemany)
+
+        Args:
+            linhas: dicionários com atividade, valor, setor e data
+            estrito: se True, nada é inserido quando alguma linha tiver erro
+        Returns:
+            Quantidade inserida e os erros de validação por número de linha (a partir de 1)
+        """
+        validas, erros = self._preparar_importacao(linhas)
+        if not validas or (estrito and erros):
+            return self._resultado_importacao(erros, 0)
+
+        try:
+            async with self._conectar() as connection:
+                async with connection.cursor() as cursor:
+                    await connection.begin()
+
+                    await cursor.executemany(SQL_INSERIR_ATIVIDADE, validas)
+                    await self._aplicar_mudanca_totais(cursor, mudancas=[
+                        (None, self._estado_nova_atividade(setor, valor, status))
+                        for _, valor, _, setor, status in validas
+                    ])
+
+                    await connection.commit()
+
+            invalidate("atividades")
+
+            return self._resultado_importacao(erros, len(validas))
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao importar atividades: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao importar atividades: {str(e)}")
+
+    async def excluir_atividade(self, id: int) -> Dict[str, Any]:
+        """Excluir uma atividade pelo ID"""
+        try:
+            async with self._conectar() as connection:
+                async with connection.cursor(dictionary=True) as cursor:
+                    await connection.begin()
+
+                    await cursor.execute("SELECT * FROM atividades WHERE idAtividades = %s" + FOR_UPDATE, (id,))
+                    activity = await cursor.fetchone()
+
+                    if not activity:
+                        raise HTTPException(status_code=404, detail=f"Atividade com ID {id} não encontrada")
+
+                    await cursor.execute("DELETE FROM atividades WHERE idAtividades = %s", (id,))
+                    await self._aplicar_mudanca_totais(cursor, antes=activity)
+
+                    await connection.commit()
+
+            invalidate("atividades")
+
+            return {
+                "sucesso": True,
+                "mensagem": f"Atividade '{activity['nome']}' excluída com sucesso"
+            }
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao excluir atividade: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao excluir atividade: {str(e)}")
+
+    async def editar_atividade(self, id: int, atividade: Optional[str] = None,
+                               setor: Optional[str] = None, valor: Optional[float] = None,
+                               data: Optional[str] = None, alex_rute: Optional[float] = None,
+                               diego_ana: Optional[float] = None) -> Dict[str, Any]:
+        """Editar uma atividade existente pelo ID"""
+        try:
+            self._validar_edicao(valor, alex_rute, diego_ana)
+
+            async with self._conectar() as connection:
+                async with connection.cursor(dictionary=True) as cursor:
+                    await connection.begin()
+
+                    await cursor.execute("SELECT * FROM atividades WHERE idAtividades = %s" + FOR_UPDATE, (id,))
+                    activity = await cursor.fetchone()
+
+                    if not activity:
+                        raise HTTPException(status_code=404, detail=f"Atividade com ID {id} não encontrada")
+
+                    edicao = self._montar_edicao(id, activity, atividade, setor, valor, data, alex_rute, diego_ana)
+                    if edicao is None:
+                        await connection.rollback()
+                        return {"sucesso": False, "mensagem": "Nenhum campo fornecido para atualização"}
+
+                    update_query, params, depois, status = edicao
+                    await cursor.execute(update_query, params)
+                    ajustes = self._ajustes_edicao(id, activity, depois)
+                    if ajustes:
+                        await cursor.executemany(SQL_REGISTRAR_PAGAMENTO, ajustes)
+                    await self._aplicar_mudanca_totais(cursor, antes=activity, depois=depois)
+
+                    await connection.commit()
+
+            invalidate("atividades")
+
+            return {
+                "sucesso": True,
+                "mensagem": f"Atividade ID {id} atualizada com sucesso",
+                "status_atual": status
+            }
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Erro ao editar atividade: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Erro ao editar atividade: {str(e)}")
@@ -44,12 +44,26 @@ class PaymentData(BaseModel):
     payer: str
     value: str
     date: Optional[str] = None
+    receipt_hash: Optional[str] = None  # SHA-256 do arquivo, devolvido por /process-receipt
+
+class DashboardTotals(BaseModel):
+    total: float
+    total_pago: float
+    total_pago_diego: float
+    total_pago_alex: float
+
+class DashboardSummary(BaseModel):
+    atividades: List[Activity]
+    atividades_pendentes: List[PendingActivity]
+    atividades_pagas: List[PaidActivity]
+    totais: DashboardTotals
 
 class ExtractedData(BaseModel):
     value: Optional[str] = None
     date: Optional[str] = None
     name: Optional[str] = None
     full_text: Optional[str] = None
+    receipt_hash: Optional[str] = None
 
 # Password reset models
 class PasswordResetRequest(BaseModel):
@@ -0,0 +1,22 @@
+"""
+Reconstruir a tabela totais_atividades a partir das atividades
+
+Uso: python reconciliar_totais.py
+Imprime em JSON as linhas de totais que divergiam do valor mantido incrementalmente.
+"""
+import json
+import sys
+
+from database import initialize_database
+from managers.comprovante import ComprovantesManager
+
+
+def main() -> int:
+    initialize_database()
+    resultado = ComprovantesManager().reconciliar_totais()
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    return 1 if resultado["divergencias"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
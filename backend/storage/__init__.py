@@ -0,0 +1,20 @@
+"""Backends de armazenamento (MySQL ou SQLite embutido) usados pelos managers."""
+from storage.base import StorageBackend
+from storage.pool import PoolEsgotado
+
+
+def create_storage_backend(config: dict, db_config: dict, pool_config: dict,
+                           async_pool_config: dict) -> StorageBackend:
+    """Criar o backend configurado em STORAGE_CONFIG ("mysql" ou "sqlite")"""
+    backend = config["backend"]
+    # Importação tardia: o modo SQLite não depende dos drivers MySQL
+    if backend == "sqlite":
+        from storage.sqlite import SQLiteStorage
+        return SQLiteStorage(config["sqlite_path"])
+    if backend == "mysql":
+        from storage.mysql import MySQLStorage
+        return MySQLStorage(db_config, pool_config, async_pool_config)
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
+
+
+__all__ = ["StorageBackend", "PoolEsgotado", "create_storage_backend"]
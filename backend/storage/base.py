@@ -0,0 +1,89 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+from storage.migracoes import aplicar_migracoes
+
+class StorageBackend(ABC):
+    """
+    Banco de dados usado pelos managers
+
+    Cada implementação fornece conexões síncronas com a interface do mysql-connector
+    (cursor(dictionary=...), start_transaction, commit, rollback, close), conexões
+    assíncronas com a interface do aiomysql e os trechos de SQL que mudam entre dialetos.
+    """
+
+    nome = ""
+
+    # Sufixo de SELECT que bloqueia as linhas lidas até o fim da transação
+    sufixo_bloqueio = " FOR UPDATE"
+
+    @abstractmethod
+    def inicializar(self) -> None:
+        """Preparar o pool ou o arquivo do banco"""
+
+    @abstractmethod
+    def obter_conexao(self) -> Any:
+        """Conexão síncrona; quem chama deve fechá-la com close()"""
+
+    async def inicializar_async(self) -> None:
+        """Preparar as conexões assíncronas (opcional)"""
+
+    async def fechar_async(self) -> None:
+        """Liberar as conexões assíncronas (opcional)"""
+
+    @abstractmethod
+    async def adquirir_async(self) -> Any:
+        """Conexão assíncrona; deve ser devolvida com liberar_async"""
+
+    @abstractmethod
+    def liberar_async(self, conexao: Any) -> None:
+        """Devolver uma conexão obtida com adquirir_async"""
+
+    @abstractmethod
+    def expressao_data_iso(self, coluna: str) -> str:
+        """Expressão SQL da coluna DD/MM/AAAA comparável com uma data 'AAAA-MM-DD'"""
+
+    @abstractmethod
+    def expressao_periodo(self, coluna: str, periodo: str) -> str:
+        """Expressão SQL com o início ('AAAA-MM-DD') do dia, da semana (segunda-feira) ou do mês de uma coluna DATE"""
+
+    @abstractmethod
+    def sql_upsert_soma(self, tabela: str, chaves: Iterable[str], campos: Iterable[str]) -> str:
+        """INSERT que, se a chave já existir, soma os valores informados aos campos"""
+
+    @abstractmethod
+    def sql_atualizar_primeira(self, tabela: str, chave: str, atribuicoes: str, condicao: str) -> str:
+        """
+        UPDATE atômico da primeira linha (menor `chave`) que atende `condicao`
+
+        A linha já atualizada é lida no mesmo comando quando o dialeto tem RETURNING;
+        senão, com sql_ler_atualizada logo em seguida, na mesma conexão.
+        """
+
+    def sql_ler_atualizada(self, tabela: str, chave: str) -> Optional[str]:
+        """SELECT da linha alterada pelo último sql_atualizar_primeira (None se ele já a retorna)"""
+        return None
+
+    @abstractmethod
+    def _pk_auto(self) -> str:
+        """Definição de chave primária inteira autoincrementada"""
+
+    @abstractmethod
+    def _criar_indice(self, cursor, nome: str, tabela: str, colunas: Iterable[str]) -> None:
+        """Criar o índice se ainda não existir"""
+
+    @abstractmethod
+    def varreduras_completas(self, cursor, query: str, params: Iterable[Any] = ()) -> List[str]:
+        """
+        Tabelas que a consulta percorreria por inteiro, segundo o EXPLAIN do banco
+
+        Só conta como varredura completa quando nenhum índice pode atender à consulta;
+        com poucas linhas o MySQL pode preferir ler a tabela mesmo tendo um índice utilizável.
+        """
+
+    def migrar(self, connection) -> List[int]:
+        """Aplicar as migrações pendentes (storage/migracoes.py); retorna as versões aplicadas"""
+        return aplicar_migracoes(self, connection)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Medidores das conexões (em uso, fila de espera, tempos de checkout)"""
+        return {"backend": self.nome}
@@ -0,0 +1,204 @@
+from datetime import date, datetime
+from typing import Any, List
+from config import logger
+
+# Migrações do esquema, aplicadas em ordem por aplicar_migracoes e registradas em
+# versao_esquema. Cada uma é (versão, descrição, DDLs, índices (nome, tabela, colunas)).
+# {pk_auto} é substituído pela chave primária autoincrementada do dialeto; os demais tipos
+# são aceitos tanto pelo MySQL quanto pelo SQLite. Colunas de índice com parênteses são
+# expressões (ex.: LOWER(nome)). Um passo também pode ser uma função que recebe o cursor,
+# para migrações de dados que não cabem em SQL comum aos dois dialetos.
+#
+# O MySQL confirma cada DDL na hora, então uma migração interrompida pode ficar pela
+# metade: os passos usam IF NOT EXISTS (ou WHERE NOT EXISTS, nas inclusões; e _criar_indice
+# verifica o índice) para que possam ser repetidos. Nunca altere uma migração já publicada;
+# acrescente uma nova.
+def _lancar_pagamentos_anteriores(cursor) -> None:
+    """
+    Lançar no histórico os valores pagos que não passaram por ele
+
+    Para cada atividade e pagador, a diferença entre a coluna e a soma dos lançamentos
+    (pagamentos anteriores à migração 2, edições antigas) vira um lançamento com a data da
+    atividade, ou a de hoje se ela for inválida. Depois de aplicada, a diferença é zero, então
+    repetir o passo não duplica nada.
+    """
+    cursor.execute("""
+        SELECT a.idAtividades, a.data,
+               COALESCE(a.alex_rute, 0) - COALESCE((SELECT SUM(p.valor) FROM pagamentos p
+                   WHERE p.idAtividade = a.idAtividades AND p.pagador = 'alex_rute'), 0),
+               COALESCE(a.diego_ana, 0) - COALESCE((SELECT SUM(p.valor) FROM pagamentos p
+                   WHERE p.idAtividade = a.idAtividades AND p.pagador = 'diego_ana'), 0)
+        FROM atividades a
+    """)
+    lancamentos = []
+    for id_atividade, data, *diferencas in cursor.fetchall():
+        try:
+            data_iso = datetime.strptime(data or "", "%d/%m/%Y").date().isoformat()
+        except ValueError:
+            data_iso = date.today().isoformat()
+        for pagador, diferenca in zip(("alex_rute", "diego_ana"), diferencas):
+            if round(float(diferenca), 2) != 0:
+                lancamentos.append((id_atividade, pagador, float(diferenca), data_iso))
+
+    if lancamentos:
+        cursor.executemany(
+            "INSERT INTO pagamentos (idAtividade, pagador, valor, data) VALUES (%s, %s, %s, %s)",
+            lancamentos
+        )
+    logger.info(f"Histórico de pagamentos: {len(lancamentos)} lançamento(s) de valores anteriores")
+
+
+MIGRACOES = [
+    (1, "Esquema inicial: usuários, atividades e totais", [
+        """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id {pk_auto},
+            nome VARCHAR(100) NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'ativo'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS atividades (
+            idAtividades {pk_auto},
+            nome VARCHAR(255) NOT NULL,
+            valor DOUBLE NOT NULL,
+            data VARCHAR(10),
+            setor VARCHAR(100),
+            alex_rute DOUBLE DEFAULT 0,
+            diego_ana DOUBLE DEFAULT 0,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        )
+        """,
+        # Totais mantidos incrementalmente pelas escritas em atividades
+        # (escopo 'geral' com chave vazia, ou 'setor' com o nome do setor)
+        """
+        CREATE TABLE IF NOT EXISTS totais_atividades (
+            escopo VARCHAR(20) NOT NULL,
+            chave VARCHAR(255) NOT NULL,
+            valor_total DECIMAL(15, 2) NOT NULL DEFAULT 0,
+            alex_rute DECIMAL(15, 2) NOT NULL DEFAULT 0,
+            diego_ana DECIMAL(15, 2) NOT NULL DEFAULT 0,
+            pendentes INT NOT NULL DEFAULT 0,
+            quantidade INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (escopo, chave)
+        )
+        """,
+    ], [
+        # Listas de pendentes/pagas, filtro por setor e busca do pagamento por nome e setor
+        ("idx_atividades_status", "atividades", ("status",)),
+        ("idx_atividades_setor", "atividades", ("setor",)),
+        ("idx_atividades_nome_setor", "atividades", ("nome", "setor")),
+    ]),
+    (2, "Histórico de pagamentos", [
+        # Somente inclusões; alex_rute/diego_ana em atividades continuam sendo a soma
+        # corrente. pagador é a coluna (alex_rute ou diego_ana) e data, a data do
+        # pagamento (AAAA-MM-DD), usada nas consultas por período.
+        """
+        CREATE TABLE IF NOT EXISTS pagamentos (
+            id {pk_auto},
+            idAtividade INT NOT NULL,
+            pagador VARCHAR(20) NOT NULL,
+            valor DOUBLE NOT NULL,
+            data DATE NOT NULL,
+            hash_comprovante CHAR(64),
+            registrado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (idAtividade) REFERENCES atividades (idAtividades) ON DELETE CASCADE
+        )
+        """,
+    ], [
+        ("idx_pagamentos_data", "pagamentos", ("data",)),
+        ("idx_pagamentos_atividade_data", "pagamentos", ("idAtividade", "data")),
+    ]),
+    (3, "Índice do login por nome sem diferenciar maiúsculas", [], [
+        # WHERE LOWER(nome) = LOWER(%s) em auth_user (índice funcional: MySQL 8.0.13+)
+        ("idx_usuarios_nome_lower", "usuarios", ("LOWER(nome)",)),
+    ]),
+    (4, "Pagadores como dados", [
+        # chave: coluna com o valor pago em atividades/totais_atividades e valor de
+        # pagamentos.pagador; apelidos (separados por vírgula) identificam o pagador pelo
+        # nome. Um novo pagador precisa também de uma migração com as suas colunas.
+        """
+        CREATE TABLE IF NOT EXISTS pagadores (
+            id {pk_auto},
+            chave VARCHAR(20) NOT NULL UNIQUE,
+            nome VARCHAR(100) NOT NULL,
+            apelidos VARCHAR(255) NOT NULL DEFAULT ''
+        )
+        """,
+        """
+        INSERT INTO pagadores (chave, nome, apelidos)
+        SELECT 'alex_rute', 'Alex-Rute', 'alex-rute,alex rute,alex,rute'
+        WHERE NOT EXISTS (SELECT 1 FROM pagadores WHERE chave = 'alex_rute')
+        """,
+        """
+        INSERT INTO pagadores (chave, nome, apelidos)
+        SELECT 'diego_ana', 'Diego-Ana', 'diego-ana,diego ana,diego,ana'
+        WHERE NOT EXISTS (SELECT 1 FROM pagadores WHERE chave = 'diego_ana')
+        """,
+    ], []),
+    (5, "Histórico de pagamentos com os valores já pagos", [
+        # A migração 2 criou o histórico vazio; as somas já existentes em atividades
+        # ficavam fora das consultas por período
+        _lancar_pagamentos_anteriores,
+    ], []),
+]
+
+SQL_CRIAR_VERSAO_ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS versao_esquema (
+        versao INT PRIMARY KEY,
+        descricao VARCHAR(255) NOT NULL,
+        aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def _versoes_aplicadas(cursor) -> set:
+    cursor.execute("SELECT versao FROM versao_esquema")
+    return {linha[0] for linha in cursor.fetchall()}
+
+
+def aplicar_migracoes(backend: Any, connection: Any) -> List[int]:
+    """
+    Aplicar as migrações ainda não registradas em versao_esquema
+
+    Cada migração roda em sua própria transação (atômica no SQLite; no MySQL os DDLs são
+    confirmados um a um e a repetição é segura). Se outro processo aplicar a mesma versão
+    ao mesmo tempo, o registro duplicado é ignorado.
+
+    Returns:
+        As versões aplicadas nesta chamada
+    """
+    cursor = connection.cursor()
+    cursor.execute(SQL_CRIAR_VERSAO_ESQUEMA)
+    connection.commit()
+
+    aplicadas = []
+    for versao, descricao, ddls, indices in MIGRACOES:
+        if versao in _versoes_aplicadas(cursor):
+            continue
+
+        connection.start_transaction()
+        try:
+            for ddl in ddls:
+                if callable(ddl):
+                    ddl(cursor)
+                else:
+                    cursor.execute(ddl.format(pk_auto=backend._pk_auto()))
+            for nome, tabela, colunas in indices:
+                backend._criar_indice(cursor, nome, tabela, colunas)
+            cursor.execute(
+                "INSERT INTO versao_esquema (versao, descricao) VALUES (%s, %s)", (versao, descricao)
+            )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            if versao in _versoes_aplicadas(cursor):
+                continue
+            raise
+
+        logger.info(f"Migração {versao} aplicada: {descricao}")
+        aplicadas.append(versao)
+
+    cursor.close()
+    return aplicadas
@@ -0,0 +1,206 @@
+import asyncio
+import ssl
+import time
+from typing import Any, Dict, Iterable, List
+import aiomysql
+import mysql.connector
+from config import logger
+from storage.base import StorageBackend
+from storage.pool import MetricasPool, PoolConexoes, PoolEsgotado
+
+
+class _ConexaoAiomysql:
+    """Conexão do aiomysql com cursor(dictionary=...) no lugar da classe de cursor"""
+
+    def __init__(self, conexao):
+        self._conexao = conexao
+
+    def cursor(self, dictionary: bool = False):
+        return self._conexao.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor)
+
+    def __getattr__(self, nome):
+        return getattr(self._conexao, nome)
+
+
+class MySQLStorage(StorageBackend):
+    """MySQL (Cloud SQL): pool do mysql-connector para o caminho síncrono e do aiomysql para os endpoints"""
+
+    nome = "mysql"
+
+    def __init__(self, db_config: Dict[str, Any], pool_config: Dict[str, Any], async_pool_config: Dict[str, Any]):
+        self.db_config = db_config
+        self.pool_config = pool_config
+        self.async_pool_config = async_pool_config
+        self._pool = None
+        self._pool_async = None
+        self._metricas_async = MetricasPool()
+
+    @staticmethod
+    def _verificar(conexao) -> bool:
+        try:
+            conexao.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _resetar(conexao) -> None:
+        if conexao.in_transaction:
+            conexao.rollback()
+
+    @staticmethod
+    def _descartar(conexao) -> None:
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+    def inicializar(self) -> None:
+        if self._pool is not None:
+            return
+        self._pool = PoolConexoes(
+            criar=lambda: mysql.connector.connect(**self.db_config),
+            verificar=self._verificar,
+            resetar=self._resetar,
+            descartar=self._descartar,
+            **self.pool_config
+        )
+        logger.info(f"Pool de conexões inicializado com sucesso (até {self._pool.tamanho} conexões)")
+
+    def obter_conexao(self):
+        if self._pool is None:
+            self.inicializar()
+        return self._pool.obter()
+
+    def _ssl_async(self):
+        """Contexto SSL equivalente a ssl_disabled=False do mysql-connector (criptografa sem validar o certificado)"""
+        if self.db_config.get("ssl_disabled"):
+            return None
+        contexto = ssl.create_default_context()
+        contexto.check_hostname = False
+        contexto.verify_mode = ssl.CERT_NONE
+        return contexto
+
+    async def inicializar_async(self) -> None:
+        if self._pool_async is not None:
+            return
+        self._pool_async = await aiomysql.create_pool(
+            host=self.db_config["host"],
+            port=self.db_config["port"],
+            user=self.db_config["user"],
+            password=self.db_config["password"],
+            db=self.db_config["database"],
+            charset=self.db_config["charset"],
+            autocommit=self.db_config["autocommit"],
+            ssl=self._ssl_async(),
+            **self.async_pool_config
+        )
+        logger.info("Pool de conexões assíncrono inicializado com sucesso")
+
+    async def fechar_async(self) -> None:
+        if self._pool_async is not None:
+            self._pool_async.close()
+            await self._pool_async.wait_closed()
+            self._pool_async = None
+
+    async def adquirir_async(self):
+        if self._pool_async is None:
+            await self.inicializar_async()
+
+        # Mesma política do pool síncrono: fila limitada e tempo máximo de espera
+        metricas = self._metricas_async
+        cheio = self._pool_async.freesize == 0 and self._pool_async.size >= self._pool_async.maxsize
+        if cheio and metricas.esperando >= self.pool_config["max_espera"]:
+            metricas.contar("rejected")
+            raise PoolEsgotado(f"Fila de espera do pool cheia ({self.pool_config['max_espera']})")
+
+        inicio = time.monotonic()
+        if cheio:
+            metricas.esperando += 1
+        try:
+            conexao = await asyncio.wait_for(self._pool_async.acquire(), self.pool_config["timeout"])
+        except asyncio.TimeoutError:
+            metricas.contar("timeouts")
+            raise PoolEsgotado(f"Nenhuma conexão liberada em {self.pool_config['timeout']:g}s")
+        finally:
+            if cheio:
+                metricas.esperando -= 1
+        decorrido = time.monotonic() - inicio
+        metricas.registrar_checkout(decorrido, decorrido)
+        return _ConexaoAiomysql(conexao)
+
+    def liberar_async(self, conexao) -> None:
+        self._pool_async.release(conexao._conexao)
+
+    def expressao_data_iso(self, coluna: str) -> str:
+        # '%%' porque a consulta passa pela formatação de parâmetros do driver
+        return f"STR_TO_DATE({coluna}, '%%d/%%m/%%Y')"
+
+    def expressao_periodo(self, coluna: str, periodo: str) -> str:
+        inicio = {
+            "day": coluna,
+            "week": f"DATE_SUB({coluna}, INTERVAL WEEKDAY({coluna}) DAY)",
+            "month": f"DATE_SUB({coluna}, INTERVAL DAYOFMONTH({coluna}) - 1 DAY)",
+        }[periodo]
+        return f"DATE_FORMAT({inicio}, '%%Y-%%m-%%d')"
+
+    def sql_upsert_soma(self, tabela: str, chaves: Iterable[str], campos: Iterable[str]) -> str:
+        colunas = list(chaves) + list(campos)
+        atualizacoes = ",\n        ".join(f"{c} = {c} + VALUES({c})" for c in campos)
+        return f"""
+    INSERT INTO {tabela} ({', '.join(colunas)})
+    VALUES ({', '.join(['%s'] * len(colunas))})
+    ON DUPLICATE KEY UPDATE
+        {atualizacoes}
+"""
+
+    def sql_atualizar_primeira(self, tabela: str, chave: str, atribuicoes: str, condicao: str) -> str:
+        # Sem RETURNING: LAST_INSERT_ID(expr) guarda a chave da linha alterada na conexão
+        return (
+            f"UPDATE {tabela} SET {atribuicoes}, {chave} = LAST_INSERT_ID({chave}) "
+            f"WHERE {condicao} ORDER BY {chave} LIMIT 1"
+        )
+
+    def sql_ler_atualizada(self, tabela: str, chave: str) -> str:
+        return f"SELECT * FROM {tabela} WHERE {chave} = LAST_INSERT_ID()"
+
+    def _pk_auto(self) -> str:
+        return "INT AUTO_INCREMENT PRIMARY KEY"
+
+    def _criar_indice(self, cursor, nome: str, tabela: str, colunas: Iterable[str]) -> None:
+        # O MySQL não tem CREATE INDEX IF NOT EXISTS
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (tabela, nome))
+        if cursor.fetchone()[0] == 0:
+            # Partes funcionais (expressões) vão entre parênteses
+            partes = ", ".join(f"({c})" if "(" in c else c for c in colunas)
+            cursor.execute(f"CREATE INDEX {nome} ON {tabela} ({partes})")
+
+    def varreduras_completas(self, cursor, query: str, params: Iterable[Any] = ()) -> List[str]:
+        cursor.execute("EXPLAIN " + query, tuple(params))
+        colunas = [d[0] for d in cursor.description]
+        varreduras = []
+        for linha in cursor.fetchall():
+            plano = dict(zip(colunas, linha))
+            tabela = plano.get("table") or ""
+            # Tabelas derivadas (<derived2> etc.) são avaliadas pelas linhas de origem
+            if tabela.startswith("<"):
+                continue
+            if plano.get("type") in ("ALL", "index") and not plano.get("possible_keys"):
+                varreduras.append(f"{tabela} (type={plano.get('type')})")
+        return varreduras
+
+    def estatisticas(self) -> Dict[str, Any]:
+        estatisticas = {"backend": self.nome}
+        if self._pool is not None:
+            estatisticas["sync"] = self._pool.estatisticas()
+        if self._pool_async is not None:
+            estatisticas["async"] = {
+                "size": self._pool_async.size, "max_size": self._pool_async.maxsize,
+                "in_use": self._pool_async.size - self._pool_async.freesize,
+                "idle": self._pool_async.freesize,
+                **self._metricas_async.snapshot(),
+            }
+        return estatisticas
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão foi liberada dentro do tempo limite, ou a fila de espera está cheia"""
+
+
+class MetricasPool:
+    """Contadores e tempos de checkout de um pool (síncrono ou assíncrono)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.esperando = 0
+        self._contadores = {
+            "checkouts": 0, "waited": 0, "timeouts": 0, "rejected": 0,
+            "created": 0, "recycled": 0, "ping_failures": 0,
+        }
+        self._espera_total = self._espera_max = 0.0
+        self._checkout_total = self._checkout_max = 0.0
+
+    def contar(self, nome: str) -> None:
+        with self._lock:
+            self._contadores[nome] += 1
+
+    def registrar_checkout(self, espera: float, latencia: float) -> None:
+        """espera: tempo na fila; latencia: tempo total até entregar a conexão (fila + ping/criação)"""
+        with self._lock:
+            self._contadores["checkouts"] += 1
+            if espera > 0.001:
+                self._contadores["waited"] += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+            self._checkout_total += latencia
+            self._checkout_max = max(self._checkout_max, latencia)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            checkouts = self._contadores["checkouts"] or 1
+            return {
+                **self._contadores,
+                "waiters": self.esperando,
+                "wait_ms_avg": round(self._espera_total / checkouts * 1000, 3),
+                "wait_ms_max": round(self._espera_max * 1000, 3),
+                "checkout_ms_avg": round(self._checkout_total / checkouts * 1000, 3),
+                "checkout_ms_max": round(self._checkout_max * 1000, 3),
+            }
+
+
+class _ConexaoDoPool:
+    """Conexão emprestada pelo pool; close() a devolve em vez de fechá-la"""
+
+    def __init__(self, pool: "PoolConexoes", conexao: Any, criada_em: float):
+        self._pool = pool
+        self._conexao = conexao
+        self._criada_em = criada_em
+        self._devolvida = False
+
+    def close(self) -> None:
+        if not self._devolvida:
+            self._devolvida = True
+            self._pool._devolver(self._conexao, self._criada_em)
+
+    def __getattr__(self, nome):
+        return getattr(self._conexao, nome)
+
+
+class PoolConexoes:
+    """
+    Pool de conexões que cresce sob demanda até `tamanho` e enfileira os pedidos excedentes
+
+    Quando todas as conexões estão em uso, até `max_espera` pedidos aguardam por até
+    `timeout` segundos; acima disso, ou esgotado o prazo, levanta PoolEsgotado. Conexões
+    mais antigas que `reciclar_apos` são substituídas, e as ociosas há mais de
+    `verificar_apos` segundos são testadas (pre-ping) antes de serem entregues.
+
+    Args:
+        criar: abre uma conexão nova
+        verificar: retorna False se a conexão não responde
+        resetar: desfaz o estado deixado por quem a usou (transação aberta etc.)
+        descartar: fecha a conexão ignorando erros
+    """
+
+    def __init__(self, criar: Callable[[], Any], verificar: Callable[[Any], bool],
+                 resetar: Callable[[Any], None], descartar: Callable[[Any], None],
+                 tamanho: int, max_espera: int, timeout: float,
+                 reciclar_apos: float, verificar_apos: float):
+        self._criar = criar
+        self._verificar = verificar
+        self._resetar = resetar
+        self._descartar = descartar
+        self.tamanho = tamanho
+        self.max_espera = max_espera
+        self.timeout = timeout
+        self.reciclar_apos = reciclar_apos
+        self.verificar_apos = verificar_apos
+
+        self._cond = threading.Condition()
+        # Pilha (LIFO) de (conexão, criada_em, devolvida_em): reutiliza as mais recentes
+        self._ociosas = deque()
+        self._abertas = 0
+        self._em_uso = 0
+        self.metricas = MetricasPool()
+
+    def obter(self) -> _ConexaoDoPool:
+        """Emprestar uma conexão, aguardando na fila se o pool estiver cheio"""
+        inicio = time.monotonic()
+        with self._cond:
+            if not self._ociosas and self._abertas >= self.tamanho:
+                if self.metricas.esperando >= self.max_espera:
+                    self.metricas.contar("rejected")
+                    raise PoolEsgotado(f"Fila de espera do pool cheia ({self.max_espera})")
+
+                prazo = inicio + self.timeout
+                self.metricas.esperando += 1
+                try:
+                    while not self._ociosas and self._abertas >= self.tamanho:
+                        restante = prazo - time.monotonic()
+                        if restante <= 0:
+                            self.metricas.contar("timeouts")
+                            raise PoolEsgotado(f"Nenhuma conexão liberada em {self.timeout:g}s")
+                        self._cond.wait(restante)
+                finally:
+                    self.metricas.esperando -= 1
+
+            if self._ociosas:
+                conexao, criada_em, devolvida_em = self._ociosas.pop()
+            else:
+                # Reservar a vaga; a conexão é aberta fora do lock
+                conexao, criada_em, devolvida_em = None, 0.0, 0.0
+                self._abertas += 1
+            self._em_uso += 1
+        espera = time.monotonic() - inicio
+
+        try:
+            agora = time.monotonic()
+            if conexao is not None and agora - criada_em > self.reciclar_apos:
+                self._descartar(conexao)
+                self.metricas.contar("recycled")
+                conexao = None
+            elif conexao is not None and agora - devolvida_em > self.verificar_apos and not self._verificar(conexao):
+                self._descartar(conexao)
+                self.metricas.contar("ping_failures")
+                conexao = None
+
+            if conexao is None:
+                conexao = self._criar()
+                criada_em = time.monotonic()
+                self.metricas.contar("created")
+        except BaseException:
+            self._liberar_vaga()
+            raise
+
+        self.metricas.registrar_checkout(espera, time.monotonic() - inicio)
+        return _ConexaoDoPool(self, conexao, criada_em)
+
+    def _liberar_vaga(self) -> None:
+        with self._cond:
+            self._abertas -= 1
+            self._em_uso -= 1
+            self._cond.notify()
+
+    def _devolver(self, conexao: Any, criada_em: float) -> None:
+        try:
+            self._resetar(conexao)
+        except Exception:
+            # Conexão em estado desconhecido: descartar e liberar a vaga
+            self._descartar(conexao)
+            self._liberar_vaga()
+            return
+
+        with self._cond:
+            self._em_uso -= 1
+            self._ociosas.append((conexao, criada_em, time.monotonic()))
+            self._cond.notify()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._cond:
+            medidores = {
+                "size": self._abertas, "max_size": self.tamanho,
+                "in_use": self._em_uso, "idle": len(self._ociosas),
+            }
+        return {**medidores, **self.metricas.snapshot()}
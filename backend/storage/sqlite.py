@@ -0,0 +1,271 @@
+import asyncio
+import re
+import sqlite3
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Iterable, List
+from config import logger
+from storage.base import StorageBackend
+
+# Valores vindos do MySQL (DECIMAL) podem ser repassados como parâmetro
+sqlite3.register_adapter(Decimal, float)
+
+
+@lru_cache(maxsize=256)
+def _traduzir(query: str) -> str:
+    """Trocar os marcadores do mysql-connector (%s, %%) pelos do sqlite3 (?, %)"""
+    return re.sub(r"%([s%])", lambda m: "?" if m.group(1) == "s" else "%", query)
+
+
+class CursorSQLite:
+    """Cursor do sqlite3 com a interface usada do mysql-connector"""
+
+    def __init__(self, cursor: sqlite3.Cursor, dicionario: bool):
+        self._cursor = cursor
+        self._dicionario = dicionario
+
+    def _linha(self, linha):
+        if linha is None:
+            return None
+        return dict(linha) if self._dicionario else tuple(linha)
+
+    def execute(self, query: str, params: Iterable[Any] = ()) -> None:
+        self._cursor.execute(_traduzir(query), tuple(params or ()))
+
+    def executemany(self, query: str, seq_params: Iterable[Iterable[Any]]) -> None:
+        self._cursor.executemany(_traduzir(query), [tuple(p) for p in seq_params])
+
+    def fetchone(self):
+        return self._linha(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._linha(l) for l in self._cursor.fetchall()]
+
+    def fetchmany(self, tamanho: int):
+        return [self._linha(l) for l in self._cursor.fetchmany(tamanho)]
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> int:
+        return self._cursor.lastrowid
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class ConexaoSQLite:
+    """
+    Conexão do sqlite3 com a interface usada do mysql-connector
+
+    Fora de transações cada comando é confirmado na hora (como autocommit=True no
+    DB_CONFIG); start_transaction usa BEGIN IMMEDIATE, que reserva a escrita desde o
+    início e faz o papel do SELECT ... FOR UPDATE.
+    """
+
+    def __init__(self, path: str, timeout: float):
+        self._conexao = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conexao.row_factory = sqlite3.Row
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute("PRAGMA foreign_keys=ON")
+
+    def cursor(self, dictionary: bool = False, buffered: bool = None) -> CursorSQLite:
+        return CursorSQLite(self._conexao.cursor(), dictionary)
+
+    def start_transaction(self) -> None:
+        self._conexao.execute("BEGIN IMMEDIATE")
+
+    def commit(self) -> None:
+        if self._conexao.in_transaction:
+            self._conexao.execute("COMMIT")
+
+    def rollback(self) -> None:
+        if self._conexao.in_transaction:
+            self._conexao.execute("ROLLBACK")
+
+    def close(self) -> None:
+        self.rollback()
+        self._conexao.close()
+
+
+class _CursorSQLiteAsync:
+    """Cursor assíncrono com a interface usada do aiomysql (operações executadas em thread)"""
+
+    def __init__(self, cursor: CursorSQLite):
+        self._cursor = cursor
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._cursor.close()
+
+    async def execute(self, query: str, params: Iterable[Any] = ()) -> int:
+        await asyncio.to_thread(self._cursor.execute, query, params)
+        return self._cursor.rowcount
+
+    async def executemany(self, query: str, seq_params: Iterable[Iterable[Any]]) -> int:
+        await asyncio.to_thread(self._cursor.executemany, query, seq_params)
+        return self._cursor.rowcount
+
+    async def fetchone(self):
+        return await asyncio.to_thread(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await asyncio.to_thread(self._cursor.fetchall)
+
+    async def fetchmany(self, tamanho: int):
+        return await asyncio.to_thread(self._cursor.fetchmany, tamanho)
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> int:
+        return self._cursor.lastrowid
+
+
+class _ConexaoSQLiteAsync:
+    """
+    Conexão assíncrona com a interface usada do aiomysql
+
+    As transações de escrita aguardam a vez em `escrita` (um asyncio.Lock por banco) antes
+    do BEGIN IMMEDIATE: esperando o lock do SQLite dentro de threads, muitas escritas
+    simultâneas ocupariam todo o executor e a transação em andamento não conseguiria
+    terminar.
+    """
+
+    def __init__(self, conexao: ConexaoSQLite, escrita: asyncio.Lock):
+        self._conexao = conexao
+        self._escrita = escrita
+        self._escrevendo = False
+        self.closed = False
+
+    def cursor(self, dictionary: bool = False) -> _CursorSQLiteAsync:
+        return _CursorSQLiteAsync(self._conexao.cursor(dictionary=dictionary))
+
+    async def begin(self) -> None:
+        await self._escrita.acquire()
+        self._escrevendo = True
+        try:
+            await asyncio.to_thread(self._conexao.start_transaction)
+        except BaseException:
+            self._fim_escrita()
+            raise
+
+    def _fim_escrita(self) -> None:
+        if self._escrevendo:
+            self._escrevendo = False
+            self._escrita.release()
+
+    async def commit(self) -> None:
+        try:
+            await asyncio.to_thread(self._conexao.commit)
+        finally:
+            self._fim_escrita()
+
+    async def rollback(self) -> None:
+        try:
+            await asyncio.to_thread(self._conexao.rollback)
+        finally:
+            self._fim_escrita()
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                self._conexao.close()
+            finally:
+                self.closed = True
+                self._fim_escrita()
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Banco embutido em um arquivo SQLite, em modo WAL, com o mesmo esquema e índices do MySQL
+
+    Para execução local, testes de carga reproduzíveis e instalações pequenas sem rede.
+    As conexões são abertas por uso (o custo é local); leituras não bloqueiam a escrita
+    graças ao WAL, e as escritas são serializadas pelo BEGIN IMMEDIATE.
+    """
+
+    nome = "sqlite"
+    sufixo_bloqueio = ""
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._inicializado = False
+        # Criado no primeiro uso, dentro do event loop da aplicação
+        self._escrita_async = None
+
+    def inicializar(self) -> None:
+        if self._inicializado:
+            return
+        conexao = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            # O modo WAL fica gravado no arquivo e vale para todas as conexões
+            conexao.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conexao.close()
+        self._inicializado = True
+        logger.info(f"Banco SQLite inicializado em {self.path}")
+
+    def obter_conexao(self) -> ConexaoSQLite:
+        if not self._inicializado:
+            self.inicializar()
+        return ConexaoSQLite(self.path, self.timeout)
+
+    async def adquirir_async(self) -> _ConexaoSQLiteAsync:
+        if self._escrita_async is None:
+            self._escrita_async = asyncio.Lock()
+        return _ConexaoSQLiteAsync(await asyncio.to_thread(self.obter_conexao), self._escrita_async)
+
+    def liberar_async(self, conexao: _ConexaoSQLiteAsync) -> None:
+        conexao.close()
+
+    def expressao_data_iso(self, coluna: str) -> str:
+        return f"(substr({coluna}, 7, 4) || '-' || substr({coluna}, 4, 2) || '-' || substr({coluna}, 1, 2))"
+
+    def expressao_periodo(self, coluna: str, periodo: str) -> str:
+        modificadores = {
+            "day": "",
+            # Volta 6 dias e avança até a segunda-feira: a própria data, se já for segunda
+            "week": ", '-6 days', 'weekday 1'",
+            "month": ", 'start of month'",
+        }[periodo]
+        return f"date({coluna}{modificadores})"
+
+    def sql_upsert_soma(self, tabela: str, chaves: Iterable[str], campos: Iterable[str]) -> str:
+        chaves = list(chaves)
+        colunas = chaves + list(campos)
+        atualizacoes = ",\n        ".join(f"{c} = {c} + excluded.{c}" for c in campos)
+        return f"""
+    INSERT INTO {tabela} ({', '.join(colunas)})
+    VALUES ({', '.join(['%s'] * len(colunas))})
+    ON CONFLICT ({', '.join(chaves)}) DO UPDATE SET
+        {atualizacoes}
+"""
+
+    def sql_atualizar_primeira(self, tabela: str, chave: str, atribuicoes: str, condicao: str) -> str:
+        # UPDATE ... LIMIT não existe na compilação padrão; RETURNING requer SQLite 3.35+
+        return (
+            f"UPDATE {tabela} SET {atribuicoes} WHERE {chave} = "
+            f"(SELECT {chave} FROM {tabela} WHERE {condicao} ORDER BY {chave} LIMIT 1) RETURNING *"
+        )
+
+    def _pk_auto(self) -> str:
+        return "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def _criar_indice(self, cursor, nome: str, tabela: str, colunas: Iterable[str]) -> None:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({', '.join(colunas)})")
+
+    def varreduras_completas(self, cursor, query: str, params: Iterable[Any] = ()) -> List[str]:
+        cursor.execute("EXPLAIN QUERY PLAN " + query, tuple(params))
+        # Linhas (id, parent, notused, detail): "SCAN t" sem índice é leitura da tabela inteira
+        return [
+            linha[3] for linha in cursor.fetchall()
+            if re.match(r"SCAN \w+", linha[3]) and "USING" not in linha[3]
+        ]
@@ -1,90 +1,304 @@
-import time
-from typing import Dict, Any, Tuple, Optional, Callable
-from functools import wraps
-from config import logger
+import asyncio
+import hashlib
+import inspect
+import json
+import threading
+from typing import Dict, Any, Optional, Callable, Iterable, Set
+from functools import partial, wraps
+from config import logger, CACHE_CONFIG
+from utils.cache_backends import create_cache_backend
 
-# Cache com timeout para resultados de consultas
-cache_store: Dict[str, Tuple[Any, float]] = {}
-cache_expiry = 30  # 30 segundos como padrão
+cache_expiry = CACHE_CONFIG["default_expiry"]  # 30 segundos como padrão
+
+# Marcador para diferenciar "não está no cache" de um valor None armazenado
+_AUSENTE = object()
+
+
+# Cache com timeout para resultados de consultas (em memória ou compartilhado entre workers)
+cache_backend = create_cache_backend(CACHE_CONFIG)
+
+
+# A versão dos dados é incrementada a cada invalidação e usada como ETag pelos endpoints
+# de leitura; fica no backend para que todos os workers vejam a mesma
+def bump_data_version() -> int:
+    """Incrementar a versão dos dados após uma escrita"""
+    return cache_backend.bump_version()
+
+
+def get_data_version() -> int:
+    """Obter a versão atual dos dados"""
+    return cache_backend.get_version()
+
+
+def current_etag() -> str:
+    """ETag fraco derivado da versão atual dos dados"""
+    return f'W/"{cache_backend.instance_id}-{get_data_version()}"'
 
 
 def get_cached_data(key: str) -> Optional[Any]:
     """Obter dados do cache se válidos"""
-    if key in cache_store:
-        data, timestamp = cache_store[key]
-        if time.time() - timestamp < cache_expiry:
-            return data
-        else:
-            # Expirado, remover do cache
-            del cache_store[key]
-    return None
+    return cache_backend.get(key)
 
 
-def set_cached_data(key: str, data: Any, expiry: int = None) -> None:
-    """Armazenar dados no cache com timestamp atual"""
-    cache_store[key] = (data, time.time())
+def set_cached_data(key: str, data: Any, expiry: int = None, tags: Iterable[str] = (),
+                    stale: int = 0) -> None:
+    """Armazenar dados no cache com o tempo de expiração informado (ou o padrão)"""
+    cache_backend.set(key, data, expiry, tags, stale)
 
 
 def clear_cache(prefix: str = None) -> None:
     """Limpar todo o cache ou apenas entradas com um prefixo específico"""
-    global cache_store
-    if prefix:
-        keys_to_delete = [k for k in cache_store.keys() if k.startswith(prefix)]
-        for key in keys_to_delete:
-            del cache_store[key]
-    else:
-        cache_store = {}
+    # Toda limpeza de cache acompanha uma escrita: os ETags emitidos até aqui deixam de valer.
+    # A versão muda antes da remoção para que um cálculo iniciado antes da escrita e
+    # concluído no meio da limpeza não armazene o resultado antigo
+    bump_data_version()
+    cache_backend.delete_prefix(prefix)
     logger.debug(f"Cache {'com prefixo '+prefix if prefix else 'completo'} limpo")
 
 
-def cached(expiry: int = None, key_prefix: str = ""):
+def invalidate(*tags: str) -> None:
+    """Remover todas as entradas derivadas das tags informadas (ex.: invalidate("atividades"))"""
+    # Versão antes da remoção, como em clear_cache
+    bump_data_version()
+    removidas = cache_backend.invalidate_tags(*tags)
+    logger.debug(f"Cache invalidado para tags {', '.join(tags)}: {removidas} entradas removidas")
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Estatísticas do cache (acertos, falhas, despejos, ocupação)"""
+    return cache_backend.stats()
+
+
+def _canonico(value: Any) -> Any:
+    """Representação canônica (independente de ordem e de endereço de memória) de um argumento"""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {str(k): _canonico(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonico(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonico(v) for v in value), key=repr)
+    return repr(value)
+
+
+def make_key_builder(func: Callable, key_prefix: str = "", exclude: Iterable[str] = ()) -> Callable[..., str]:
+    """
+    Criar a função que monta as chaves de cache de func
+
+    A chave é "<prefixo>:<função>" seguida de um hash curto dos argumentos, depois de
+    normalizados pela assinatura (posicionais e nomeados equivalentes geram a mesma chave,
+    valores iguais ao padrão são omitidos). `self`/`cls` e os parâmetros em exclude não
+    entram na chave, então ela é estável entre processos e pode ir para um cache compartilhado.
+    """
+    assinatura = inspect.signature(func)
+    ignorados = set(exclude)
+    parametros = list(assinatura.parameters)
+    if parametros and parametros[0] in ("self", "cls"):
+        ignorados.add(parametros[0])
+    padroes = {
+        nome: p.default for nome, p in assinatura.parameters.items()
+        if p.default is not inspect.Parameter.empty
+    }
+    base = f"{key_prefix}:{func.__module__}.{func.__qualname__}"
+
+    def build(*args, **kwargs) -> str:
+        argumentos = assinatura.bind_partial(*args, **kwargs).arguments
+        relevantes = {
+            nome: valor for nome, valor in argumentos.items()
+            if nome not in ignorados and not (nome in padroes and padroes[nome] == valor)
+        }
+        if not relevantes:
+            return base
+
+        canonico = json.dumps(_canonico(relevantes), sort_keys=True, separators=(",", ":"))
+        return f"{base}:{hashlib.blake2b(canonico.encode(), digest_size=12).hexdigest()}"
+
+    return build
+
+
+class _Voo:
+    """Cálculo em andamento para uma chave, compartilhado pelas chamadas concorrentes"""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro: Optional[BaseException] = None
+
+
+# Cálculos em andamento (single-flight): chave -> _Voo (threads) ou Task (asyncio)
+_voos: Dict[str, _Voo] = {}
+_voos_lock = threading.Lock()
+_voos_async: Dict[str, "asyncio.Task"] = {}
+_tarefas_fundo: Set["asyncio.Task"] = set()
+
+
+def _calcular_sincrono(cache_key: str, func: Callable, args, kwargs, expiry, tags, stale) -> Any:
+    """Executar a função uma única vez por chave; as chamadas concorrentes aguardam o resultado"""
+    with _voos_lock:
+        voo = _voos.get(cache_key)
+        lider = voo is None
+        if lider:
+            voo = _Voo()
+            _voos[cache_key] = voo
+
+    if not lider:
+        cache_backend.record_coalesced()
+        voo.evento.wait()
+        if voo.erro is not None:
+            raise voo.erro
+        return voo.resultado
+
+    # Se houver escrita durante o cálculo, o resultado pode estar desatualizado: não armazenar
+    versao = get_data_version()
+    try:
+        result = func(*args, **kwargs)
+        if get_data_version() == versao:
+            set_cached_data(cache_key, result, expiry, tags, stale)
+            logger.debug(f"Armazenado resultado em cache para {cache_key}")
+        voo.resultado = result
+        return result
+    except BaseException as e:
+        voo.erro = e
+        raise
+    finally:
+        with _voos_lock:
+            _voos.pop(cache_key, None)
+        voo.evento.set()
+
+
+async def _no_backend(operacao: Callable, *args) -> Any:
+    """Executar uma operação do backend sem bloquear o event loop quando ela faz E/S"""
+    if cache_backend.bloqueante:
+        return await asyncio.to_thread(operacao, *args)
+    return operacao(*args)
+
+
+async def _executar_e_armazenar(cache_key: str, func: Callable, args, kwargs, expiry, tags, stale) -> Any:
+    """Executar func e armazenar o resultado, se não houve escrita durante o cálculo"""
+    versao = await _no_backend(get_data_version)
+    result = await func(*args, **kwargs)
+    if await _no_backend(get_data_version) == versao:
+        await _no_backend(set_cached_data, cache_key, result, expiry, tags, stale)
+        logger.debug(f"Armazenado resultado em cache para {cache_key}")
+    return result
+
+
+def _fim_voo_async(cache_key: str, tarefa: "asyncio.Task") -> None:
+    if _voos_async.get(cache_key) is tarefa:
+        del _voos_async[cache_key]
+    # Marcar a exceção como consumida caso nenhuma chamada esteja aguardando
+    if not tarefa.cancelled():
+        tarefa.exception()
+
+
+async def _calcular_assincrono(cache_key: str, func: Callable, args, kwargs, expiry, tags, stale) -> Any:
+    """
+    Versão asyncio de _calcular_sincrono (o loop é único, então não precisa de lock)
+
+    O cálculo roda em uma tarefa própria, que nenhuma das chamadas possui: cada uma aguarda
+    a tarefa através de asyncio.shield, então o cancelamento de quem a iniciou (cliente
+    desconectado) não cancela as demais que aguardam a mesma chave.
+    """
+    tarefa = _voos_async.get(cache_key)
+    if tarefa is not None:
+        cache_backend.record_coalesced()
+    else:
+        tarefa = asyncio.ensure_future(
+            _executar_e_armazenar(cache_key, func, args, kwargs, expiry, tags, stale)
+        )
+        _voos_async[cache_key] = tarefa
+        tarefa.add_done_callback(partial(_fim_voo_async, cache_key))
+    return await asyncio.shield(tarefa)
+
+
+def _atualizar_em_segundo_plano(cache_key: str, func: Callable, args, kwargs, expiry, tags, stale) -> None:
+    """Recalcular uma entrada stale em uma thread, se ninguém já estiver recalculando"""
+    with _voos_lock:
+        if cache_key in _voos:
+            return
+
+    def atualizar():
+        try:
+            _calcular_sincrono(cache_key, func, args, kwargs, expiry, tags, stale)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar cache em segundo plano para {cache_key}: {e}")
+
+    threading.Thread(target=atualizar, daemon=True).start()
+
+
+def cached(expiry: int = None, key_prefix: str = "", tags: Iterable[str] = (),
+           stale_while_revalidate: int = 0, exclude: Iterable[str] = ()):
     """
     Decorador para funções que precisam de cache
+
+    Chamadas concorrentes para a mesma chave ausente são agrupadas em um único cálculo
+    (single-flight), tanto para funções síncronas quanto assíncronas.
     
     Args:
         expiry: Tempo de expiração em segundos
         key_prefix: Prefixo opcional para a chave
+        tags: Dependências declaradas do resultado; invalidate(tag) remove a entrada
+        stale_while_revalidate: Segundos após a expiração em que o valor antigo ainda é
+            servido enquanto um novo é calculado em segundo plano. Entradas invalidadas
+            por tag são removidas e nunca servidas como stale.
+        exclude: Parâmetros que não fazem parte da chave (`self` já é ignorado)
     """
+    tags = tuple(tags)
+
     def decorator(func):
+        build_key = make_key_builder(func, key_prefix, exclude)
+
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
             # Criar chave baseada na função, argumentos e prefixo
-            cache_key = f"{key_prefix}:{func.__name__}:{str(args)}:{str(kwargs)}"
+            cache_key = build_key(*args, **kwargs)
             
             # Verificar cache antes de executar
-            cached_result = get_cached_data(cache_key)
-            if cached_result is not None:
+            cached_result = await _no_backend(cache_backend.get, cache_key, _AUSENTE)
+            if cached_result is not _AUSENTE:
                 logger.debug(f"Usando dados em cache para {cache_key}")
                 return cached_result
-                
-            # Executar função
-            result = await func(*args, **kwargs)
-            
-            # Armazenar resultado no cache
-            set_cached_data(cache_key, result, expiry)
-            logger.debug(f"Armazenado resultado em cache para {cache_key}")
-            
-            return result
+
+            if stale_while_revalidate:
+                stale_result = await _no_backend(cache_backend.get_stale, cache_key, _AUSENTE)
+                if stale_result is not _AUSENTE:
+                    if cache_key not in _voos_async:
+                        tarefa = asyncio.create_task(_calcular_assincrono(
+                            cache_key, func, args, kwargs, expiry, tags, stale_while_revalidate
+                        ))
+                        _tarefas_fundo.add(tarefa)
+                        tarefa.add_done_callback(_tarefas_fundo.discard)
+                    return stale_result
+
+            # Executar função (uma vez por chave, mesmo com chamadas concorrentes)
+            return await _calcular_assincrono(
+                cache_key, func, args, kwargs, expiry, tags, stale_while_revalidate
+            )
             
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
             # Criar chave baseada na função, argumentos e prefixo
-            cache_key = f"{key_prefix}:{func.__name__}:{str(args)}:{str(kwargs)}"
+            cache_key = build_key(*args, **kwargs)
             
             # Verificar cache antes de executar
-            cached_result = get_cached_data(cache_key)
-            if cached_result is not None:
+            cached_result = cache_backend.get(cache_key, _AUSENTE)
+            if cached_result is not _AUSENTE:
                 logger.debug(f"Usando dados em cache para {cache_key}")
                 return cached_result
-                
-            # Executar função
-            result = func(*args, **kwargs)
-            
-            # Armazenar resultado no cache
-            set_cached_data(cache_key, result, expiry)
-            logger.debug(f"Armazenado resultado em cache para {cache_key}")
-            
-            return result
+
+            if stale_while_revalidate:
+                stale_result = cache_backend.get_stale(cache_key, _AUSENTE)
+                if stale_result is not _AUSENTE:
+                    _atualizar_em_segundo_plano(
+                        cache_key, func, args, kwargs, expiry, tags, stale_while_revalidate
+                    )
+                    return stale_result
+
+            # Executar função (uma vez por chave, mesmo com chamadas concorrentes)
+            return _calcular_sincrono(
+                cache_key, func, args, kwargs, expiry, tags, stale_while_revalidate
+            )
             
         if asyncio_based_function(func):
             return async_wrapper
@@ -96,4 +310,4 @@ def cached(expiry: int = None, key_prefix: str = ""):
 def asyncio_based_function(func):
     """Verificar se uma função é baseada em asyncio"""
     import inspect
-    return inspect.iscoroutinefunction(func) 
\ No newline at end of file
+    return inspect.iscoroutinefunction(func) 
@@ -0,0 +1,449 @@
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Tuple, Optional, Iterable, Set
+from config import logger
+
+
+def _estimar_tamanho(data: Any) -> int:
+    """Estimar o tamanho em bytes de um valor (serializado) para o limite de memória"""
+    try:
+        return len(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(data)
+
+
+class CacheBackend(ABC):
+    """
+    Interface de armazenamento usada por utils/cache.py
+
+    Além das entradas, o backend guarda a versão dos dados (base do ETag): num backend
+    compartilhado, uma invalidação feita por um worker vale para todos. Um servidor
+    externo (ex.: Redis) pode ser plugado implementando estes métodos.
+    """
+
+    instance_id: str
+
+    # True quando as operações fazem E/S bloqueante (arquivo, rede): os wrappers
+    # assíncronos de utils/cache.py as executam fora do event loop
+    bloqueante = False
+
+    @abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        """Obter um valor válido (não expirado)"""
+
+    @abstractmethod
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        """Obter um valor expirado que ainda esteja dentro da janela stale"""
+
+    @abstractmethod
+    def set(self, key: str, data: Any, expiry: Optional[int] = None, tags: Iterable[str] = (),
+            stale: int = 0) -> None:
+        """Armazenar um valor com TTL, tags de dependência e janela stale"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: Optional[str] = None) -> int:
+        """Remover todas as entradas, ou apenas as que começam com o prefixo"""
+
+    @abstractmethod
+    def invalidate_tags(self, *tags: str) -> int:
+        """Remover todas as entradas que dependem de qualquer uma das tags"""
+
+    @abstractmethod
+    def bump_version(self) -> int:
+        """Incrementar a versão dos dados após uma escrita"""
+
+    @abstractmethod
+    def get_version(self) -> int:
+        """Obter a versão atual dos dados"""
+
+    @abstractmethod
+    def record_coalesced(self) -> None:
+        """Contabilizar uma chamada que aguardou o cálculo em andamento de outra"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso e ocupação atual para monitoramento"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Cache em memória limitado por quantidade de entradas e por bytes, com despejo LRU,
+    expiração por entrada e operações protegidas por lock (os endpoints síncronos do
+    FastAPI rodam em um threadpool)
+
+    Cada entrada pode declarar tags de dependência (ex.: a tabela de onde foi derivada);
+    invalidate_tags remove de uma vez todas as entradas que dependem de uma tag.
+
+    Uma entrada expirada pode ser mantida por uma janela extra (stale) para ser servida
+    por get_stale enquanto o valor é recalculado em segundo plano.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, default_expiry: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_expiry = default_expiry
+        # O identificador da instância evita que ETags antigos coincidam após um reinício
+        self.instance_id = format(int(time.time() * 1000), "x")
+        self._versao = 0
+        # chave -> (valor, expira_em, tamanho, tags, stale_ate); a ordem reflete o uso mais recente no fim
+        self._entradas: "OrderedDict[str, Tuple[Any, float, int, Tuple[str, ...], float]]" = OrderedDict()
+        # tag -> chaves que dependem dela
+        self._por_tag: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {
+            "hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+            "stale_hits": 0, "coalesced": 0,
+        }
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Obter um valor válido, marcando-o como usado recentemente"""
+        with self._lock:
+            entrada = self._entradas.get(key)
+            if entrada is None:
+                self._stats["misses"] += 1
+                return default
+
+            data, expira_em, _, _, stale_ate = entrada
+            agora = time.monotonic()
+            if agora >= expira_em:
+                # Mantida apenas se ainda estiver dentro da janela em que pode ser servida como stale
+                if agora >= stale_ate:
+                    self._remover(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+
+            self._entradas.move_to_end(key)
+            self._stats["hits"] += 1
+            return data
+
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        """Obter um valor expirado que ainda esteja dentro da janela stale"""
+        with self._lock:
+            entrada = self._entradas.get(key)
+            if entrada is None or time.monotonic() >= entrada[4]:
+                return default
+            self._stats["stale_hits"] += 1
+            return entrada[0]
+
+    def record_coalesced(self) -> None:
+        """Contabilizar uma chamada que aguardou o cálculo em andamento de outra"""
+        with self._lock:
+            self._stats["coalesced"] += 1
+
+    def set(self, key: str, data: Any, expiry: Optional[int] = None, tags: Iterable[str] = (),
+            stale: int = 0) -> None:
+        """Armazenar um valor com o TTL informado (ou o padrão) e despejar os menos usados"""
+        tamanho = _estimar_tamanho(data)
+        if tamanho > self.max_bytes:
+            logger.debug(f"Valor para {key} excede o limite do cache ({tamanho} bytes), ignorado")
+            return
+
+        ttl = self.default_expiry if expiry is None else expiry
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entradas:
+                self._remover(key)
+            expira_em = time.monotonic() + ttl
+            self._entradas[key] = (data, expira_em, tamanho, tags, expira_em + stale)
+            self._bytes += tamanho
+            for tag in tags:
+                self._por_tag.setdefault(tag, set()).add(key)
+
+            while len(self._entradas) > self.max_entries or self._bytes > self.max_bytes:
+                mais_antiga = next(iter(self._entradas))
+                self._remover(mais_antiga)
+                self._stats["evictions"] += 1
+
+    def delete_prefix(self, prefix: Optional[str] = None) -> int:
+        """Remover todas as entradas, ou apenas as que começam com o prefixo"""
+        with self._lock:
+            if not prefix:
+                removidas = len(self._entradas)
+                self._entradas.clear()
+                self._por_tag.clear()
+                self._bytes = 0
+                return removidas
+
+            chaves = [k for k in self._entradas if k.startswith(prefix)]
+            for key in chaves:
+                self._remover(key)
+            return len(chaves)
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """Remover todas as entradas que dependem de qualquer uma das tags"""
+        with self._lock:
+            chaves = set()
+            for tag in tags:
+                chaves.update(self._por_tag.get(tag, ()))
+            for key in chaves:
+                self._remover(key)
+            return len(chaves)
+
+    def bump_version(self) -> int:
+        with self._lock:
+            self._versao += 1
+            return self._versao
+
+    def get_version(self) -> int:
+        return self._versao
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso e ocupação atual para monitoramento"""
+        with self._lock:
+            consultas = self._stats["hits"] + self._stats["misses"]
+            return {
+                "backend": "memory",
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / consultas, 4) if consultas else 0.0,
+                "entries": len(self._entradas),
+                "tags": len(self._por_tag),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remover(self, key: str) -> None:
+        # Chamado com o lock adquirido
+        _, _, tamanho, tags, _ = self._entradas.pop(key)
+        self._bytes -= tamanho
+        for tag in tags:
+            chaves = self._por_tag.get(tag)
+            if chaves is not None:
+                chaves.discard(key)
+                if not chaves:
+                    del self._por_tag[tag]
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache compartilhado entre processos (workers do uvicorn) em um arquivo SQLite local
+
+    Entradas, tags e versão dos dados ficam no arquivo, em modo WAL: o que um worker
+    grava ou invalida é visto pelos demais, e a memória ocupada não cresce com o número
+    de workers. Os contadores de acertos/falhas são por processo.
+    """
+
+    bloqueante = True
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int, default_expiry: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_expiry = default_expiry
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+            "stale_hits": 0, "coalesced": 0,
+        }
+
+        conn = self._conexao()
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    stale_until REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_last_access ON cache_entries (last_access);
+                CREATE TABLE IF NOT EXISTS cache_tags (
+                    tag TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (tag, key)
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_tags_key ON cache_tags (key);
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+            # O primeiro processo define o identificador usado nos ETags; os demais o reutilizam
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_meta (name, value) VALUES ('instance_id', ?)",
+                (format(int(time.time() * 1000), "x"),)
+            )
+            conn.execute("INSERT OR IGNORE INTO cache_meta (name, value) VALUES ('data_version', '0')")
+        self.instance_id = conn.execute(
+            "SELECT value FROM cache_meta WHERE name = 'instance_id'"
+        ).fetchone()[0]
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _contar(self, *nomes: str) -> None:
+        with self._lock:
+            for nome in nomes:
+                self._stats[nome] += 1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        conn = self._conexao()
+        linha = conn.execute(
+            "SELECT value, expires_at, last_access FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if linha is None:
+            self._contar("misses")
+            return default
+
+        valor, expira_em, ultimo_acesso = linha
+        agora = time.time()
+        if agora >= expira_em:
+            self._contar("expirations", "misses")
+            return default
+
+        # Atualizar o LRU no máximo uma vez por segundo por chave, para não gravar a cada leitura
+        if agora - ultimo_acesso > 1:
+            conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (agora, key))
+        self._contar("hits")
+        return pickle.loads(valor)
+
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        linha = self._conexao().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND stale_until > ?", (key, time.time())
+        ).fetchone()
+        if linha is None:
+            return default
+        self._contar("stale_hits")
+        return pickle.loads(linha[0])
+
+    def record_coalesced(self) -> None:
+        self._contar("coalesced")
+
+    def set(self, key: str, data: Any, expiry: Optional[int] = None, tags: Iterable[str] = (),
+            stale: int = 0) -> None:
+        try:
+            valor = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug(f"Valor para {key} não serializável, não armazenado no cache: {e}")
+            return
+        if len(valor) > self.max_bytes:
+            logger.debug(f"Valor para {key} excede o limite do cache ({len(valor)} bytes), ignorado")
+            return
+
+        ttl = self.default_expiry if expiry is None else expiry
+        agora = time.time()
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                INSERT OR REPLACE INTO cache_entries (key, value, expires_at, stale_until, size, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, valor, agora + ttl, agora + ttl + stale, len(valor), agora))
+            conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags]
+            )
+            despejadas = self._despejar(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if despejadas:
+            with self._lock:
+                self._stats["evictions"] += despejadas
+
+    def _despejar(self, conn: sqlite3.Connection) -> int:
+        """Remover expiradas fora da janela stale e, se preciso, as menos usadas (dentro da transação)"""
+        removidas = conn.execute("DELETE FROM cache_entries WHERE stale_until <= ?", (time.time(),)).rowcount
+        quantidade, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+        ).fetchone()
+        despejadas = 0
+        for key, tamanho in conn.execute("SELECT key, size FROM cache_entries ORDER BY last_access").fetchall():
+            if quantidade <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            quantidade -= 1
+            total_bytes -= tamanho
+            despejadas += 1
+        if removidas or despejadas:
+            conn.execute("DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)")
+        return despejadas
+
+    def delete_prefix(self, prefix: Optional[str] = None) -> int:
+        conn = self._conexao()
+        with conn:
+            if not prefix:
+                conn.execute("DELETE FROM cache_tags")
+                return conn.execute("DELETE FROM cache_entries").rowcount
+            # substr em vez de LIKE: o prefixo pode conter '_' e '%'
+            conn.execute("DELETE FROM cache_tags WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            return conn.execute(
+                "DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            ).rowcount
+
+    def invalidate_tags(self, *tags: str) -> int:
+        if not tags:
+            return 0
+        marcadores = ", ".join("?" for _ in tags)
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removidas = conn.execute(
+                f"DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_tags WHERE tag IN ({marcadores}))",
+                tags
+            ).rowcount
+            conn.execute("DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removidas
+
+    def bump_version(self) -> int:
+        conn = self._conexao()
+        with conn:
+            conn.execute(
+                "UPDATE cache_meta SET value = CAST(value AS INTEGER) + 1 WHERE name = 'data_version'"
+            )
+        return self.get_version()
+
+    def get_version(self) -> int:
+        return int(self._conexao().execute(
+            "SELECT value FROM cache_meta WHERE name = 'data_version'"
+        ).fetchone()[0])
+
+    def stats(self) -> Dict[str, Any]:
+        quantidade, total_bytes = self._conexao().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+        ).fetchone()
+        with self._lock:
+            consultas = self._stats["hits"] + self._stats["misses"]
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / consultas, 4) if consultas else 0.0,
+                "entries": quantidade,
+                "bytes": total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def create_cache_backend(config: Dict[str, Any]) -> CacheBackend:
+    """Criar o backend configurado em CACHE_CONFIG ("memory" ou "sqlite")"""
+    if config["backend"] == "sqlite":
+        logger.info(f"Cache compartilhado em SQLite: {config['sqlite_path']}")
+        return SQLiteCacheBackend(
+            config["sqlite_path"], config["max_entries"], config["max_bytes"], config["default_expiry"]
+        )
+    if config["backend"] != "memory":
+        raise ValueError(f"Backend de cache desconhecido: {config['backend']}")
+    return MemoryCacheBackend(config["max_entries"], config["max_bytes"], config["default_expiry"])
@@ -0,0 +1,162 @@
+import csv
+import io
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List
+
+import xlsxwriter
+
+COLUNAS_RESUMO = [("Resumo Financeiro", 20), ("Valor", 15)]
+COLUNAS_SETORES = [
+    ("Setor", 20), ("Total Atividades", 15), ("Valor Total", 15),
+    ("Valor Pago", 12), ("Valor Pendente", 15), ("Progresso", 12),
+]
+
+TAMANHO_BLOCO_ARQUIVO = 64 * 1024
+
+
+def formatar_moeda_br(valor: float) -> str:
+    """Formatar número no padrão brasileiro (1.234,56), como toLocaleString('pt-BR')"""
+    return f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _percentual(parte: float, total: float) -> str:
+    return f"{(parte / total) * 100:.2f}%" if total else "0.00%"
+
+
+def colunas_atividades(pagadores: List[Dict[str, str]]) -> List[tuple]:
+    """Colunas e larguras da planilha gerada antes no navegador (export.js), uma coluna por pagador"""
+    return [
+        ("ID", 8), ("Data", 12), ("Atividade", 30), ("Setor", 15), ("Valor", 12),
+        *((f"Pago {pagador['nome']}", 15) for pagador in pagadores),
+        ("Total Pago", 12), ("Restante", 12), ("Status", 12),
+    ]
+
+
+class _AcumuladorResumo:
+    """
+    Totais gerais e por setor acumulados enquanto as linhas são exportadas
+
+    Args:
+        pagadores: chave (campo da atividade) e nome de exibição de cada pagador, na
+            ordem das colunas
+    """
+
+    def __init__(self, pagadores: List[Dict[str, str]]):
+        self.pagadores = pagadores
+        self.total = 0.0
+        self.pagos = {pagador["chave"]: 0.0 for pagador in pagadores}
+        self.setores: Dict[str, Dict[str, float]] = {}
+
+    def linha_atividade(self, item: Dict[str, Any]) -> List[Any]:
+        """Converter uma atividade (formato da API) em linha da planilha e acumular os totais"""
+        valor = item["value"]
+        pagos = [item[chave] or 0 for chave in self.pagos]
+        pago = sum(pagos)
+
+        self.total += valor
+        for chave, valor_pago in zip(self.pagos, pagos):
+            self.pagos[chave] += valor_pago
+        setor = self.setores.setdefault(item["sector"], {"total": 0.0, "paid": 0.0, "count": 0})
+        setor["total"] += valor
+        setor["paid"] += pago
+        setor["count"] += 1
+
+        return [
+            item["id"], item["date"], item["activity"], item["sector"],
+            formatar_moeda_br(valor), *(formatar_moeda_br(valor_pago) for valor_pago in pagos),
+            formatar_moeda_br(pago), formatar_moeda_br(valor - pago),
+            "Concluída" if pago >= valor else "Pendente",
+        ]
+
+    def linhas_resumo(self) -> List[List[str]]:
+        pago = sum(self.pagos.values())
+        return [
+            ["Valor Total", formatar_moeda_br(self.total)],
+            ["Valor Pago", formatar_moeda_br(pago)],
+            ["Valor Restante", formatar_moeda_br(self.total - pago)],
+            *([f"Pago {p['nome']}", formatar_moeda_br(self.pagos[p['chave']])] for p in self.pagadores),
+            ["Progresso", _percentual(pago, self.total)],
+        ]
+
+    def linhas_setores(self) -> List[List[Any]]:
+        return [
+            [
+                setor, dados["count"], formatar_moeda_br(dados["total"]),
+                formatar_moeda_br(dados["paid"]), formatar_moeda_br(dados["total"] - dados["paid"]),
+                _percentual(dados["paid"], dados["total"]),
+            ]
+            for setor, dados in self.setores.items()
+        ]
+
+
+def gerar_csv(lotes: Iterable[List[Dict[str, Any]]], pagadores: List[Dict[str, str]]) -> Iterator[str]:
+    """
+    Gerar o CSV das atividades lote a lote, sem manter o arquivo em memória
+
+    Usa ';' como separador (padrão do Excel em português, já que ',' é o separador decimal)
+    e BOM UTF-8 para que acentos sejam reconhecidos ao abrir o arquivo.
+    """
+    acumulador = _AcumuladorResumo(pagadores)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+
+    writer.writerow([nome for nome, _ in colunas_atividades(pagadores)])
+    yield "\ufeff" + buffer.getvalue()
+
+    for lote in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(acumulador.linha_atividade(item) for item in lote)
+        yield buffer.getvalue()
+
+
+def gerar_xlsx(lotes: Iterable[List[Dict[str, Any]]], pagadores: List[Dict[str, str]]) -> Iterator[bytes]:
+    """
+    Gerar o XLSX das atividades com o xlsxwriter em modo de memória constante
+
+    As linhas são gravadas em disco à medida que saem do cursor; como o XLSX é um
+    arquivo zip, ele só pode ser enviado depois de fechado, em blocos.
+    """
+    fd, caminho = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(caminho, {"constant_memory": True, "tmpdir": tempfile.gettempdir()})
+        acumulador = _AcumuladorResumo(pagadores)
+
+        def nova_planilha(nome, colunas, cor_cabecalho):
+            planilha = workbook.add_worksheet(nome)
+            cabecalho = workbook.add_format({
+                "bold": True, "font_color": "#FFFFFF", "font_size": 12, "bg_color": cor_cabecalho,
+                "align": "center", "valign": "vcenter", "border": 1,
+            })
+            for indice, (titulo, largura) in enumerate(colunas):
+                planilha.set_column(indice, indice, largura)
+                planilha.write(0, indice, titulo, cabecalho)
+            return planilha
+
+        planilha = nova_planilha("Atividades", colunas_atividades(pagadores), "#2E5BBA")
+        linha = 1
+        for lote in lotes:
+            for item in lote:
+                planilha.write_row(linha, 0, acumulador.linha_atividade(item))
+                linha += 1
+
+        planilha = nova_planilha("Resumo Financeiro", COLUNAS_RESUMO, "#28A745")
+        for linha, valores in enumerate(acumulador.linhas_resumo(), start=1):
+            planilha.write_row(linha, 0, valores)
+
+        planilha = nova_planilha("Análise por Setor", COLUNAS_SETORES, "#FD7E14")
+        for linha, valores in enumerate(acumulador.linhas_setores(), start=1):
+            planilha.write_row(linha, 0, valores)
+
+        workbook.close()
+
+        with open(caminho, "rb") as arquivo:
+            while True:
+                bloco = arquivo.read(TAMANHO_BLOCO_ARQUIVO)
+                if not bloco:
+                    break
+                yield bloco
+    finally:
+        os.remove(caminho)
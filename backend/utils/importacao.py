@@ -0,0 +1,52 @@
+import csv
+import io
+import unicodedata
+from typing import Any, Dict, List
+
+# Nomes de coluna aceitos (sem acento, minúsculos) para cada campo da atividade. Inclui os
+# cabeçalhos do CSV exportado (utils/export.py), para que ele possa ser reimportado.
+ALIASES_CAMPOS = {
+    "atividade": ("atividade", "activity", "nome"),
+    "valor": ("valor", "value", "total_value"),
+    "setor": ("setor", "sector"),
+    "data": ("data", "date"),
+}
+
+_CAMPO_POR_ALIAS = {alias: campo for campo, aliases in ALIASES_CAMPOS.items() for alias in aliases}
+
+
+def _normalizar_nome(nome: str) -> str:
+    sem_acento = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode()
+    return sem_acento.strip().lower()
+
+
+def normalizar_campos(linha: Dict[str, Any]) -> Dict[str, Any]:
+    """Mapear as chaves de uma linha (JSON ou CSV) para atividade, valor, setor e data"""
+    normalizada = {}
+    for chave, valor in linha.items():
+        campo = _CAMPO_POR_ALIAS.get(_normalizar_nome(chave or ""))
+        if campo and campo not in normalizada:
+            normalizada[campo] = valor
+    return normalizada
+
+
+def ler_csv_atividades(conteudo: bytes) -> List[Dict[str, Any]]:
+    """
+    Ler um CSV de atividades com cabeçalho
+
+    Aceita UTF-8 (com ou sem BOM) ou Latin-1 e separador ';', ',' ou tab, detectado
+    pela linha de cabeçalho.
+    """
+    try:
+        texto = conteudo.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        texto = conteudo.decode("latin-1")
+
+    cabecalho = texto.split("\n", 1)[0]
+    separador = max(";,\t", key=cabecalho.count)
+
+    leitor = csv.DictReader(io.StringIO(texto), delimiter=separador)
+    return [
+        normalizar_campos(linha) for linha in leitor
+        if any((valor or "").strip() for valor in linha.values() if isinstance(valor, str))
+    ]
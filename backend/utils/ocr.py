@@ -1,12 +1,23 @@
 import re
+import asyncio
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
 from fastapi import HTTPException
-from config import logger
+from config import OCR_CONFIG, logger
+from utils.cache_backends import SQLiteCacheBackend
+from utils.preprocessamento import preparar_imagem
 from PIL import Image
 import pytesseract
 import io
 
 class ComprovanteReader:
-    """Classe responsável por ler e extrair informações de comprovantes de pagamento"""
+    """
+    Classe responsável por ler e extrair informações de comprovantes de pagamento
+
+    Nomes aceitam letras acentuadas, que o OCR em português preserva (ex.: João).
+    """
 
     @staticmethod
     def extrair_valor(texto: str):
@@ -20,13 +31,13 @@ class ComprovanteReader:
 
     @staticmethod
     def extrair_nome(texto: str):
-        match = re.search(r'(?:Titular|Pagador|Quem pagou|Nome do titular)\s*[:\-]?\s*([A-Za-z\s]+)', texto, re.IGNORECASE)
+        match = re.search(r'(?:Titular|Pagador|Quem pagou|Nome do titular)\s*[:\-]?\s*((?:[^\W\d_]|\s)+)', texto, re.IGNORECASE)
         if match:
             nome = match.group(1).strip()
             nome = re.sub(r'\bCPF\b.*', '', nome, flags=re.IGNORECASE).strip()
             return ' '.join([word.capitalize() for word in nome.split()])
 
-        match = re.search(r'\bde\s([A-Za-z\s]+)', texto, re.IGNORECASE)
+        match = re.search(r'\bde\s((?:[^\W\d_]|\s)+)', texto, re.IGNORECASE)
         if match:
             nome = match.group(1).strip()
             nome = re.sub(r'\bCPF\b.*', '', nome, flags=re.IGNORECASE).strip()
@@ -34,6 +45,16 @@ class ComprovanteReader:
 
         return None
 
+def extrair_dados_comprovante(texto: str) -> Dict[str, Any]:
+    """Valor, data e nome lidos do texto do comprovante, nos campos de ExtractedData"""
+    reader = ComprovanteReader()
+    return {
+        "value": reader.extrair_valor(texto),
+        "date": reader.extrair_data(texto),
+        "name": reader.extrair_nome(texto),
+        "full_text": texto,
+    }
+
 def processar_comprovante_ocr(contents, filetype="jpg"):
     """
     Processa uma imagem com Tesseract OCR local
@@ -45,7 +66,150 @@ def processar_comprovante_ocr(contents, filetype="jpg"):
     """
     try:
         image = Image.open(io.BytesIO(contents))
-        texto = pytesseract.image_to_string(image, lang='eng')
+        if OCR_CONFIG["preprocessar"]:
+            image = preparar_imagem(image, OCR_CONFIG)
+        texto = pytesseract.image_to_string(
+            image, lang=OCR_CONFIG["lang"], config=f"--psm {OCR_CONFIG['psm']}"
+        )
         return texto
     except Exception as e:
         raise Exception(f"Erro ao processar OCR com Tesseract: {str(e)}")
+
+
+class FilaOCRCheia(Exception):
+    """Todos os processos de OCR ocupados e a fila de espera cheia"""
+
+
+class PoolOCR:
+    """
+    Processos dedicados ao Tesseract, para que o OCR não bloqueie o event loop
+
+    Até `processos` comprovantes são lidos em paralelo e até `max_fila` aguardam um
+    processo livre; acima disso, executar levanta FilaOCRCheia (a API responde 503).
+    Os processos são criados no primeiro uso. Se um deles morrer (ex.: falha do
+    tesseract), o pool é recriado e o comprovante afetado recebe o erro.
+
+    Só deve ser usado a partir do event loop (os contadores não têm lock).
+    """
+
+    def __init__(self, processos: int, max_fila: int):
+        self.processos = processos
+        self.max_fila = max_fila
+        self._executor = None
+        self._em_andamento = 0
+        self._contadores = {"processed": 0, "failed": 0, "rejected": 0, "restarts": 0}
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processos)
+        return self._executor
+
+    async def executar(self, contents: bytes, filetype: str = "jpg") -> str:
+        """Texto extraído por processar_comprovante_ocr em um dos processos do pool"""
+        if self._em_andamento >= self.processos + self.max_fila:
+            self._contadores["rejected"] += 1
+            raise FilaOCRCheia(f"{self.processos} processos ocupados e {self.max_fila} comprovantes na fila")
+
+        self._em_andamento += 1
+        executor = self._obter_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            texto = await loop.run_in_executor(executor, processar_comprovante_ocr, contents, filetype)
+            self._contadores["processed"] += 1
+            return texto
+        except BrokenProcessPool:
+            self._contadores["failed"] += 1
+            if self._executor is executor:
+                logger.error("Processo de OCR encerrado inesperadamente; recriando o pool")
+                self._executor = None
+                self._contadores["restarts"] += 1
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise Exception("Processo de OCR encerrado inesperadamente")
+        except Exception:
+            self._contadores["failed"] += 1
+            raise
+        finally:
+            self._em_andamento -= 1
+
+    def fechar(self) -> None:
+        """Encerrar os processos, cancelando os comprovantes ainda na fila"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            **self._contadores,
+            "workers": self.processos,
+            "max_queue": self.max_fila,
+            "running": min(self._em_andamento, self.processos),
+            "queued": max(self._em_andamento - self.processos, 0),
+        }
+
+
+# Pool compartilhado pelos endpoints; fechado no shutdown da aplicação
+pool_ocr = PoolOCR(OCR_CONFIG["processos"], OCR_CONFIG["max_fila"])
+
+
+# Resultados do OCR por hash do arquivo, em disco e limitados em tamanho (o mais antigo
+# em uso é despejado). Criado no primeiro uso, para que os processos do pool não abram o arquivo.
+_cache_resultados = None
+# Leituras em andamento neste processo, para que envios simultâneos do mesmo arquivo rodem o OCR uma vez
+_leituras_em_andamento: Dict[str, "asyncio.Task"] = {}
+
+
+def _cache_ocr() -> SQLiteCacheBackend:
+    global _cache_resultados
+    if _cache_resultados is None:
+        _cache_resultados = SQLiteCacheBackend(
+            OCR_CONFIG["cache_path"], OCR_CONFIG["cache_max_entries"],
+            OCR_CONFIG["cache_max_bytes"], OCR_CONFIG["cache_expiry"]
+        )
+    return _cache_resultados
+
+
+# Configurações que mudam o texto lido: alterá-las não deve reaproveitar resultados antigos
+_CAMPOS_LEITURA = ("lang", "psm", "preprocessar", "dpi_alvo", "lado_maximo", "limiar_raio", "limiar_deslocamento")
+_VERSAO_LEITURA = hashlib.sha256(
+    repr([OCR_CONFIG[campo] for campo in _CAMPOS_LEITURA]).encode()
+).hexdigest()[:12]
+
+
+def _chave_cache(hash_comprovante: str) -> str:
+    return f"ocr:{_VERSAO_LEITURA}:{hash_comprovante}"
+
+
+async def _ler_e_guardar(chave: str, contents: bytes, filetype: str) -> Dict[str, Any]:
+    dados = extrair_dados_comprovante(await pool_ocr.executar(contents, filetype=filetype))
+    await asyncio.to_thread(_cache_ocr().set, chave, dados, OCR_CONFIG["cache_expiry"])
+    return dados
+
+
+async def ler_comprovante(contents: bytes, filetype: str = "jpg",
+                          hash_comprovante: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Dados do comprovante (campos de ExtractedData), do cache ou lidos no PoolOCR
+
+    O cache é endereçado pelo SHA-256 dos bytes enviados: reenviar a mesma foto (ex.: após
+    uma falha em /register-payment) não roda o Tesseract de novo, nem após reinícios.
+
+    Raises:
+        FilaOCRCheia: o arquivo não está no cache e o pool está sem vagas
+    """
+    hash_comprovante = hash_comprovante or hashlib.sha256(contents).hexdigest()
+    chave = _chave_cache(hash_comprovante)
+
+    dados = await asyncio.to_thread(_cache_ocr().get, chave)
+    if dados is None:
+        tarefa = _leituras_em_andamento.get(chave)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(_ler_e_guardar(chave, contents, filetype))
+            _leituras_em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda _: _leituras_em_andamento.pop(chave, None))
+        # shield: quem desistir (ex.: cliente desconectado) não cancela a leitura dos demais
+        dados = await asyncio.shield(tarefa)
+    return {**dados, "receipt_hash": hash_comprovante}
+
+
+def estatisticas_cache_ocr() -> Dict[str, Any]:
+    return _cache_ocr().stats()
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+from config import OCR_CONFIG, logger
+from utils.ocr import FilaOCRCheia, PoolOCR, ler_comprovante, pool_ocr
+
+# Tentativas por job quando o processo que o executava some (reinício, queda do worker)
+MAX_TENTATIVAS = 3
+
+STATUS_FINAIS = ("done", "error")
+
+
+class FilaJobsOCR:
+    """
+    Fila durável de leituras de comprovantes, em um arquivo SQLite local
+
+    O envio só grava a imagem e devolve o id do job; trabalhadores em segundo plano (um
+    por processo do PoolOCR) reservam os jobs na ordem de chegada, rodam o OCR e gravam o
+    resultado no formato de ExtractedData (reenvios saem do cache de ler_comprovante). Como a fila fica no arquivo (modo WAL), ela
+    sobrevive a reinícios e é compartilhada pelos workers do uvicorn: um job reservado
+    há mais de `prazo` segundos (o processo que o executava caiu) volta para a fila, até
+    MAX_TENTATIVAS vezes. A imagem é apagada ao fim do job e o resultado, `retencao`
+    segundos depois.
+    """
+
+    def __init__(self, path: str, pool: PoolOCR, retencao: int, prazo: int, intervalo: float = 1.0):
+        self.path = path
+        self.pool = pool
+        self.retencao = retencao
+        self.prazo = prazo
+        # Espera máxima por jobs enviados a outro processo (os deste processo acordam na hora)
+        self.intervalo = intervalo
+        self._local = threading.local()
+        self._trabalhadores = []
+        self._novo_job = None
+        self._mudanca = None
+        self._iniciada = False
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _criar_tabela(self) -> None:
+        self._conexao().executescript("""
+            CREATE TABLE IF NOT EXISTS ocr_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'queued',
+                filetype TEXT NOT NULL,
+                conteudo BLOB,
+                hash_comprovante TEXT,
+                resultado TEXT,
+                erro TEXT,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                criado_em REAL NOT NULL,
+                iniciado_em REAL,
+                concluido_em REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ocr_jobs_status_criado ON ocr_jobs (status, criado_em);
+        """)
+
+    # Operações no arquivo (síncronas; os métodos assíncronos as rodam com asyncio.to_thread)
+
+    def _inserir(self, contents: bytes, filetype: str, hash_comprovante: str) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        self._conexao().execute(
+            "INSERT INTO ocr_jobs (id, filetype, conteudo, hash_comprovante, criado_em) VALUES (?, ?, ?, ?, ?)",
+            (job_id, filetype, contents, hash_comprovante, time.time())
+        )
+        return {"id": job_id, "status": "queued"}
+
+    def _ler(self, job_id: str) -> Optional[Dict[str, Any]]:
+        linha = self._conexao().execute("""
+            SELECT id, status, hash_comprovante, resultado, erro, criado_em, iniciado_em, concluido_em
+            FROM ocr_jobs WHERE id = ?
+        """, (job_id,)).fetchone()
+        return self._job_para_api(linha) if linha else None
+
+    def _reservar(self) -> Optional[sqlite3.Row]:
+        """Marcar como em execução o job mais antigo da fila (devolvendo antes os abandonados)"""
+        agora = time.time()
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                UPDATE ocr_jobs
+                SET status = CASE WHEN tentativas >= ? THEN 'error' ELSE 'queued' END,
+                    erro = CASE WHEN tentativas >= ? THEN 'Leitura interrompida repetidas vezes' END,
+                    conteudo = CASE WHEN tentativas >= ? THEN NULL ELSE conteudo END,
+                    concluido_em = CASE WHEN tentativas >= ? THEN ? END
+                WHERE status = 'running' AND iniciado_em < ?
+            """, (MAX_TENTATIVAS, MAX_TENTATIVAS, MAX_TENTATIVAS, MAX_TENTATIVAS, agora, agora - self.prazo))
+            job = conn.execute("""
+                SELECT id, filetype, conteudo, hash_comprovante FROM ocr_jobs
+                WHERE status = 'queued' ORDER BY criado_em LIMIT 1
+            """).fetchone()
+            if job is not None:
+                conn.execute(
+                    "UPDATE ocr_jobs SET status = 'running', iniciado_em = ?, tentativas = tentativas + 1 WHERE id = ?",
+                    (agora, job["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job
+
+    def _devolver(self, job_id: str) -> None:
+        """Devolver à fila um job que não chegou a rodar (sem contar a tentativa)"""
+        self._conexao().execute(
+            "UPDATE ocr_jobs SET status = 'queued', iniciado_em = NULL, tentativas = tentativas - 1 WHERE id = ?",
+            (job_id,)
+        )
+
+    def _concluir(self, job_id: str, resultado: Optional[Dict[str, Any]], erro: Optional[str]) -> None:
+        self._conexao().execute("""
+            UPDATE ocr_jobs SET status = ?, resultado = ?, erro = ?, conteudo = NULL, concluido_em = ?
+            WHERE id = ?
+        """, (
+            "error" if erro else "done",
+            json.dumps(resultado, ensure_ascii=False) if resultado is not None else None,
+            erro, time.time(), job_id
+        ))
+
+    def _limpar(self) -> int:
+        """Apagar os jobs concluídos há mais de `retencao` segundos"""
+        return self._conexao().execute(
+            "DELETE FROM ocr_jobs WHERE status IN ('done', 'error') AND concluido_em < ?",
+            (time.time() - self.retencao,)
+        ).rowcount
+
+    def _contagem(self) -> Dict[str, int]:
+        linhas = self._conexao().execute("SELECT status, COUNT(*) FROM ocr_jobs GROUP BY status").fetchall()
+        return {status: quantidade for status, quantidade in linhas}
+
+    @staticmethod
+    def _job_para_api(linha: sqlite3.Row) -> Dict[str, Any]:
+        resultado = json.loads(linha["resultado"]) if linha["resultado"] else None
+        if resultado is not None:
+            resultado["receipt_hash"] = linha["hash_comprovante"]
+        return {
+            "id": linha["id"],
+            "status": linha["status"],
+            "result": resultado,
+            "error": linha["erro"],
+            "created_at": linha["criado_em"],
+            "started_at": linha["iniciado_em"],
+            "finished_at": linha["concluido_em"],
+        }
+
+    # Interface assíncrona usada pelos endpoints
+
+    async def iniciar(self, trabalhadores: Optional[int] = None) -> None:
+        """Criar a tabela e iniciar os trabalhadores (padrão: um por processo de OCR)"""
+        await asyncio.to_thread(self._criar_tabela)
+        self._novo_job = asyncio.Event()
+        self._mudanca = asyncio.Event()
+        self._iniciada = True
+        quantidade = trabalhadores or self.pool.processos
+        self._trabalhadores = [asyncio.create_task(self._trabalhar()) for _ in range(quantidade)]
+        logger.info(f"Fila de OCR iniciada com {quantidade} trabalhadores ({self.path})")
+
+    async def parar(self) -> None:
+        """Encerrar os trabalhadores; jobs em execução voltam à fila após o prazo"""
+        for tarefa in self._trabalhadores:
+            tarefa.cancel()
+        await asyncio.gather(*self._trabalhadores, return_exceptions=True)
+        self._trabalhadores = []
+
+    async def enviar(self, contents: bytes, filetype: str, hash_comprovante: str) -> Dict[str, Any]:
+        """Gravar o comprovante na fila e devolver o id do job"""
+        if not self._iniciada:
+            raise RuntimeError("Fila de OCR não iniciada")
+        job = await asyncio.to_thread(self._inserir, contents, filetype, hash_comprovante)
+        self._novo_job.set()
+        return job
+
+    async def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado do job e, quando concluído, os dados extraídos (None se não existe)"""
+        return await asyncio.to_thread(self._ler, job_id)
+
+    async def aguardar_mudanca(self, timeout: float) -> None:
+        """
+        Esperar até algum job deste processo mudar de estado, ou até `timeout` segundos
+
+        Jobs executados por outro processo só são percebidos quando o tempo acaba, por
+        isso quem acompanha um job relê o estado a cada retorno.
+        """
+        try:
+            await asyncio.wait_for(self._mudanca.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _notificar_mudanca(self) -> None:
+        mudanca, self._mudanca = self._mudanca, asyncio.Event()
+        mudanca.set()
+
+    async def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "jobs": await asyncio.to_thread(self._contagem),
+            "workers": len(self._trabalhadores),
+            "pool": self.pool.estatisticas(),
+        }
+
+    async def _trabalhar(self) -> None:
+        ultima_limpeza = 0.0
+        while True:
+            try:
+                if time.monotonic() - ultima_limpeza > 60:
+                    ultima_limpeza = time.monotonic()
+                    await asyncio.to_thread(self._limpar)
+
+                job = await asyncio.to_thread(self._reservar)
+                if job is None:
+                    self._novo_job.clear()
+                    try:
+                        await asyncio.wait_for(self._novo_job.wait(), self.intervalo)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                self._notificar_mudanca()
+                await self._executar(job)
+                self._notificar_mudanca()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no trabalhador da fila de OCR: {e}", exc_info=True)
+                await asyncio.sleep(self.intervalo)
+
+    async def _executar(self, job: sqlite3.Row) -> None:
+        try:
+            dados = await ler_comprovante(job["conteudo"], job["filetype"], job["hash_comprovante"])
+        except FilaOCRCheia:
+            # Processos ocupados por leituras síncronas (/process-receipt): tentar depois
+            await asyncio.to_thread(self._devolver, job["id"])
+            await asyncio.sleep(self.intervalo)
+            return
+        except Exception as e:
+            logger.error(f"Erro ao processar o comprovante do job {job['id']}: {e}")
+            await asyncio.to_thread(self._concluir, job["id"], None, str(e))
+            return
+        await asyncio.to_thread(self._concluir, job["id"], dados, None)
+
+
+# Fila compartilhada pelos endpoints; iniciada no startup da aplicação
+fila_ocr = FilaJobsOCR(OCR_CONFIG["jobs_path"], pool_ocr, OCR_CONFIG["retencao_jobs"], OCR_CONFIG["prazo_job"])
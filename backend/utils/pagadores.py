@@ -0,0 +1,50 @@
+import re
+from typing import Any, Dict, List, Optional
+
+# A chave do pagador é interpolada no SQL como nome de coluna
+_CHAVE_VALIDA = re.compile(r"[a-z_][a-z0-9_]*")
+
+
+class IdentificadorPagadores:
+    """
+    Identifica o pagador a partir do nome informado ou extraído do comprovante
+
+    Montado uma vez a partir da tabela pagadores: nomes e apelidos exatos ficam em um
+    dicionário e, para nomes que apenas contêm um apelido, há uma expressão regular por
+    pagador, testadas na ordem da tabela (o primeiro pagador tem precedência).
+
+    Args:
+        pagadores: linhas com chave (coluna em atividades, ex.: alex_rute), nome de
+            exibição e apelidos separados por vírgula
+    """
+
+    def __init__(self, pagadores: List[Dict[str, Any]]):
+        self.pagadores = []
+        self._exatos: Dict[str, str] = {}
+        self._parciais = []
+
+        for pagador in pagadores:
+            chave = pagador["chave"]
+            if not _CHAVE_VALIDA.fullmatch(chave):
+                raise ValueError(f"Chave de pagador inválida: {chave!r}")
+
+            apelidos = [a.strip().lower() for a in (pagador["apelidos"] or "").split(",") if a.strip()]
+            termos = list(dict.fromkeys([pagador["nome"].lower(), *apelidos]))
+            for termo in [chave, *termos]:
+                self._exatos.setdefault(termo, chave)
+            self._parciais.append((chave, re.compile("|".join(re.escape(t) for t in termos))))
+            self.pagadores.append({"chave": chave, "nome": pagador["nome"]})
+
+    @property
+    def chaves(self) -> List[str]:
+        return [p["chave"] for p in self.pagadores]
+
+    def identificar(self, nome: str) -> Optional[str]:
+        """Chave do pagador, ou None se o nome não corresponde a nenhum"""
+        nome = nome.strip().lower()
+        if nome in self._exatos:
+            return self._exatos[nome]
+        for chave, padrao in self._parciais:
+            if padrao.search(nome):
+                return chave
+        return None
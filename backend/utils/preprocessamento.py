@@ -0,0 +1,86 @@
+import math
+from typing import Any, Dict
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+# Margem (em pixels) mantida em volta do texto no recorte automático
+MARGEM_RECORTE = 12
+# Fator de redução usado só para localizar o texto no recorte
+REDUCAO_RECORTE = 4
+
+
+def _lado_alvo(image: Image.Image, dpi_alvo: int, lado_maximo: int) -> int:
+    """
+    Maior lado, em pixels, da imagem entregue ao OCR (nunca maior que o original)
+
+    Se o arquivo informa a resolução, reduz até `dpi_alvo`; fotos de celular costumam vir
+    com 72 dpi ou sem resolução, então o maior lado também é limitado a `lado_maximo`
+    (um comprovante inteiro a ~300 dpi cabe em cerca de 2000 pixels).
+    """
+    lado = max(image.size)
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] and dpi[0] > dpi_alvo:
+        lado = int(lado * dpi_alvo / float(dpi[0]))
+    return max(min(lado, lado_maximo), 1)
+
+
+def _limiarizar(cinza: Image.Image, raio: int, deslocamento: int) -> Image.Image:
+    """
+    Limiar adaptativo: preto onde o pixel é mais escuro que a média da vizinhança
+
+    A média local (BoxBlur) acompanha sombras e variações de iluminação da foto, que um
+    limiar global transformaria em manchas pretas. `deslocamento` evita que o papel
+    liso vire ruído.
+    """
+    media = cinza.filter(ImageFilter.BoxBlur(raio))
+    # media - pixel, saturado em 0: quanto o pixel é mais escuro que a vizinhança
+    diferenca = ImageChops.subtract(media, cinza)
+    return diferenca.point(lambda v: 0 if v > deslocamento else 255)
+
+
+def _recortar(binaria: Image.Image) -> Image.Image:
+    """
+    Recortar a região com texto, ignorando pontos isolados (ruído da limiarização)
+
+    A caixa é procurada na imagem reduzida em REDUCAO_RECORTE vezes: a redução faz a média
+    de cada bloco, então só blocos com tinta suficiente contam.
+    """
+    tinta = ImageOps.invert(binaria).reduce(REDUCAO_RECORTE).point(lambda v: 255 if v >= 64 else 0)
+    caixa = tinta.getbbox()
+    if not caixa:
+        return binaria
+    esquerda, topo, direita, base = (c * REDUCAO_RECORTE for c in caixa)
+    largura, altura = binaria.size
+    return binaria.crop((
+        max(esquerda - MARGEM_RECORTE, 0), max(topo - MARGEM_RECORTE, 0),
+        min(direita + MARGEM_RECORTE, largura), min(base + MARGEM_RECORTE, altura),
+    ))
+
+
+def preparar_imagem(image: Image.Image, config: Dict[str, Any]) -> Image.Image:
+    """
+    Normalizar a foto do comprovante antes do Tesseract
+
+    Rotaciona conforme o EXIF, reduz a resolução, converte para tons de cinza, aplica
+    limiar adaptativo e recorta as bordas sem texto. Em JPEGs a redução começa já na
+    decodificação (draft), o que evita descompactar os 12 megapixels de uma foto de celular.
+
+    Args:
+        image: imagem aberta com Image.open (ainda não carregada)
+        config: OCR_CONFIG (dpi_alvo, lado_maximo, limiar_raio, limiar_deslocamento)
+    """
+    # Calculado antes do draft, que já reduz a imagem na decodificação (na orientação
+    # gravada no arquivo, antes da rotação pelo EXIF)
+    lado = _lado_alvo(image, config["dpi_alvo"], config["lado_maximo"])
+    proporcao = lado / float(max(image.size))
+    image.draft("L", (math.ceil(image.size[0] * proporcao), math.ceil(image.size[1] * proporcao)))
+    image = ImageOps.exif_transpose(image)
+
+    cinza = image.convert("L")
+    if max(cinza.size) > lado:
+        escala = lado / float(max(cinza.size))
+        largura, altura = cinza.size
+        tamanho = (max(int(largura * escala), 1), max(int(altura * escala), 1))
+        cinza = cinza.resize(tamanho, Image.LANCZOS, reducing_gap=2.0)
+
+    binaria = _limiarizar(cinza, config["limiar_raio"], config["limiar_deslocamento"])
+    return _recortar(binaria)
@@ -305,267 +305,20 @@ async function exportToExcel() {
     // Mostrar loading
 
     try {
-        // Buscar atividades da API
-        const activities = await fetchAllActivities();
-
-        // Preparar dados para Excel
-        const data = activities.map(activity => ({
-            'ID': activity.id,
-            'Data': activity.date,
-            'Atividade': activity.activity,
-            'Setor': activity.sector,
-            'Valor': activity.value,
-            'Pago Diego-Ana': activity.diego_ana || 0,
-            'Pago Alex-Rute': activity.alex_rute || 0,
-            'Total Pago': (activity.diego_ana || 0) + (activity.alex_rute || 0),
-            'Restante': activity.value - ((activity.diego_ana || 0) + (activity.alex_rute || 0)),
-            'Status': (activity.diego_ana || 0) + (activity.alex_rute || 0) >= activity.value ? 'Concluída' : 'Pendente'
-        }));
-        
-        // Função para formatar valores para o padrão brasileiro
-        function formatBrazilianCurrency(value) {
-            return value.toLocaleString('pt-BR', { minimumFractionDigits: 2, maximumFractionDigits: 2 });
-        }
-        
-        // Formatar os valores para o padrão brasileiro
-        data.forEach(item => {
-            item['Valor'] = formatBrazilianCurrency(item['Valor']);
-            item['Pago Diego-Ana'] = formatBrazilianCurrency(item['Pago Diego-Ana']);
-            item['Pago Alex-Rute'] = formatBrazilianCurrency(item['Pago Alex-Rute']);
-            item['Total Pago'] = formatBrazilianCurrency(item['Total Pago']);
-            item['Restante'] = formatBrazilianCurrency(item['Restante']);
-        });
-
-        // Preparar resumo financeiro
-        const totalValue = await fetchTotalValue();
-        const totalPaidValue = await fetchTotalPaidValue();
-        const diegoPaidValue = await fetchDiegoPaidValue();
-        const alexPaidValue = await fetchAlexPaidValue();
-
-        const resumo = [
-            { 'Resumo Financeiro': 'Valor Total', 'Valor': formatBrazilianCurrency(totalValue) },
-            { 'Resumo Financeiro': 'Valor Pago', 'Valor': formatBrazilianCurrency(totalPaidValue) },
-            { 'Resumo Financeiro': 'Valor Restante', 'Valor': formatBrazilianCurrency(totalValue - totalPaidValue) },
-            { 'Resumo Financeiro': 'Pago Diego-Ana', 'Valor': formatBrazilianCurrency(diegoPaidValue) },
-            { 'Resumo Financeiro': 'Pago Alex-Rute', 'Valor': formatBrazilianCurrency(alexPaidValue) },
-            { 'Resumo Financeiro': 'Progresso', 'Valor': `${((totalPaidValue / totalValue) * 100).toFixed(2)}%` }
-        ];
-
-        // Dados por setor
-        const sectorData = {};
-        activities.forEach(a => {
-            if (!sectorData[a.sector]) {
-                sectorData[a.sector] = {
-                    total: 0,
-                    paid: 0,
-                    count: 0
-                };
+        // A planilha é gerada no servidor a partir do banco, em uma única requisição
+        const token = localStorage.getItem('access_token');
+        const response = await fetch(`${url_api}/export/activities.xlsx`, {
+            headers: {
+                'Authorization': `Bearer ${token}`
             }
-
-            sectorData[a.sector].total += a.value;
-            sectorData[a.sector].paid += (a.diego_ana || 0) + (a.alex_rute || 0);
-            sectorData[a.sector].count++;
         });
-
-        const setores = Object.keys(sectorData).map(sector => ({
-            'Setor': sector,
-            'Total Atividades': sectorData[sector].count,
-            'Valor Total': formatBrazilianCurrency(sectorData[sector].total),
-            'Valor Pago': formatBrazilianCurrency(sectorData[sector].paid),
-            'Valor Pendente': formatBrazilianCurrency(sectorData[sector].total - sectorData[sector].paid),
-            'Progresso': `${((sectorData[sector].paid / sectorData[sector].total) * 100).toFixed(2)}%`
-        }));
-
-        // Criar workbook
-        const wb = XLSX.utils.book_new();
-
-        // ===== PLANILHA DE ATIVIDADES =====
-        const ws_data = XLSX.utils.json_to_sheet(data);
-        
-        // Formatação da planilha de atividades
-        const range = XLSX.utils.decode_range(ws_data['!ref']);
-        
-        // Definir largura das colunas
-        ws_data['!cols'] = [
-            { wch: 8 },   // ID
-            { wch: 12 },  // Data
-            { wch: 30 },  // Atividade
-            { wch: 15 },  // Setor
-            { wch: 12 },  // Valor
-            { wch: 15 },  // Pago Diego-Ana
-            { wch: 15 },  // Pago Alex-Rute
-            { wch: 12 },  // Total Pago
-            { wch: 12 },  // Restante
-            { wch: 12 }   // Status
-        ];
-
-        // Aplicar estilos
-        if (!ws_data['!style']) ws_data['!style'] = {};
-
-        // Estilo do cabeçalho (linha 1)
-        for (let col = range.s.c; col <= range.e.c; col++) {
-            const cellAddress = XLSX.utils.encode_cell({ r: 0, c: col });
-            if (!ws_data[cellAddress]) continue;
-            
-            ws_data[cellAddress].s = {
-                fill: { fgColor: { rgb: "2E5BBA" } }, // Azul escuro
-                font: { color: { rgb: "FFFFFF" }, bold: true, sz: 12 },
-                alignment: { horizontal: "center", vertical: "center" },
-                border: {
-                    top: { style: "thin", color: { rgb: "000000" } },
-                    bottom: { style: "thin", color: { rgb: "000000" } },
-                    left: { style: "thin", color: { rgb: "000000" } },
-                    right: { style: "thin", color: { rgb: "000000" } }
-                }
-            };
-        }
-
-        // Estilo para linhas de dados
-        for (let row = 1; row <= range.e.r; row++) {
-            const statusCell = ws_data[XLSX.utils.encode_cell({ r: row, c: 9 })]; // Coluna Status
-            const isCompleted = statusCell && statusCell.v === 'Concluída';
-            
-            for (let col = range.s.c; col <= range.e.c; col++) {
-                const cellAddress = XLSX.utils.encode_cell({ r: row, c: col });
-                if (!ws_data[cellAddress]) continue;
-                
-                ws_data[cellAddress].s = {
-                    fill: { 
-                        fgColor: { 
-                            rgb: isCompleted ? "D4EDDA" : (row % 2 === 0 ? "F8F9FA" : "FFFFFF") 
-                        } 
-                    }, // Verde claro para concluídas, alternando cinza/branco para outras
-                    font: { 
-                        color: { rgb: isCompleted ? "155724" : "000000" },
-                        bold: isCompleted && col === 9 // Status em negrito se concluída
-                    },
-                    alignment: { 
-                        horizontal: col === 2 ? "left" : "center", // Atividade à esquerda, resto centralizado
-                        vertical: "center" 
-                    },
-                    border: {
-                        top: { style: "thin", color: { rgb: "DEE2E6" } },
-                        bottom: { style: "thin", color: { rgb: "DEE2E6" } },
-                        left: { style: "thin", color: { rgb: "DEE2E6" } },
-                        right: { style: "thin", color: { rgb: "DEE2E6" } }
-                    },
-                    alignment: { horizontal: col === 2 ? "left" : "center", vertical: "center" }
-                };
-            }
-        }
-
-        XLSX.utils.book_append_sheet(wb, ws_data, 'Atividades');
-
-        // ===== PLANILHA DE RESUMO =====
-        const ws_resumo = XLSX.utils.json_to_sheet(resumo);
-        
-        // Formatação da planilha de resumo
-        const resumoRange = XLSX.utils.decode_range(ws_resumo['!ref']);
-        
-        ws_resumo['!cols'] = [
-            { wch: 20 }, // Resumo Financeiro
-            { wch: 15 }  // Valor
-        ];
-
-        // Cabeçalho do resumo
-        for (let col = 0; col <= 1; col++) {
-            const cellAddress = XLSX.utils.encode_cell({ r: 0, c: col });
-            if (!ws_resumo[cellAddress]) continue;
-            
-            ws_resumo[cellAddress].s = {
-                fill: { fgColor: { rgb: "28A745" } }, // Verde
-                font: { color: { rgb: "FFFFFF" }, bold: true, sz: 12 },
-                alignment: { horizontal: "center", vertical: "center" },
-                border: {
-                    top: { style: "thin", color: { rgb: "000000" } },
-                    bottom: { style: "thin", color: { rgb: "000000" } },
-                    left: { style: "thin", color: { rgb: "000000" } },
-                    right: { style: "thin", color: { rgb: "000000" } }
-                }
-            };
-        }
-
-        // Dados do resumo
-        for (let row = 1; row <= resumoRange.e.r; row++) {
-            for (let col = 0; col <= 1; col++) {
-                const cellAddress = XLSX.utils.encode_cell({ r: row, c: col });
-                if (!ws_resumo[cellAddress]) continue;
-                
-                ws_resumo[cellAddress].s = {
-                    fill: { fgColor: { rgb: row % 2 === 0 ? "F8F9FA" : "FFFFFF" } },
-                    font: { color: { rgb: "000000" }, bold: col === 0 },
-                    alignment: { horizontal: col === 0 ? "left" : "center", vertical: "center" },
-                    border: {
-                        top: { style: "thin", color: { rgb: "DEE2E6" } },
-                        bottom: { style: "thin", color: { rgb: "DEE2E6" } },
-                        left: { style: "thin", color: { rgb: "DEE2E6" } },
-                        right: { style: "thin", color: { rgb: "DEE2E6" } }
-                    },
-                    alignment: { horizontal: col === 0 ? "left" : "center", vertical: "center" }
-                };
-            }
-        }
-
-        XLSX.utils.book_append_sheet(wb, ws_resumo, 'Resumo Financeiro');
-
-        // ===== PLANILHA DE SETORES =====
-        const ws_setores = XLSX.utils.json_to_sheet(setores);
-        
-        // Formatação da planilha de setores
-        const setoresRange = XLSX.utils.decode_range(ws_setores['!ref']);
-        
-        ws_setores['!cols'] = [
-            { wch: 20 }, // Setor
-            { wch: 15 }, // Total Atividades
-            { wch: 15 }, // Valor Total
-            { wch: 12 }, // Valor Pago
-            { wch: 15 }, // Valor Pendente
-            { wch: 12 }  // Progresso
-        ];
-
-        // Cabeçalho dos setores
-        for (let col = 0; col <= 5; col++) {
-            const cellAddress = XLSX.utils.encode_cell({ r: 0, c: col });
-            if (!ws_setores[cellAddress]) continue;
-            
-            ws_setores[cellAddress].s = {
-                fill: { fgColor: { rgb: "FD7E14" } }, // Laranja
-                font: { color: { rgb: "FFFFFF" }, bold: true, sz: 12 },
-                alignment: { horizontal: "center", vertical: "center" },
-                border: {
-                    top: { style: "thin", color: { rgb: "000000" } },
-                    bottom: { style: "thin", color: { rgb: "000000" } },
-                    left: { style: "thin", color: { rgb: "000000" } },
-                    right: { style: "thin", color: { rgb: "000000" } }
-                }
-            };
-        }
-
-        // Dados dos setores
-        for (let row = 1; row <= setoresRange.e.r; row++) {
-            for (let col = 0; col <= 5; col++) {
-                const cellAddress = XLSX.utils.encode_cell({ r: row, c: col });
-                if (!ws_setores[cellAddress]) continue;
-                
-                ws_setores[cellAddress].s = {
-                    fill: { fgColor: { rgb: row % 2 === 0 ? "F8F9FA" : "FFFFFF" } },
-                    font: { color: { rgb: "000000" } },
-                    alignment: { horizontal: col === 0 ? "left" : "center", vertical: "center" },
-                    border: {
-                        top: { style: "thin", color: { rgb: "DEE2E6" } },
-                        bottom: { style: "thin", color: { rgb: "DEE2E6" } },
-                        left: { style: "thin", color: { rgb: "DEE2E6" } },
-                        right: { style: "thin", color: { rgb: "DEE2E6" } }
-                    },
-                    alignment: { horizontal: col === 0 ? "left" : "center", vertical: "center" }
-                };
-            }
+        if (!response.ok) {
+            throw new Error('Erro ao exportar planilha');
         }
 
-        XLSX.utils.book_append_sheet(wb, ws_setores, 'Análise por Setor');
-
         // Exportar para arquivo Excel
-        XLSX.writeFile(wb, 'Gestao_Gastos_Obra.xlsx');
+        const blob = await response.blob();
+        saveAs(blob, 'Gestao_Gastos_Obra.xlsx');
 
     } catch (error) {
         console.error('Erro ao exportar Excel:', error);
@@ -156,6 +156,26 @@
             }
         }
 
+        // Função para buscar os pagamentos somados por período (data real do pagamento)
+        async function fetchPaymentTimeline(bucket = 'month') {
+            try {
+                const token = localStorage.getItem('access_token');
+                const response = await fetch(`${API_URL}/payments/timeline?bucket=${bucket}`, {
+                    headers: {
+                        'Authorization': `Bearer ${token}`
+                    }
+                });
+                if (!response.ok) {
+                    throw new Error('Erro ao buscar linha do tempo de pagamentos');
+                }
+                const data = await response.json();
+                return data.rows;
+            } catch (error) {
+                console.error('Erro:', error);
+                return [];
+            }
+        }
+
         // Função para buscar valor total
         async function fetchTotalValue() {
             try {
@@ -236,6 +256,30 @@
             }
         }
 
+        // Função para buscar listas e totais do dashboard em uma única requisição
+        async function fetchDashboardSummary() {
+            try {
+                const token = localStorage.getItem('access_token');
+                const response = await fetch(`${API_URL}/dashboard/summary`, {
+                    headers: {
+                        'Authorization': `Bearer ${token}`
+                    }
+                });
+                if (!response.ok) {
+                    throw new Error('Erro ao buscar resumo do dashboard');
+                }
+                return await response.json();
+            } catch (error) {
+                console.error('Erro:', error);
+                return {
+                    atividades: [],
+                    atividades_pendentes: [],
+                    atividades_pagas: [],
+                    totais: { total: 0, total_pago: 0, total_pago_diego: 0, total_pago_alex: 0 }
+                };
+            }
+        }
+
         // ===== Funções para criar gráficos =====
 
         // Gráfico de Status das Atividades
@@ -512,16 +556,11 @@
             });
         }
 
-        // Gráfico de Pagamentos por Período (REMOVER payment_count)
-        function createPaymentTimelineChart(activities) {
-            // Soma pagamentos por data
-            const dateSums = {};
-            activities.forEach(a => {
-                if (!dateSums[a.date]) dateSums[a.date] = 0;
-                dateSums[a.date] += (a.diego_ana || 0) + (a.alex_rute || 0);
-            });
-            const labels = Object.keys(dateSums);
-            const data = Object.values(dateSums);
+        // Gráfico de Pagamentos por Período (datas dos pagamentos, do histórico)
+        async function createPaymentTimelineChart() {
+            const periods = await fetchPaymentTimeline('month');
+            const labels = periods.map(p => p.period);
+            const data = periods.map(p => p.total);
 
             destroyChart('paymentTimelineChart');
 
@@ -588,8 +627,9 @@
 
         // ===== Funções de Inicialização =====
         async function init() {
-            // Carregar atividades
-            const activities = await fetchAllActivities();
+            // Carregar atividades e totais em uma única requisição
+            const summary = await fetchDashboardSummary();
+            const activities = summary.atividades;
 
             // Atualizar gráficos iniciais
             createStatusChart(activities);
@@ -601,10 +641,10 @@
             createSectorDetailChart(activities);
 
             // Atualizar resumo financeiro
-            const totalValue = await fetchTotalValue();
-            const totalPaidValue = await fetchTotalPaidValue();
-            const diegoPaidValue = await fetchDiegoPaidValue();
-            const alexPaidValue = await fetchAlexPaidValue();
+            const totalValue = summary.totais.total;
+            const totalPaidValue = summary.totais.total_pago;
+            const diegoPaidValue = summary.totais.total_pago_diego;
+            const alexPaidValue = summary.totais.total_pago_alex;
 
             progressBar.style.width = `${(totalPaidValue / totalValue) * 100}%`;
             progressPercentage.textContent = `${((totalPaidValue / totalValue) * 100).toFixed(2)}%`;
@@ -715,7 +755,7 @@
                 case 'timeline':
                     // Atualizar gráficos da linha do tempo
                     createActivityTimelineChart(activities);
-                    createPaymentTimelineChart(activities);
+                    createPaymentTimelineChart();
 
                     // Implementar timeline chart que estava faltando
                     createTimelineChart(activities);
@@ -1069,80 +1109,20 @@
             showLoading(exportExcelBtn);
 
             try {
-                // Buscar atividades da API
-                const activities = await fetchAllActivities();
-
-                // Preparar dados para Excel
-                const data = activities.map(activity => ({
-                    'ID': activity.id,
-                    'Data': activity.date,
-                    'Atividade': activity.activity,
-                    'Setor': activity.sector,
-                    'Valor': activity.value,
-                    'Pago Diego-Ana': activity.diego_ana || 0,
-                    'Pago Alex-Rute': activity.alex_rute || 0,
-                    'Total Pago': (activity.diego_ana || 0) + (activity.alex_rute || 0),
-                    'Restante': activity.value - ((activity.diego_ana || 0) + (activity.alex_rute || 0)),
-                    'Status': (activity.diego_ana || 0) + (activity.alex_rute || 0) >= activity.value ? 'Concluída' : 'Pendente'
-                }));
-
-                // Preparar resumo financeiro
-                const totalValue = await fetchTotalValue();
-                const totalPaidValue = await fetchTotalPaidValue();
-                const diegoPaidValue = await fetchDiegoPaidValue();
-                const alexPaidValue = await fetchAlexPaidValue();
-
-                const resumo = [
-                    { 'Resumo Financeiro': 'Valor Total', 'Valor': totalValue },
-                    { 'Resumo Financeiro': 'Valor Pago', 'Valor': totalPaidValue },
-                    { 'Resumo Financeiro': 'Valor Restante', 'Valor': totalValue - totalPaidValue },
-                    { 'Resumo Financeiro': 'Pago Diego-Ana', 'Valor': diegoPaidValue },
-                    { 'Resumo Financeiro': 'Pago Alex-Rute', 'Valor': alexPaidValue },
-                    { 'Resumo Financeiro': 'Progresso', 'Valor': `${((totalPaidValue / totalValue) * 100).toFixed(2)}%` }
-                ];
-
-                // Dados por setor
-                const sectorData = {};
-                activities.forEach(a => {
-                    if (!sectorData[a.sector]) {
-                        sectorData[a.sector] = {
-                            total: 0,
-                            paid: 0,
-                            count: 0
-                        };
+                // A planilha é gerada no servidor a partir do banco, em uma única requisição
+                const token = localStorage.getItem('access_token');
+                const response = await fetch(`${API_URL}/export/activities.xlsx`, {
+                    headers: {
+                        'Authorization': `Bearer ${token}`
                     }
-
-                    sectorData[a.sector].total += a.value;
-                    sectorData[a.sector].paid += (a.diego_ana || 0) + (a.alex_rute || 0);
-                    sectorData[a.sector].count++;
                 });
-
-                const setores = Object.keys(sectorData).map(sector => ({
-                    'Setor': sector,
-                    'Total Atividades': sectorData[sector].count,
-                    'Valor Total': sectorData[sector].total,
-                    'Valor Pago': sectorData[sector].paid,
-                    'Valor Pendente': sectorData[sector].total - sectorData[sector].paid,
-                    'Progresso': `${((sectorData[sector].paid / sectorData[sector].total) * 100).toFixed(2)}%`
-                }));
-
-                // Criar workbook
-                const wb = XLSX.utils.book_new();
-
-                // Adicionar planilha de atividades
-                const ws_data = XLSX.utils.json_to_sheet(data);
-                XLSX.utils.book_append_sheet(wb, ws_data, 'Atividades');
-
-                // Adicionar planilha de resumo
-                const ws_resumo = XLSX.utils.json_to_sheet(resumo);
-                XLSX.utils.book_append_sheet(wb, ws_resumo, 'Resumo Financeiro');
-
-                // Adicionar planilha de setores
-                const ws_setores = XLSX.utils.json_to_sheet(setores);
-                XLSX.utils.book_append_sheet(wb, ws_setores, 'Análise por Setor');
+                if (!response.ok) {
+                    throw new Error('Erro ao exportar planilha');
+                }
 
                 // Exportar para arquivo Excel
-                XLSX.writeFile(wb, 'Gestao_Gastos_Obra.xlsx');
+                const blob = await response.blob();
+                saveAs(blob, 'Gestao_Gastos_Obra.xlsx');
 
             } catch (error) {
                 console.error('Erro ao exportar Excel:', error);
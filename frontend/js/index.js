@@ -562,21 +562,17 @@ const activityManager = {
     }
   },
 
-  async loadDiegoPaid() {
+  async loadPayerTotals() {
     try {
-      const data = await api.fetchData("valor-pago-diego");
-      ui.updateElementText("valorPagoDiego", formatter.currency(data.total_pago_diego));
-    } catch (error) {
-      console.error("Erro ao carregar o valor pago por Diego:", error);
-    }
-  },
-
-  async loadAlexPaid() {
-    try {
-      const data = await api.fetchData("valor-pago-alex");
-      ui.updateElementText("valorPagoAlex", formatter.currency(data.total_pago_alex));
+      const data = await api.fetchData("payers/totals");
+      const elementos = { diego_ana: "valorPagoDiego", alex_rute: "valorPagoAlex" };
+      data.payers.forEach((payer) => {
+        if (elementos[payer.payer]) {
+          ui.updateElementText(elementos[payer.payer], formatter.currency(payer.total));
+        }
+      });
     } catch (error) {
-      console.error("Erro ao carregar o valor pago por Alex:", error);
+      console.error("Erro ao carregar os valores pagos por pagador:", error);
     }
   },
 
@@ -780,8 +776,7 @@ const activityManager = {
         this.loadAllActivities(),
         this.loadTotalPaid(),
         this.loadTotalValue(),
-        this.loadDiegoPaid(),
-        this.loadAlexPaid(),
+        this.loadPayerTotals(),
       ]);
     } catch (error) {
       console.error("Erro ao atualizar os dados:", error);
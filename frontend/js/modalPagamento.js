@@ -117,6 +117,7 @@ async function registrarPagamento(dadosComprovante) {
         payer: pagador,
         value: valor,
         date: data,
+        receipt_hash: dadosComprovante.receipt_hash || null,
     };
 
     console.log("Dados do pagamento formatados:", paymentData);